@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from flask import Blueprint, Response, request, stream_with_context
+from sqlalchemy import select, tuple_
+
+from matching import SIDES, matches_for
+from models import db, Venue, Artist, Show
+from pagination import decode_cursor, encode_cursor, page_size
+from routing import read_replica
+from serialization import dumps, iter_ndjson
+
+# Read-only JSON API: /api/v1/<resource> and /api/v1/<resource>/<id>.
+#
+#   ?fields=a,b,c   sparse field selection; only those columns are SELECTed
+#   ?from, ?to      shows starting in [from, to) (ISO dates or datetimes),
+#                   combinable with ?venue_id, ?artist_id or ?city/?state;
+#                   each is a range scan on a (.., start_time) index
+#   ?limit, ?after  cursor pagination (keyset on the resource's sort key)
+#   /api/v1/<venues|artists>/<id>/matches?limit
+#                   seeking counterparts in the same state ranked by shared
+#                   genres (matching.py)
+#   Accept: application/x-ndjson (or ?format=ndjson)
+#                   stream every matching row from a server-side cursor
+#                   instead of returning one page
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+class Resource:
+
+    def __init__(self, model, fields, order_by, joins=None, filters=None):
+        self.model = model
+        self.fields = fields            # public name -> column expression
+        self.order_by = order_by        # keyset columns, also the cursor
+        self.joins = joins or {}        # public name -> (target, onclause)
+        self.filters = filters or {}    # query arg -> function(value) -> clause
+
+    def columns_for(self, names):
+        return [self.fields[name].label(name) for name in names]
+
+    def select(self, names):
+        stmt = select(*self.columns_for(names)).select_from(self.model)
+        joined = []
+        for name in names:
+            join = self.joins.get(name)
+            if join is not None and join[0] not in joined:
+                stmt = stmt.join(*join)
+                joined.append(join[0])
+        return stmt
+
+
+def _entity_fields(model, names):
+    return {name: getattr(model, name) for name in names}
+
+
+VENUE_FIELDS = ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+                'genres', 'website', 'seeking_talent', 'seeking_description', 'updated_at')
+ARTIST_FIELDS = ('id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                 'genres', 'website', 'seeking_venue', 'seeking_description', 'updated_at')
+
+RESOURCES = {
+    'venues': Resource(Venue, _entity_fields(Venue, VENUE_FIELDS), [Venue.id]),
+    'artists': Resource(Artist, _entity_fields(Artist, ARTIST_FIELDS), [Artist.id]),
+    'shows': Resource(
+        Show,
+        {
+            'id': Show.id,
+            'start_time': Show.start_time,
+            'duration_minutes': Show.duration_minutes,
+            'end_time': Show.end_time,
+            'venue_id': Show.venue_id,
+            'artist_id': Show.artist_id,
+            'venue_name': Venue.name,
+            'venue_image_link': Venue.image_link,
+            'artist_name': Artist.name,
+            'artist_image_link': Artist.image_link,
+            'updated_at': Show.updated_at,
+        },
+        [Show.start_time, Show.id],
+        joins={
+            'venue_name': (Venue, Venue.id == Show.venue_id),
+            'venue_image_link': (Venue, Venue.id == Show.venue_id),
+            'artist_name': (Artist, Artist.id == Show.artist_id),
+            'artist_image_link': (Artist, Artist.id == Show.artist_id),
+        },
+        filters={
+            'venue_id': lambda value: Show.venue_id == int(value),
+            'artist_id': lambda value: Show.artist_id == int(value),
+            'from': lambda value: Show.start_time >= datetime.fromisoformat(value),
+            'to': lambda value: Show.start_time < datetime.fromisoformat(value),
+            # Semi-joins, so no join is added and the shows scan stays on start_time
+            'city': lambda value: Show.venue_id.in_(select(Venue.id).where(Venue.city == value)),
+            'state': lambda value: Show.venue_id.in_(select(Venue.id).where(Venue.state == value)),
+        },
+    ),
+}
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def error(message, status):
+    return json_response({'error': message}, status)
+
+
+def requested_fields(resource):
+    # Returns (field names, error response)
+    raw = request.args.get('fields')
+    if not raw:
+        return list(resource.fields), None
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown:
+        return None, error(f'unknown field(s): {", ".join(unknown)}', 400)
+    return list(dict.fromkeys(names)), None
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON])
+    return best == NDJSON and request.accept_mimetypes[NDJSON] > request.accept_mimetypes['application/json']
+
+
+@api.route('/<resource_name>')
+@read_replica
+def list_resource(resource_name):
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return error('not found', 404)
+    names, failure = requested_fields(resource)
+    if failure is not None:
+        return failure
+
+    # The sort key is always selected so a cursor can be built; it is left
+    # out of the output unless it was requested
+    key_names = [column.key for column in resource.order_by]
+    selected = names + [name for name in key_names if name not in names]
+    stmt = resource.select(selected)
+
+    try:
+        for arg, clause in resource.filters.items():
+            if arg in request.args:
+                stmt = stmt.where(clause(request.args[arg]))
+    except ValueError:
+        return error('invalid filter value', 400)
+
+    key = [resource.fields[name] for name in key_names]
+    cursor = decode_cursor(request.args.get('after'), *[column.type.python_type for column in key])
+    if cursor is not None:
+        stmt = stmt.where(tuple_(*key) > tuple_(*cursor))
+    stmt = stmt.order_by(*key)
+
+    if wants_ndjson():
+        # Server-side cursor: rows are fetched STREAM_BATCH_SIZE at a time
+        # and written out as they arrive, so memory stays flat
+        stream = stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+        def generate():
+            result = db.session.execute(stream)
+            yield from iter_ndjson({name: row[name] for name in names} for row in result.mappings())
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+    limit = page_size(request.args.get('limit'))
+    rows = db.session.execute(stmt.limit(limit + 1)).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*[rows[-1][name] for name in key_names])
+    return json_response({
+        'data': [{name: row[name] for name in names} for row in rows],
+        'next': next_cursor,
+    })
+
+
+@api.route('/<resource_name>/<int:id>')
+@read_replica
+def get_resource(resource_name, id):
+    resource = RESOURCES.get(resource_name)
+    if resource is None:
+        return error('not found', 404)
+    names, failure = requested_fields(resource)
+    if failure is not None:
+        return failure
+    row = db.session.execute(
+        resource.select(names).where(resource.model.id == id)
+    ).mappings().first()
+    if row is None:
+        return error('not found', 404)
+    return json_response({'data': dict(row)})
+
+
+@api.route('/<resource_name>/<int:id>/matches')
+@read_replica
+def resource_matches(resource_name, id):
+    if resource_name not in SIDES:
+        return error('not found', 404)
+    ranked = matches_for(resource_name, id, page_size(request.args.get('limit')))
+    if ranked is None:
+        return error('not found', 404)
+    other = SIDES[SIDES[resource_name][2]][0]
+    rows = {row.id: row for row in db.session.execute(
+        select(other.id, other.name, other.city, other.state, other.genres)
+        .where(other.id.in_([match_id for match_id, _ in ranked]))
+    ).mappings()}
+    return json_response({'data': [dict(rows[match_id], score=value) for match_id, value in ranked]})
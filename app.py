@@ -3,16 +3,40 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from itertools import groupby
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, g
 from flask_moment import Moment
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from pagination import decode_cursor, page_size, paginate
+from search import search_engine
+from cache import page_cache, venue_key, artist_key
+from formatting import format_datetime, format_datetimes
+from conditional import (conditional, touch, venue_validators, artist_validators,
+                         venues_validators, artists_validators, shows_validators)
+from explain import explain_routes
+from api import api
+from importer import import_command
+from exporter import export, export_command
+from feeds import feeds
+from facets import parse_filters, filter_clauses, facet_panel, query_args
+from seed import seed_command
+from matching import match_command
+from locations import reconcile_locations_command
+from deletions import deletions
+from jobs import jobs, jobs_command
+from assets import assets, build_assets_command
+from auth import token_required
+from pool import pool_monitor
+from routing import read_replica, router
+from profiler import sql_profiler
+from metrics import metrics
 from flask_migrate import Migrate
 from models import *
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -21,23 +45,114 @@ from models import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+pool_monitor.init_app(app)
+router.init_app(app)
 db.init_app(app)
 migrate = Migrate(app, db)
+search_engine.init_app(app)
+jobs.init_app(app)
+deletions.init_app(app)
+sql_profiler.init_app(app)
+metrics.init_app(app)
+page_cache.init_app(app)
+if not page_cache.shared:
+  # Warmed facets would only fill the job process's own memory cache
+  jobs.schedule.pop('facets.warm', None)
+assets.init_app(app)
+app.cli.add_command(explain_routes)
+app.cli.add_command(import_command)
+app.cli.add_command(export_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(match_command)
+app.cli.add_command(reconcile_locations_command)
+app.cli.add_command(jobs_command)
+app.cli.add_command(build_assets_command)
+app.register_blueprint(api)
+app.register_blueprint(export)
+app.register_blueprint(feeds)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def page_ttl(data):
+  # Detail pages split shows into past and upcoming, so a cached page must
+  # expire no later than the moment its next upcoming show starts
+  ttl = app.config['CACHE_DEFAULT_TTL']
+  if data['upcoming_shows']:
+    next_start = data['upcoming_shows'][0]['start_time']
+    ttl = min(ttl, max(1, int((next_start - datetime.now()).total_seconds()) + 1))
+  return ttl
+
+
+def venue_dependents(venue_id):
+  # Artist pages list the venues they played, so a venue write changes those
+  # pages too. Touch them (conditional GET) and return the cache keys to drop
+  # once the transaction has committed.
+  artist_ids = [row.artist_id for row in
+                db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+  touch(Artist, artist_ids)
+  return [venue_key(venue_id)] + [artist_key(id) for id in artist_ids]
+
+
+def artist_dependents(artist_id):
+  venue_ids = [row.venue_id for row in
+               db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
+  touch(Venue, venue_ids)
+  return [artist_key(artist_id)] + [venue_key(id) for id in venue_ids]
+
+
+# Write handlers touch and drop their own pages inline. The pages of the
+# other side can be thousands: with a shared cache that fan-out runs as a
+# job after the request, whose invalidation every process sees. A memory
+# cache is per process and a job could only clear its own, so there the
+# fan-out runs inline; other processes' entries are stored under their
+# validators (cache.py) and miss once the rows are touched.
+#
+# Create handlers enqueue nothing. A new venue or artist has no dependent
+# pages, and search_engine.index is a no-op on Postgres (a generated
+# column) or updates this process's memory index, which a job could not
+# reach. A new show touches its two pages in its own transaction, so their
+# ETags change with it, and drops them at once so the redirect shows it.
+
+@jobs.task('pages.refresh_dependents')
+def refresh_dependents(kind, id):
+  dependents = venue_dependents(id) if kind == 'venues' else artist_dependents(id)
+  db.session.commit()
+  page_cache.invalidate(*dependents)
+
+
+def schedule_dependents(kind, id):
+  # Call before committing the write; returns the cache keys to drop after
+  # it commits (none when a job takes over)
+  if page_cache.shared:
+    jobs.enqueue('pages.refresh_dependents', kind=kind, id=id)
+    return []
+  return venue_dependents(id) if kind == 'venues' else artist_dependents(id)
+
+
+def fill_from_primary(loader, *args):
+  # Cache fills read the primary so a lagging replica cannot pin stale data
+  # into the cache for the entry's whole TTL
+  with router.primary():
+    return loader(*args)
+
+@app.route('/_stats/cache')
+@token_required('DIAGNOSTICS_TOKEN')
+def cache_stats():
+  return jsonify(page_cache.stats())
+
+@app.route('/_stats/pool')
+@token_required('DIAGNOSTICS_TOKEN')
+def pool_stats():
+  return jsonify({**pool_monitor.stats(), 'replicas': router.status()})
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -51,36 +166,74 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_replica
+@conditional(venues_validators)
 def venues():
-    venues = Venue.query.all()
+    filters = parse_filters('venues', request.args)
+
+    # An ordered scan of locations (state, city_key) with each one's venues
+    # (location_id, name, id). Venue and upcoming show counts are kept on
+    # the location rows; upcoming ones are counted from the location's
+    # shows_after, so the shows that have started since are subtracted, an
+    # index range on start_time that reconcile keeps short
+    now = datetime.now()
+    started = select(
+        Venue.location_id,
+        func.count().label('count')
+    ).join(
+        Show, Show.venue_id == Venue.id
+    ).join(
+        Location, Location.id == Venue.location_id
+    ).where(
+        Show.start_time > select(func.min(Location.shows_after)).correlate(None).scalar_subquery(),
+        Show.start_time > Location.shows_after,
+        Show.start_time <= now
+    ).group_by(Venue.location_id).subquery()
+    rows = db.session.query(
+        Location.id.label('location_id'),
+        Location.city,
+        Location.state,
+        Location.venue_count,
+        (Location.upcoming_show_count - func.coalesce(started.c.count, 0)).label('upcoming_show_count'),
+        Venue.id,
+        Venue.name
+    ).join(
+        Venue, Venue.location_id == Location.id
+    ).outerjoin(
+        started, started.c.location_id == Location.id
+    ).filter(
+        Location.venue_count > 0,
+        *filter_clauses('venues', filters)
+    ).order_by(
+        Location.state, Location.city_key, Venue.name, Venue.id
+    ).yield_per(500)
+
+    # The counts on the location rows are for all of its venues; under
+    # filters only the venue count is known (the rows listed), so the
+    # upcoming show count is left out
     data = []
-    city_state_map = {}
-
-    for venue in venues:
-      key = (venue.city, venue.state)
-      if key not in city_state_map:
-        city_state_map[key] = []
-
-      city_state_map[key].append({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": len([show for show in venue.shows if show.start_time > datetime.now()])
-      })
-
-    for location, venue_list in city_state_map.items():
+    for _, venue_rows in groupby(rows, key=lambda row: row.location_id):
+      venue_rows = list(venue_rows)
       data.append({
-        "city": location[0],
-        "state": location[1],
-        "venues": venue_list
+        "city": venue_rows[0].city,
+        "state": venue_rows[0].state,
+        "num_venues": len(venue_rows) if filters else venue_rows[0].venue_count,
+        "num_upcoming_shows": None if filters else venue_rows[0].upcoming_show_count,
+        "venues": [{
+          "id": row.id,
+          "name": row.name
+        } for row in venue_rows]
       })
 
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data,
+                           facets=facet_panel('venues', 'venues', filters))
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_replica
 def search_venues():
     search_term = request.form.get('search_term', '')
-    venues_list = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).all()
+    venues_list = search_engine.search_venues(search_term)
     response = {
         "count": len(venues_list),
         "data": [{"id": venue.id, "name": venue.name} for venue in venues_list]
@@ -88,38 +241,29 @@ def search_venues():
     return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # Get the venue by ID
-    venue = Venue.query.get(venue_id)
+VENUE_PAGE_COLUMNS = (Venue.id, Venue.name, Venue.genres, Venue.address, Venue.city, Venue.state,
+                      Venue.phone, Venue.website, Venue.facebook_link, Venue.seeking_talent,
+                      Venue.seeking_description, Venue.image_link)
 
-    # Retrieve the current time to filter shows
-    current_time = datetime.now()
 
-    # Query for past shows with artist details
-    past_shows = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue.id,
-        Show.start_time < current_time,
-    ).with_entities(
+def venue_page_queries(venue_id, now):
+    # Venue row, past shows and upcoming shows: three independent statements,
+    # shared with the async detail views in asgi.py
+    venue = select(*VENUE_PAGE_COLUMNS).where(Venue.id == venue_id)
+    shows = select(
         Artist.id.label('artist_id'),
         Artist.name.label('artist_name'),
         Artist.image_link.label('artist_image_link'),
         Show.start_time.label('start_time')
-    ).all()
+    ).join(Artist, Artist.id == Show.artist_id).where(Show.venue_id == venue_id)
+    past_shows = shows.where(Show.start_time < now).order_by(Show.start_time.desc())
+    upcoming_shows = shows.where(Show.start_time >= now).order_by(Show.start_time)
+    return venue, past_shows, upcoming_shows
 
-    # Query for upcoming shows with artist details
-    upcoming_shows = db.session.query(Show).join(Artist).filter(
-        Show.venue_id == venue.id,
-        Show.start_time >= current_time,
-    ).with_entities(
-        Artist.id.label('artist_id'),
-        Artist.name.label('artist_name'),
-        Artist.image_link.label('artist_image_link'),
-        Show.start_time.label('start_time')
-    ).all()
 
+def venue_page(venue, past_shows, upcoming_shows):
     # Format show data for template
-    venue_data = {
+    return {
         "id": venue.id,
         "name": venue.name,
         "genres": venue.genres,
@@ -136,18 +280,42 @@ def show_venue(venue_id):
             "artist_id": show.artist_id,
             "artist_name": show.artist_name,
             "artist_image_link": show.artist_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S")
-        } for show in past_shows],
+            "start_time": show.start_time,
+            "start_time_label": label
+        } for show, label in zip(past_shows, format_datetimes(
+            [show.start_time for show in past_shows], 'full'))],
         "upcoming_shows": [{
             "artist_id": show.artist_id,
             "artist_name": show.artist_name,
             "artist_image_link": show.artist_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S")
-        } for show in upcoming_shows],
+            "start_time": show.start_time,
+            "start_time_label": label
+        } for show, label in zip(upcoming_shows, format_datetimes(
+            [show.start_time for show in upcoming_shows], 'full'))],
         "past_shows_count": len(past_shows),
         "upcoming_shows_count": len(upcoming_shows)
     }
 
+
+def venue_page_data(venue_id):
+    venue_query, past_query, upcoming_query = venue_page_queries(venue_id, datetime.now())
+    venue = db.session.execute(venue_query).first()
+    if venue is None:
+        return None
+    return venue_page(venue, db.session.execute(past_query).all(), db.session.execute(upcoming_query).all())
+
+
+@app.route('/venues/<int:venue_id>')
+@read_replica
+@conditional(venue_validators)
+def show_venue(venue_id):
+    venue_data = page_cache.get_or_set(
+        venue_key(venue_id), lambda: fill_from_primary(venue_page_data, venue_id),
+        ttl=page_ttl, version=g.get('etag')
+    )
+    if venue_data is None:
+        abort(404)
+
     # Render the venue data to the template
     return render_template('pages/show_venue.html', venue=venue_data)
 
@@ -183,6 +351,7 @@ def create_venue_submission():
             )
             db.session.add(venue)
             db.session.commit()
+            search_engine.index(venue)
             flash(f'Venue "{form.name.data}" was successfully listed!', 'success')
             return redirect(url_for('index'))  # Redirect to home page on success
 
@@ -233,13 +402,14 @@ def create_venue_submission():
 @app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   try:
-    venue = Venue.query.get(venue_id)
-    if venue:
-      db.session.delete(venue)
-      db.session.commit()
-      flash(f'Venue {venue.name} was successfully deleted!')
-    else:
+    deletion = deletions.delete(Venue, venue_id)
+    if deletion is None:
       flash(f'Venue with ID {venue_id} not found.')
+    elif deletion.state == 'done':
+      flash(f'Venue {deletion.name} was successfully deleted!')
+    else:
+      # Too many shows to delete inside the request; poll the Location
+      return jsonify(deletion.to_dict()), 202, {'Location': url_for('venue_deletion', id=venue_id)}
   except Exception as e:
     db.session.rollback()
     flash(f'An error occurred. Venue could not be deleted.')
@@ -252,24 +422,47 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@read_replica
+@conditional(artists_validators)
 def artists():
-    artists = Artist.query.all()
-    data = []
+    cursor = decode_cursor(request.args.get('after'), str, int)
+    limit = page_size(request.args.get('limit'))
+    current_time = datetime.now()
+    filters = parse_filters('artists', request.args)
+
+    # Upcoming show count as a correlated aggregate subquery, so it is only
+    # evaluated for the artists on this page
+    num_upcoming_shows = db.session.query(
+        func.count(Show.id)
+    ).filter(
+        Show.artist_id == Artist.id,
+        Show.start_time > current_time
+    ).correlate(Artist).scalar_subquery()
+
+    query = db.session.query(Artist).with_entities(
+        Artist.id.label('id'),
+        Artist.name.label('name'),
+        num_upcoming_shows.label('num_upcoming_shows')
+    ).filter(*filter_clauses('artists', filters))
+    rows, next_cursor = paginate(query, [Artist.name, Artist.id], cursor, limit)
 
-    for artist in artists:
+    data = []
+    for artist in rows:
         data.append({
             "id": artist.id,
             "name": artist.name,
-            "num_upcoming_shows": len([show for show in artist.shows if show.start_time > datetime.now()])
+            "num_upcoming_shows": artist.num_upcoming_shows
         })
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=data, limit=limit, next_cursor=next_cursor,
+                           filter_args=query_args(filters), facets=facet_panel('artists', 'artists', filters))
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_replica
 def search_artists():
     search_term = request.form.get('search_term', '')
-    artists = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).all()
+    artists = search_engine.search_artists(search_term)
     response = {
         "count": len(artists),
         "data": [{"id": artist.id, "name": artist.name} for artist in artists]
@@ -277,38 +470,27 @@ def search_artists():
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    # Get the artist by ID
-    artist = Artist.query.get(artist_id)
+ARTIST_PAGE_COLUMNS = (Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state, Artist.phone,
+                       Artist.website, Artist.facebook_link, Artist.seeking_venue,
+                       Artist.seeking_description, Artist.image_link)
 
-    # Retrieve the current time to filter shows
-    current_time = datetime.now()
 
-    # Query for past shows with venue details
-    past_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist.id,
-        Show.start_time < current_time,
-    ).with_entities(
+def artist_page_queries(artist_id, now):
+    artist = select(*ARTIST_PAGE_COLUMNS).where(Artist.id == artist_id)
+    shows = select(
         Venue.id.label('venue_id'),
         Venue.name.label('venue_name'),
         Venue.image_link.label('venue_image_link'),
         Show.start_time.label('start_time')
-    ).all()
+    ).join(Venue, Venue.id == Show.venue_id).where(Show.artist_id == artist_id)
+    past_shows = shows.where(Show.start_time < now).order_by(Show.start_time.desc())
+    upcoming_shows = shows.where(Show.start_time >= now).order_by(Show.start_time)
+    return artist, past_shows, upcoming_shows
 
-    # Query for upcoming shows with venue details
-    upcoming_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist.id,
-        Show.start_time >= current_time,
-    ).with_entities(
-        Venue.id.label('venue_id'),
-        Venue.name.label('venue_name'),
-        Venue.image_link.label('venue_image_link'),
-        Show.start_time.label('start_time')
-    ).all()
 
+def artist_page(artist, past_shows, upcoming_shows):
     # Format artist data for the template
-    artist_data = {
+    return {
         "id": artist.id,
         "name": artist.name,
         "genres": artist.genres,
@@ -324,24 +506,67 @@ def show_artist(artist_id):
             "venue_id": show.venue_id,
             "venue_name": show.venue_name,
             "venue_image_link": show.venue_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S")
-        } for show in past_shows],
+            "start_time": show.start_time,
+            "start_time_label": label
+        } for show, label in zip(past_shows, format_datetimes(
+            [show.start_time for show in past_shows], 'full'))],
         "upcoming_shows": [{
             "venue_id": show.venue_id,
             "venue_name": show.venue_name,
             "venue_image_link": show.venue_image_link,
-            "start_time": show.start_time.strftime("%Y-%m-%d %H:%M:%S")
-        } for show in upcoming_shows],
+            "start_time": show.start_time,
+            "start_time_label": label
+        } for show, label in zip(upcoming_shows, format_datetimes(
+            [show.start_time for show in upcoming_shows], 'full'))],
         "past_shows_count": len(past_shows),
         "upcoming_shows_count": len(upcoming_shows)
     }
 
+
+def artist_page_data(artist_id):
+    artist_query, past_query, upcoming_query = artist_page_queries(artist_id, datetime.now())
+    artist = db.session.execute(artist_query).first()
+    if artist is None:
+        return None
+    return artist_page(artist, db.session.execute(past_query).all(), db.session.execute(upcoming_query).all())
+
+
+@app.route('/artists/<int:artist_id>')
+@read_replica
+@conditional(artist_validators)
+def show_artist(artist_id):
+    artist_data = page_cache.get_or_set(
+        artist_key(artist_id), lambda: fill_from_primary(artist_page_data, artist_id),
+        ttl=page_ttl, version=g.get('etag')
+    )
+    if artist_data is None:
+        abort(404)
+
     # Render the artist data to the template
     return render_template('pages/show_artist.html', artist=artist_data)
 
 
 #  Update
 #  ----------------------------------------------------------------
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  try:
+    deletion = deletions.delete(Artist, artist_id)
+    if deletion is None:
+      flash(f'Artist with ID {artist_id} not found.')
+    elif deletion.state == 'done':
+      flash(f'Artist {deletion.name} was successfully deleted!')
+    else:
+      return jsonify(deletion.to_dict()), 202, {'Location': url_for('artist_deletion', id=artist_id)}
+  except Exception as e:
+    db.session.rollback()
+    flash(f'An error occurred. Artist could not be deleted.')
+  finally:
+    db.session.close()
+
+  return redirect(url_for('artists'))
+
+
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   artist = Artist.query.get(artist_id)
@@ -388,7 +613,10 @@ def edit_artist_submission(artist_id):
     artist.seeking_description = request.form.get('seeking_description')
     artist.image_link = request.form.get('image_link')
 
+    dependents = schedule_dependents('artists', artist_id)
     db.session.commit()
+    search_engine.index(artist)
+    page_cache.invalidate(artist_key(artist_id), *dependents)
     flash(f'Artist {artist.name} was successfully updated!')
   except Exception as e:
     db.session.rollback()
@@ -447,7 +675,10 @@ def edit_venue_submission(venue_id):
     venue.seeking_description = request.form.get('seeking_description')
     venue.image_link = request.form.get('image_link')
 
+    dependents = schedule_dependents('venues', venue_id)
     db.session.commit()
+    search_engine.index(venue)
+    page_cache.invalidate(venue_key(venue_id), *dependents)
     flash(f'Venue {venue.name} was successfully updated!')
   except Exception as e:
     db.session.rollback()
@@ -488,6 +719,7 @@ def create_artist_submission():
             )
             db.session.add(artist)
             db.session.commit()
+            search_engine.index(artist)
             flash(f'Artist "{form.name.data}" was successfully listed!', 'success')
             return redirect(url_for('index'))  # Redirect to home page on success
 
@@ -512,19 +744,51 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_replica
+@conditional(shows_validators)
 def shows():
-    shows = Show.query.all()
+    when = request.args.get('when', 'all')
+    if when not in ('all', 'upcoming', 'past'):
+        when = 'all'
+    cursor = decode_cursor(request.args.get('after'), datetime, int)
+    limit = page_size(request.args.get('limit'))
+    current_time = datetime.now()
+
+    # Venue and artist columns come from the same SELECT, no lazy loads
+    query = db.session.query(Show).join(Venue).join(Artist).with_entities(
+        Show.id.label('id'),
+        Show.start_time.label('start_time'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    )
+    if when == 'upcoming':
+        query = query.filter(Show.start_time >= current_time)
+    elif when == 'past':
+        query = query.filter(Show.start_time < current_time)
+
+    # Past shows read most recent first, everything else in calendar order
+    rows, next_cursor = paginate(
+        query, [Show.start_time, Show.id], cursor, limit, descending=(when == 'past')
+    )
+
+    # Format every start time on the page in one batch
+    labels = format_datetimes([show.start_time for show in rows], 'full')
+
     data = []
-    for show in shows:
+    for show, label in zip(rows, labels):
         data.append({
             "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
+            "venue_name": show.venue_name,
             "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": str(show.start_time)
+            "artist_name": show.artist_name,
+            "artist_image_link": show.artist_image_link,
+            "start_time": show.start_time,
+            "start_time_label": label
         })
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=data, when=when, limit=limit, next_cursor=next_cursor)
 
 
 @app.route('/shows/create')
@@ -543,13 +807,31 @@ def create_show_submission():
             show = Show(
                 artist_id=form.artist_id.data,
                 venue_id=form.venue_id.data,
-                start_time=form.start_time.data
+                start_time=form.start_time.data,
+                duration_minutes=form.duration_minutes.data or DEFAULT_SHOW_MINUTES
             )
             db.session.add(show)
+            # Both detail pages list the new show
+            venue_id, artist_id = form.venue_id.data, form.artist_id.data
+            touch(Venue, [venue_id])
+            touch(Artist, [artist_id])
             db.session.commit()
+            page_cache.invalidate(venue_key(venue_id), artist_key(artist_id))
             flash('Show was successfully listed!', 'success')
             return redirect(url_for('index'))  # Redirect to home page on success
 
+        except IntegrityError as e:
+            db.session.rollback()
+            conflict = booking_conflict(e)
+            if conflict is None:
+                app.logger.exception('Show could not be listed')
+                flash('An error occurred. Show could not be listed.', 'error')
+            else:
+                # Double booking: show the form again with the reason
+                form.start_time.errors.append(conflict)
+                flash(conflict, 'error')
+                return render_template('forms/new_show.html', form=form), 409
+
         except Exception as e:
             db.session.rollback()
             flash('An error occurred. Show could not be listed.', 'error')
@@ -574,7 +856,7 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
+if not app.debug and not app.testing:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
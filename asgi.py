@@ -0,0 +1,246 @@
+import asyncio
+import io
+from datetime import datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import Response, abort, render_template, request, session
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+
+from app import (app, page_ttl, venue_page, venue_page_queries, artist_page, artist_page_queries)
+from cache import MISSING, page_cache, venue_key, artist_key
+from conditional import (entity_validators, set_validators, venue_validator_query,
+                         artist_validator_query)
+from models import db
+from routing import router
+
+# ASGI entry point: `uvicorn asgi:application --workers 4`.
+#
+# The venue and artist detail pages are served by async views on
+# SQLAlchemy's asyncio engine (asyncpg). Their three independent statements
+# (the entity row, past shows, upcoming shows) run concurrently on separate
+# pooled connections, so a worker waits on one round-trip instead of three
+# and keeps serving other requests meanwhile. Queries, page-cache entries,
+# validators and templates are the same ones the sync views use, and the
+# app's before/after-request hooks (profiler, metrics) still run; the SQL
+# profiler's Engine listeners see the async engines' statements too.
+#
+# Like the sync views (@read_replica, fill_from_primary in app.py), the
+# validator query goes to a replica unless the client just wrote, and the
+# queries that fill the page cache go to the primary. Each replica bind
+# gets its own async engine; replica choice and health are the router's.
+#
+# Page-cache calls (a network round-trip with the shared backend), building
+# the page data and rendering the template are blocking, so they run in the
+# default thread pool through asyncio.to_thread. It copies the context
+# variables holding Flask's request context into the thread.
+#
+# Every other request, and any request whose session carries flashed
+# messages, goes to the Flask app through WsgiToAsgi (a thread pool).
+# `wsgi_application` is that sync path alone, for comparison
+# (benchmarks/asgi.py).
+
+
+def async_database_uri(uri):
+    scheme, _, rest = uri.partition('://')
+    return 'postgresql+asyncpg://' + rest if scheme.startswith('postgres') else uri
+
+
+def async_engine_options(config):
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}}
+    return options
+
+
+def wsgi_environ(scope):
+    # Just enough of a WSGI environ for a bodyless GET/HEAD request context
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        value = value.decode('latin-1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+class DetailPage:
+
+    def __init__(self, name, cache_key, validator_query, page_queries, build, template):
+        self.name = name
+        self.cache_key = cache_key
+        self.validator_query = validator_query
+        self.page_queries = page_queries
+        self.build = build
+        self.template = template
+
+
+PAGES = {
+    'show_venue': DetailPage('venue', venue_key, venue_validator_query, venue_page_queries, venue_page,
+                             'pages/show_venue.html'),
+    'show_artist': DetailPage('artist', artist_key, artist_validator_query, artist_page_queries, artist_page,
+                              'pages/show_artist.html'),
+}
+
+
+class AsyncReadApp:
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = None
+        self.replicas = {}  # bind key -> async engine
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            try:
+                endpoint, args = self.flask_app.url_map.bind('').match(scope['path'], scope['method'])
+            except HTTPException:
+                endpoint = None
+            if endpoint in PAGES:
+                return await self.detail(PAGES[endpoint], args, scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.get_engine()
+                for key in router.keys:
+                    self.get_engine(key)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_engine(self, key=None):
+        # The primary's engine, or the replica bind `key`'s
+        config = self.flask_app.config
+        if key is None:
+            if self.engine is None:
+                self.engine = create_async_engine(async_database_uri(config['SQLALCHEMY_DATABASE_URI']),
+                                                  **async_engine_options(config))
+            return self.engine
+        engine = self.replicas.get(key)
+        if engine is None:
+            engine = create_async_engine(async_database_uri(config['SQLALCHEMY_BINDS'][key]),
+                                         **async_engine_options(config))
+            router.track(engine.sync_engine, key)
+            self.replicas[key] = engine
+        return engine
+
+    async def read_engine(self):
+        # What @read_replica would read from: a healthy replica unless the
+        # client is pinned to the primary after a write. A due health check
+        # connects, so the choice runs in a thread.
+        if not router.keys or router.pinned():
+            return self.get_engine()
+        key = await asyncio.to_thread(router.replica_key, db.engines)
+        return self.get_engine(key)
+
+    async def dispose(self):
+        for engine in [self.engine, *self.replicas.values()]:
+            if engine is not None:
+                await engine.dispose()
+        self.engine = None
+        self.replicas = {}
+
+    async def fetch(self, statement, first=False, engine=None):
+        async with (engine or self.get_engine()).connect() as connection:
+            result = await connection.execute(statement)
+            return result.first() if first else result.all()
+
+    async def detail(self, page, args, scope, receive, send):
+        id = next(iter(args.values()))
+        ctx = self.flask_app.request_context(wsgi_environ(scope))
+        ctx.push()
+        try:
+            if session.get('_flashes'):
+                # Rendering would consume the flashes; let Flask save the session
+                ctx.pop()
+                ctx = None
+                return await self.wsgi(scope, receive, send)
+            try:
+                rv = self.flask_app.preprocess_request()
+                if rv is None:
+                    rv = await self.render_detail(page, id)
+            except Exception as e:
+                try:
+                    rv = self.flask_app.handle_user_exception(e)
+                except Exception as unhandled:
+                    rv = self.flask_app.handle_exception(unhandled)
+            response = self.flask_app.finalize_request(rv)
+        finally:
+            if ctx is not None:
+                ctx.pop()
+        await self.respond(response, scope, send)
+
+    async def render_detail(self, page, id):
+        now = datetime.now()
+        validator_row = await self.fetch(page.validator_query(id, now), first=True, engine=await self.read_engine())
+        validators = entity_validators(page.name, id, validator_row)
+        if validators is None:
+            abort(404)
+        etag, last_modified = validators
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            return set_validators(Response(status=304), etag, last_modified)
+
+        data = await asyncio.to_thread(page_cache.get, page.cache_key(id), version=etag)
+        if data is MISSING:
+            # Cache fills read the primary
+            entity_query, past_query, upcoming_query = page.page_queries(id, now)
+            entity, past_shows, upcoming_shows = await asyncio.gather(
+                self.fetch(entity_query, first=True), self.fetch(past_query), self.fetch(upcoming_query)
+            )
+            data = None
+            if entity is not None:
+                data = await asyncio.to_thread(self.build_and_cache, page, id, etag, entity, past_shows,
+                                               upcoming_shows)
+        if data is None:
+            abort(404)
+        body = await asyncio.to_thread(render_template, page.template, **{page.name: data})
+        return set_validators(self.flask_app.make_response(body), etag, last_modified)
+
+    def build_and_cache(self, page, id, etag, entity, past_shows, upcoming_shows):
+        data = page.build(entity, past_shows, upcoming_shows)
+        page_cache.set(page.cache_key(id), data, ttl=page_ttl, version=etag)
+        return data
+
+    async def respond(self, response, scope, send):
+        body = b'' if scope['method'] == 'HEAD' else response.get_data()
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in response.headers.items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+application = AsyncReadApp(app)
+wsgi_application = WsgiToAsgi(app)
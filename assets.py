@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import time
+
+import click
+from flask import abort, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+# Fingerprinted, precompressed static assets.
+#
+# `flask build-assets` copies every file under static/ to ASSETS_BUILD_DIR
+# as <name>.<content hash>.<ext>, with url(...) references in CSS and
+# sourceMappingURL comments in JS rewritten to the hashed names first, so a
+# stylesheet's hash covers the fonts and images it loads. Text-like files
+# also get .gz and, when the optional brotli package is installed, .br
+# variants, kept only when smaller. manifest.json maps each source path to
+# its hashed path and variants. Files of earlier builds are left in place:
+# pages cached before a deploy still point at them.
+#
+# Templates link assets through asset_url('css/main.css'). With
+# ASSETS_FINGERPRINT on and a manifest present that is /assets/<hashed
+# path>, served in the best encoding the client accepts with a one-year
+# immutable Cache-Control; otherwise it is the plain /static URL, so
+# development needs no build step.
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Compressing already-compressed formats (images, woff) only costs CPU
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+ENCODINGS = (
+    # (Content-Encoding, file suffix), in order of preference
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+CSS_URL_RE = re.compile(r'''url\(\s*(['"]?)([^'")\s]+)\1\s*\)''')
+SOURCE_MAP_RE = re.compile(r'(//[#@] sourceMappingURL=)(\S+)')
+
+
+def hashed_name(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = posixpath.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+
+def rewrite_reference(source, reference, hashed):
+    # A path relative to the file that references it, mapped to its hashed
+    # counterpart; query strings and fragments (font hacks) are kept
+    if reference.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+        return reference
+    split = re.search(r'[?#]', reference)
+    path, suffix = (reference[:split.start()], reference[split.start():]) if split else (reference, '')
+    base = posixpath.dirname(source)
+    target = posixpath.normpath(posixpath.join(base, path))
+    if target not in hashed:
+        return reference
+    # Hashing renames files within their directory, so base still applies
+    return posixpath.relpath(hashed[target], base or '.') + suffix
+
+
+def rewrite(source, content, hashed):
+    ext = posixpath.splitext(source)[1]
+    if ext == '.css':
+        text = content.decode('utf-8')
+        text = CSS_URL_RE.sub(lambda match: 'url({0}{1}{0})'.format(
+            match.group(1), rewrite_reference(source, match.group(2), hashed)), text)
+        return text.encode('utf-8')
+    if ext == '.js':
+        text = content.decode('utf-8')
+        text = SOURCE_MAP_RE.sub(lambda match: match.group(1) + rewrite_reference(source, match.group(2), hashed),
+                                 text)
+        return text.encode('utf-8')
+    return content
+
+
+def compress(content):
+    # {encoding: bytes} for the variants worth keeping
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as handle:
+        handle.write(content)
+    os.replace(tmp, path)
+
+
+def build(source_dir, build_dir):
+    # Returns the manifest written to build_dir
+    sources = []
+    for root, _, names in os.walk(source_dir):
+        for name in names:
+            if name.startswith('.'):
+                continue
+            full = os.path.join(root, name)
+            sources.append(os.path.relpath(full, source_dir).replace(os.sep, '/'))
+    # Referenced files first: CSS is rewritten against their hashed names,
+    # and JS against source maps
+    order = {'.css': 2, '.js': 1}
+    sources.sort(key=lambda path: (order.get(posixpath.splitext(path)[1], 0), path))
+
+    hashed, manifest = {}, {}
+    for source in sources:
+        with open(os.path.join(source_dir, source), 'rb') as handle:
+            content = rewrite(source, handle.read(), hashed)
+        target = hashed[source] = hashed_name(source, content)
+        destination = os.path.join(build_dir, target)
+        entry = {'path': target, 'size': len(content), 'encodings': {}}
+        if not os.path.exists(destination):
+            write_file(destination, content)
+        if posixpath.splitext(source)[1] in COMPRESSIBLE:
+            suffixes = dict(ENCODINGS)
+            for encoding, data in compress(content).items():
+                variant = destination + suffixes[encoding]
+                if not os.path.exists(variant):
+                    write_file(variant, data)
+                entry['encodings'][encoding] = len(data)
+        manifest[source] = entry
+    write_file(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class Assets:
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.enabled = False
+        self.manifest = {}
+        self.encodings = {}  # hashed path -> encodings available
+        self.version = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = app.config.get('ASSETS_BUILD_DIR') or os.path.join(app.root_path, 'build', 'assets')
+        self.enabled = app.config.get('ASSETS_FINGERPRINT', True)
+        if self.enabled:
+            self.load()
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+
+    def load(self):
+        path = os.path.join(self.directory, MANIFEST)
+        try:
+            with open(path, 'rb') as handle:
+                raw = handle.read()
+        except FileNotFoundError:
+            self.manifest, self.encodings, self.version = {}, {}, ''
+            return
+        self.manifest = json.loads(raw)
+        self.encodings = {entry['path']: entry['encodings'] for entry in self.manifest.values()}
+        # Pages embed asset URLs, so a new build changes their ETags too
+        self.version = hashlib.sha1(raw).hexdigest()[:12]
+
+    def url(self, filename):
+        entry = self.manifest.get(filename) if self.enabled else None
+        if entry is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=entry['path'])
+
+    def serve(self, filename):
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            abort(404)
+        path, encoding = filename, None
+        for name, suffix in ENCODINGS:
+            if name in encodings and request.accept_encodings[name]:
+                path, encoding = filename + suffix, name
+                break
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(self.directory, path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress static/ into ASSETS_BUILD_DIR."""
+    started = time.perf_counter()
+    manifest = build(current_app.static_folder, assets.directory)
+    variants = sum(len(entry['encodings']) for entry in manifest.values())
+    size = sum(entry['size'] for entry in manifest.values())
+    compressed = sum(min(entry['encodings'].values(), default=entry['size']) for entry in manifest.values())
+    click.echo(f'Built {len(manifest)} assets ({variants} compressed variants, {size / 1024:.0f} KiB '
+               f'-> {compressed / 1024:.0f} KiB) into {assets.directory} '
+               f'in {time.perf_counter() - started:.2f}s{"" if brotli else "; brotli not installed"}.')
@@ -0,0 +1,28 @@
+import hmac
+from functools import wraps
+
+from flask import Response, abort, current_app, request
+
+# Bearer-token access to endpoints that are not for the public: /export
+# (EXPORT_TOKEN) and the diagnostics endpoints (DIAGNOSTICS_TOKEN). Requests
+# send `Authorization: Bearer <token>`; an endpoint whose token is not set
+# is disabled and answers 404.
+
+
+def bearer_authorized(setting):
+    token = current_app.config.get(setting)
+    if not token:
+        abort(404)
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(supplied.strip(), token)
+
+
+def token_required(setting):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not bearer_authorized(setting):
+                return Response('Unauthorized', 401, {'WWW-Authenticate': 'Bearer'})
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+"""Concurrent-request throughput: async detail views vs the sync Flask path.
+
+    python benchmarks/asgi.py [--requests 2000] [--concurrency 50] [--workers 1]
+                              [--pages venues,artists] [--cache]
+
+Starts uvicorn twice on local ports, once with asgi:application (async
+detail views on asyncpg) and once with asgi:wsgi_application (the same
+Flask app behind WsgiToAsgi's thread pool), then fires --requests GETs at
+random venue/artist detail pages with --concurrency requests in flight and
+reports requests/s and p50/p95/p99 latency for each.
+
+The page cache is disabled in both servers unless --cache is given, so
+every request runs its queries. The database comes from DATABASE_URL; fill
+it with `flask seed` first. Requires uvicorn.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import select  # noqa: E402
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target, port, workers, cache):
+    env = dict(os.environ, CACHE_ENABLED='true' if cache else 'false', SQL_PROFILER_SLOW_MS='100000')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', target, '--port', str(port), '--workers', str(workers),
+         '--log-level', 'warning', '--no-access-log'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{target} did not start on port {port}')
+
+
+async def get(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def load(port, paths, concurrency):
+    queue = list(paths)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            started = time.perf_counter()
+            status = await get(port, path)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), errors
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--pages', default='venues,artists')
+    parser.add_argument('--cache', action='store_true', help='Leave the page cache on.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with app.app_context():
+        ids = {'venues': db.session.execute(select(Venue.id).limit(1000)).scalars().all(),
+               'artists': db.session.execute(select(Artist.id).limit(1000)).scalars().all()}
+    rng = random.Random(args.seed)
+    kinds = [kind for kind in args.pages.split(',') if ids.get(kind)]
+    paths = []
+    for _ in range(args.requests):
+        kind = rng.choice(kinds)
+        paths.append(f'/{kind}/{rng.choice(ids[kind])}')
+
+    for label, target in (('sync (WsgiToAsgi)', 'asgi:wsgi_application'), ('async', 'asgi:application')):
+        port = free_port()
+        server = start_server(target, port, args.workers, args.cache)
+        try:
+            asyncio.run(load(port, paths[:args.concurrency], args.concurrency))  # warm up
+            elapsed, latencies, errors = asyncio.run(load(port, paths, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{label:>18}: {len(paths) / elapsed:8.1f} req/s  p50 {percentile(latencies, 0.5):7.1f} ms  '
+              f'p95 {percentile(latencies, 0.95):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  '
+              f'errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark: the `datetime` Jinja filter, old path vs new path.
+
+    python benchmarks/datetime_filter.py [--count 5000] [--repeat 5]
+
+legacy      str(datetime) -> dateutil.parser.parse -> babel.dates.format_datetime
+            (what the views and filter did before: format, parse back, format)
+native      formatting.format_datetime on the datetime object, cached pattern
+batch       formatting.format_datetimes over the whole list in one call
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import format_datetime, format_datetimes  # noqa: E402
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000, help='start times per render')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 1, 20, 0)
+    values = [start + timedelta(hours=7 * i, minutes=i % 60) for i in range(args.count)]
+
+    # Same output before timing anything
+    legacy = [legacy_format_datetime(str(value), 'full') for value in values]
+    assert legacy == [format_datetime(value, 'full') for value in values]
+    assert legacy == format_datetimes(values, 'full')
+
+    cases = {
+        'legacy': lambda: [legacy_format_datetime(str(value), 'full') for value in values],
+        'native': lambda: [format_datetime(value, 'full') for value in values],
+        'batch': lambda: format_datetimes(values, 'full'),
+    }
+    baseline = None
+    print(f'{args.count} start times, best of {args.repeat}')
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f'{name:>8}: {best * 1000:8.1f} ms  {args.count / best:10.0f} values/s  x{baseline / best:.1f}')
+
+
+if __name__ == '__main__':
+    main()
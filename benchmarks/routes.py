@@ -0,0 +1,189 @@
+"""Route benchmark: latency percentiles and queries per request.
+
+    python benchmarks/routes.py [--iterations 50] [--warmup 5] [--cold]
+                                [--only REGEX] [--output FILE] [--compare FILE]
+
+Runs every GET route in app.py (plus the search POSTs and a few query-string
+variants) through the Flask test client against the configured database
+(`flask seed` fills it) and reports p50/p95/p99 latency and SQL statements
+per request. URL parameters are filled from the first venue, artist and
+show. Export downloads are skipped; use benchmarks/export.py for those.
+
+Results are written as JSON (benchmarks/results/<time>-<commit>.json by
+default) with the commit, row counts and settings, so runs can be compared:
+--compare prints the p50/p95 change against an earlier file. --cold clears
+the page cache before every request.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, select  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import app  # noqa: E402
+from cache import page_cache  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+
+SKIP_ENDPOINTS = {'static', 'export.download'}
+EXTRA_CASES = [
+    ('GET', '/shows?when=upcoming', None),
+    ('GET', '/shows?when=past', None),
+    ('GET', '/api/v1/shows?fields=id,start_time,venue_name&limit=100', None),
+]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def sample_values():
+    first = lambda model: db.session.execute(select(func.min(model.id))).scalar()  # noqa: E731
+    venue_id, artist_id, show_id = first(Venue), first(Artist), first(Show)
+    return {
+        'venue_id': venue_id, 'artist_id': artist_id, 'id': show_id,
+        'resource_name': 'shows', 'entity': 'shows', 'fmt': 'ndjson',
+    }
+
+
+def route_cases():
+    values = sample_values()
+    cases = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.endpoint in SKIP_ENDPOINTS or 'GET' not in rule.methods:
+            continue
+        if any(values.get(argument) is None for argument in rule.arguments):
+            continue
+        path = rule.build({argument: values[argument] for argument in rule.arguments}, append_unknown=False)[1]
+        if ('GET', path, None) not in cases:
+            cases.append(('GET', path, None))
+    with app.app_context():
+        venue = db.session.get(Venue, values['venue_id']) if values['venue_id'] else None
+        artist = db.session.get(Artist, values['artist_id']) if values['artist_id'] else None
+        if venue is not None:
+            cases.append(('POST', '/venues/search', {'search_term': venue.name.split()[-2]}))
+        if artist is not None:
+            cases.append(('POST', '/artists/search', {'search_term': artist.name.split()[0]}))
+    return cases + EXTRA_CASES
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_case(client, method, path, data, iterations, warmup, cold):
+    counter = {'statements': 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter['statements'] += 1
+
+    latencies, statements, statuses = [], [], set()
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        for index in range(warmup + iterations):
+            if cold:
+                page_cache.clear()
+            counter['statements'] = 0
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            if index >= warmup:
+                latencies.append(elapsed * 1000)
+                statements.append(counter['statements'])
+                statuses.add(response.status_code)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    return {
+        'method': method,
+        'path': path,
+        'status': sorted(statuses),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_mean': round(statistics.fmean(statements), 2),
+        'queries_max': max(statements),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, path):
+    with open(path) as handle:
+        previous = {case['method'] + ' ' + case['path']: case for case in json.load(handle)['results']}
+    print(f'\nchange vs {os.path.basename(path)}:')
+    for case in results:
+        before = previous.get(case['method'] + ' ' + case['path'])
+        if before is None:
+            continue
+        changes = ['{}: {:+.1f}%'.format(key, (case[key] - before[key]) / before[key] * 100 if before[key] else 0.0)
+                   for key in ('p50_ms', 'p95_ms')]
+        print(f"  {case['method']:4} {case['path'][:60]:60} {'  '.join(changes)}  "
+              f"queries {before['queries_mean']} -> {case['queries_mean']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--cold', action='store_true', help='Clear the page cache before every request.')
+    parser.add_argument('--only', help='Only run cases whose path matches this regex.')
+    parser.add_argument('--output', help='Result file (default: benchmarks/results/<time>-<commit>.json).')
+    parser.add_argument('--compare', help='Earlier result file to compare against.')
+    args = parser.parse_args()
+
+    # Benchmarks measure the views, not CSRF or the profiler's N+1 guard
+    app.config.update(WTF_CSRF_ENABLED=False, SQL_PROFILER_RAISE=False)
+    with app.app_context():
+        counts = {model.__tablename__: db.session.execute(select(func.count()).select_from(model)).scalar()
+                  for model in (Venue, Artist, Show)}
+        cases = route_cases()
+    if args.only:
+        cases = [case for case in cases if re.search(args.only, case[1])]
+
+    print(f"{counts['venues']} venues, {counts['artists']} artists, {counts['shows']} shows; "
+          f'{args.iterations} iterations after {args.warmup} warmup')
+    print(f"  {'':4} {'path':60} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8}")
+    client = app.test_client()
+    results = []
+    for method, path, data in cases:
+        result = run_case(client, method, path, data, args.iterations, args.warmup, args.cold)
+        results.append(result)
+        print(f"  {method:4} {path[:60]:60} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+              f"{result['p99_ms']:9.2f} {result['queries_mean']:8.1f}")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'rows': counts,
+        'settings': {'iterations': args.iterations, 'warmup': args.warmup, 'cold': args.cold},
+        'results': results,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f'\nwrote {output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
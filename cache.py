@@ -0,0 +1,227 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Read-through cache for rendered page data (venue and artist detail pages).
+#
+# Two backends share the get/set/delete/clear interface:
+#
+#   MemoryCache      in-process, size-bounded LRU with per-entry TTL
+#   SharedStoreCache any Redis-compatible client (get, set(ex=), delete);
+#                    eviction is left to the store's own maxmemory policy
+#
+# PageCache puts hit/miss counters and the read-through helper in front of
+# whichever backend CACHE_BACKEND selects. Entries are stored with a version,
+# the page's ETag from its validator query (conditional.py): a lookup under
+# another version is a miss, so a body cached before a write that this
+# process never saw invalidated is not served under the newer ETag.
+
+MISSING = object()
+
+
+class MemoryCache:
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalStoreClient:
+    # Stand-in for a Redis client, implementing only the calls that
+    # SharedStoreCache makes. Used in tests and when no CACHE_REDIS_URL is set.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (None if ex is None else time.monotonic() + ex, value)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match=None):
+        prefix = (match or '*').rstrip('*')
+        with self._lock:
+            names = [name for name in self._data if name.startswith(prefix)]
+        return iter(names)
+
+
+class SharedStoreCache:
+
+    def __init__(self, client, default_ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return MISSING
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        names = list(self.client.scan_iter(match=self.prefix + '*'))
+        if names:
+            self.client.delete(*names)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+def make_shared_client(url):
+    if url is None:
+        return LocalStoreClient()
+    # Optional dependency, only needed for CACHE_BACKEND = 'shared'
+    import redis
+    return redis.Redis.from_url(url)
+
+
+class PageCache:
+
+    def __init__(self, app=None):
+        self.backend = MemoryCache()
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if app.config.get('CACHE_BACKEND', 'memory') == 'shared':
+            client = make_shared_client(app.config.get('CACHE_REDIS_URL'))
+            self.backend = SharedStoreCache(client, default_ttl=ttl,
+                                            prefix=app.config.get('CACHE_KEY_PREFIX', 'fyyur:'))
+        else:
+            self.backend = MemoryCache(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+                                       default_ttl=ttl)
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+
+    @property
+    def shared(self):
+        # Whether an invalidation here reaches every process (a job's too)
+        return self.enabled and isinstance(self.backend, SharedStoreCache)
+
+    def get_or_set(self, key, loader, ttl=None, version=None):
+        # `ttl` may be a number of seconds or a function of the loaded value.
+        # Loaders returning None (e.g. unknown id) are not cached.
+        if not self.enabled:
+            return loader()
+        value = self.get(key, version)
+        if value is not MISSING:
+            return value
+        value = loader()
+        self.set(key, value, ttl, version)
+        return value
+
+    def get(self, key, version=None):
+        # The two halves of get_or_set, for loaders that cannot be a plain
+        # callable (the async views in asgi.py); returns MISSING on a miss
+        if not self.enabled:
+            return MISSING
+        entry = self.backend.get(key)
+        stale = entry is not MISSING and entry[0] != version
+        value = MISSING if entry is MISSING or stale else entry[1]
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+                self.stale += stale
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None, version=None):
+        if self.enabled and value is not None:
+            self.backend.set(key, (version, value), ttl(value) if callable(ttl) else ttl)
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.backend.evictions,
+            'entries': len(self.backend),
+        }
+
+
+def venue_key(venue_id):
+    return f'venue:{venue_id}'
+
+
+def artist_key(artist_id):
+    return f'artist:{artist_id}'
+
+
+page_cache = PageCache()
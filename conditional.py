@@ -0,0 +1,212 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, make_response, request, session, Response
+from sqlalchemy import func, select
+from werkzeug.http import is_resource_modified
+
+from assets import assets
+from models import db, Location, Venue, Artist, Show, TableVersion
+
+# Conditional GET for entity and listing pages.
+#
+# Each page has a validator function that returns (etag, last_modified) from
+# one small statement over the updated_at columns. A page's content changes
+# when:
+#   - one of its rows is written (updated_at; writes that change what a
+#     detail page shows also touch the related venue/artist rows),
+#   - rows are added or removed (table_versions, a counter per table that
+#     statement triggers bump on INSERT/DELETE/TRUNCATE, sharded so that
+#     concurrent writers don't queue on one row), or
+#   - time moves a show from "upcoming" to "past". The newest past start_time
+#     is an index probe on (venue_id|artist_id, start_time) and is folded
+#     into both validators.
+# When the client's copy is current the view is skipped: no show queries and
+# no template rendering, just a 304.
+#
+# The ETag is also left on g.etag for the view: page-cache entries are
+# stored under it (see cache.py), so a cached body is only served with the
+# validators it was built for.
+
+
+def make_etag(*parts):
+    version = current_app.config.get('CONDITIONAL_GET_VERSION', '1')
+    raw = '|'.join(str(part) for part in (version, assets.version) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def as_utc(value):
+    # updated_at is stored in UTC; start_time is local wall-clock time
+    return value.replace(tzinfo=timezone.utc)
+
+
+def local_as_utc(value):
+    return value.astimezone(timezone.utc)
+
+
+def last_modified_of(updated=(), started=()):
+    moments = [as_utc(value) for value in updated if value is not None]
+    moments += [local_as_utc(value) for value in started if value is not None]
+    return max(moments) if moments else None
+
+
+def conditional(validator):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            validators = validator(*args, **kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            etag, last_modified = validators
+            g.etag = etag
+            # Pages carrying flashed messages are per-user, never revalidate them
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = Response(status=304)
+
+            return set_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def set_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def _latest_past_start(column, id, now):
+    return select(func.max(Show.start_time)).where(
+        column == id, Show.start_time < now
+    ).scalar_subquery()
+
+
+def venue_validator_query(venue_id, now):
+    return select(
+        Venue.updated_at,
+        _latest_past_start(Show.venue_id, venue_id, now)
+    ).where(Venue.id == venue_id)
+
+
+def artist_validator_query(artist_id, now):
+    return select(
+        Artist.updated_at,
+        _latest_past_start(Show.artist_id, artist_id, now)
+    ).where(Artist.id == artist_id)
+
+
+def entity_validators(name, id, row):
+    # (etag, last_modified) from a *_validator_query row; None if no such row
+    if row is None:
+        return None
+    updated_at, last_transition = row
+    return (make_etag(name, id, updated_at, last_transition),
+            last_modified_of([updated_at], [last_transition]))
+
+
+def venue_validators(venue_id):
+    row = db.session.execute(venue_validator_query(venue_id, datetime.now())).first()
+    return entity_validators('venue', venue_id, row)
+
+
+def artist_validators(artist_id):
+    row = db.session.execute(artist_validator_query(artist_id, datetime.now())).first()
+    return entity_validators('artist', artist_id, row)
+
+
+def _feed_validators(name, model, id):
+    # Feeds list every show regardless of time, so updated_at alone decides
+    row = db.session.execute(select(model.updated_at).where(model.id == id)).first()
+    if row is None:
+        return None
+    return make_etag(name, id, row.updated_at), last_modified_of([row.updated_at])
+
+
+def venue_feed_validators(venue_id):
+    return _feed_validators('venue.ics', Venue, venue_id)
+
+
+def artist_feed_validators(artist_id):
+    return _feed_validators('artist.ics', Artist, artist_id)
+
+
+def _table_version(model):
+    return select(func.sum(TableVersion.version, type_=db.BigInteger)).where(
+        TableVersion.table_name == model.__tablename__).scalar_subquery()
+
+
+def _listing_validators(name, model, *extra):
+    # Shows only disappear through a venue/artist delete, which bumps the
+    # table versions here or touches the rows they were listed under
+    now = datetime.now()
+    row = db.session.execute(select(
+        select(func.max(model.updated_at)).scalar_subquery(),
+        select(func.max(Show.updated_at)).scalar_subquery(),
+        select(func.max(Show.start_time)).where(Show.start_time < now).scalar_subquery(),
+        _table_version(model),
+        _table_version(Show),
+        *[select(column).scalar_subquery() for column in extra],
+    )).one()
+    model_updated, show_updated, last_transition, model_version = row[:4]
+    # For data derived from the listed rows alone, whatever the query string
+    # (the facet counts, facets.py)
+    g.rows_version = make_etag(name, model_updated, model_version)
+    return (make_etag(name, request.query_string.decode('latin-1'), *row),
+            last_modified_of([model_updated, show_updated], [last_transition]))
+
+
+def rows_version(name, model):
+    # g.rows_version as _listing_validators computes it, outside a request
+    row = db.session.execute(select(
+        select(func.max(model.updated_at)).scalar_subquery(),
+        _table_version(model),
+    )).one()
+    return make_etag(name, *row)
+
+
+def venues_validators():
+    # The area listing shows location counts, which a reconcile can change
+    return _listing_validators('venues', Venue, func.max(Location.counted_at))
+
+
+def artists_validators():
+    return _listing_validators('artists', Artist)
+
+
+def shows_validators():
+    now = datetime.now()
+    row = db.session.execute(select(
+        select(func.max(Show.updated_at)).scalar_subquery(),
+        select(func.max(Venue.updated_at)).scalar_subquery(),
+        select(func.max(Artist.updated_at)).scalar_subquery(),
+        select(func.max(Show.start_time)).where(Show.start_time < now).scalar_subquery(),
+        _table_version(Show),
+        _table_version(Venue),
+        _table_version(Artist),
+    )).one()
+    show_updated, venue_updated, artist_updated, last_transition = row[:4]
+    return (make_etag('shows', request.query_string.decode('latin-1'), *row),
+            last_modified_of([show_updated, venue_updated, artist_updated], [last_transition]))
+
+
+def touch(model, ids):
+    # Bump updated_at on rows whose page shows data owned by another row,
+    # e.g. an artist's page after one of its venues was renamed
+    ids = list(ids)
+    if ids:
+        db.session.query(model).filter(model.id.in_(ids)).update(
+            {model.updated_at: datetime.utcnow()}, synchronize_session=False
+        )
@@ -3,11 +3,125 @@ SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Deployment environment: development, testing or production.
+ENVIRONMENT = os.environ.get('FYYUR_ENV', 'development')
+
 # Enable debug mode.
-DEBUG = True
+DEBUG = ENVIRONMENT == 'development'
+TESTING = ENVIRONMENT == 'testing'
 
 # Connect to the database
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://tunguyen:@localhost:5432/fyyur')
+if SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
+    # Heroku-style URLs; SQLAlchemy only accepts the postgresql:// scheme
+    SQLALCHEMY_DATABASE_URI = 'postgresql://' + SQLALCHEMY_DATABASE_URI[len('postgres://'):]
+
+# Read replicas (see routing.py): comma-separated URLs. Views marked
+# @read_replica read from them; a client that just wrote reads the primary
+# for REPLICA_STICKY_SECONDS. Unreachable replicas are retried after
+# REPLICA_RETRY_SECONDS.
+SQLALCHEMY_REPLICA_URIS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+REPLICA_RETRY_SECONDS = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+REPLICA_HEALTH_INTERVAL = int(os.environ.get('REPLICA_HEALTH_INTERVAL', 5))
+
+# Connection pool, per worker process (see pool.py). Each value can be
+# overridden with the environment variable of the same name. Size pools so
+# that workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below the server's
+# max_connections; /_stats/pool shows checkout waits and overflow use.
+POOL_PROFILES = {
+    'development': {'DB_POOL_SIZE': 5, 'DB_MAX_OVERFLOW': 5, 'DB_POOL_TIMEOUT': 10,
+                    'DB_POOL_RECYCLE': 1800, 'DB_STATEMENT_TIMEOUT_MS': 30000},
+    'testing': {'DB_POOL_SIZE': 2, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 5,
+                'DB_POOL_RECYCLE': 1800, 'DB_STATEMENT_TIMEOUT_MS': 10000},
+    'production': {'DB_POOL_SIZE': 10, 'DB_MAX_OVERFLOW': 10, 'DB_POOL_TIMEOUT': 5,
+                   'DB_POOL_RECYCLE': 1800, 'DB_STATEMENT_TIMEOUT_MS': 5000},
+}
+_pool = POOL_PROFILES.get(ENVIRONMENT, POOL_PROFILES['development'])
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', _pool['DB_POOL_SIZE']))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', _pool['DB_MAX_OVERFLOW']))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', _pool['DB_POOL_TIMEOUT']))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', _pool['DB_POOL_RECYCLE']))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() not in ('0', 'false', 'no', 'off')
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', _pool['DB_STATEMENT_TIMEOUT_MS']))
+
+# Per-request SQL profiling (see profiler.py). Requests slower than
+# SQL_PROFILER_SLOW_MS or issuing more than SQL_PROFILER_MAX_STATEMENTS are
+# logged; in tests a statement repeated more than SQL_PROFILER_REPEAT_LIMIT
+# times in one request raises.
+SQL_PROFILER_ENABLED = True
+SQL_PROFILER_SLOW_MS = int(os.environ.get('SQL_PROFILER_SLOW_MS', 500))
+SQL_PROFILER_MAX_STATEMENTS = 30
+SQL_PROFILER_REPEAT_LIMIT = 10
+SQL_PROFILER_SERVER_TIMING = ENVIRONMENT != 'production'
+
+# Prometheus metrics at /metrics (see metrics.py), scraped with
+# DIAGNOSTICS_TOKEN as the bearer token. In multi-process deployments point
+# METRICS_MULTIPROC_DIR at a directory shared by the workers of one host and
+# clear it on deploy.
+METRICS_ENABLED = True
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
+# Search backend: 'postgres' (tsvector + trigram indexes) or 'memory'
+# (in-process inverted index). Defaults to postgres for a Postgres URI.
+SEARCH_BACKEND = None
+SEARCH_RESULT_LIMIT = 100
+
+# Detail page cache: 'memory' (per-process LRU) or 'shared' (Redis-compatible
+# store at CACHE_REDIS_URL; a local stand-in is used when no URL is set).
+CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+CACHE_BACKEND = 'memory'
+CACHE_MAX_ENTRIES = 2048
+CACHE_DEFAULT_TTL = 300
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+# Genre/state facet counts on /venues and /artists are cached this long
+FACET_CACHE_TTL = 60
+
+# Background jobs (see jobs.py). JOB_RUNNER 'thread' runs JOB_WORKERS job
+# threads in every web process; 'external' leaves them to `flask jobs work`.
+# A job's page-cache writes only reach other processes with CACHE_BACKEND =
+# 'shared'; with 'memory', edits refresh dependent pages inline instead.
+# Creates have no deferrable work either way: their side effects are
+# in-transaction or per-process (see schedule_dependents in app.py).
+# Failed jobs are retried with exponential backoff from JOB_BACKOFF seconds.
+JOB_RUNNER = os.environ.get('JOB_RUNNER', 'thread')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF = 5
+JOB_BACKOFF_MAX = 900
+JOB_LOCK_TIMEOUT = 300
+# Seconds an exiting process waits for its running jobs before requeueing them
+JOB_SHUTDOWN_TIMEOUT = 30
+JOB_RETENTION = 7 * 24 * 3600
+# Periodic jobs: name -> seconds between the end of one run and the next.
+# facets.warm is dropped unless CACHE_BACKEND is 'shared': a memory cache
+# it filled would be the job process's own.
+JOB_SCHEDULE = {
+    'locations.reconcile': 900,
+    'facets.warm': 50,  # under FACET_CACHE_TTL, so unfiltered facets stay cached
+    'jobs.prune': 3600,
+}
+
+# Venue/artist deletes with more shows than DELETE_INLINE_SHOWS run as a
+# job, DELETE_CHUNK_SIZE shows per transaction (deletions.py).
+DELETE_INLINE_SHOWS = 1000
+DELETE_CHUNK_SIZE = 2000
+
+# Fingerprinted static assets (see assets.py): `flask build-assets` writes
+# them to ASSETS_BUILD_DIR; templates use them when ASSETS_FINGERPRINT is on
+# and a build exists, and plain /static URLs otherwise.
+ASSETS_FINGERPRINT = ENVIRONMENT != 'development'
+ASSETS_BUILD_DIR = os.environ.get('ASSETS_BUILD_DIR', os.path.join(basedir, 'build', 'assets'))
+
+# Bump to invalidate every client's ETag after a template change.
+CONDITIONAL_GET_VERSION = '2'
 
+# Bearer token for GET /export/<entity>.<format>; the endpoint is disabled
+# when unset.
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN')
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://tunguyen:@localhost:5432/fyyur'
+# Bearer token for the diagnostics endpoints (/_stats/cache, /_stats/pool,
+# /metrics); they are disabled when unset.
+DIAGNOSTICS_TOKEN = os.environ.get('DIAGNOSTICS_TOKEN')
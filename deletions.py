@@ -0,0 +1,155 @@
+from flask import jsonify
+from sqlalchemy import delete, func, select
+
+from cache import page_cache, venue_key, artist_key
+from conditional import touch
+from jobs import jobs
+from models import db, Venue, Artist, Show, Job
+from search import search_engine
+
+# Deleting venues and artists.
+#
+# shows.venue_id and shows.artist_id are ON DELETE CASCADE and the ORM
+# relationships are passive_deletes, so deleting an entity is a single
+# DELETE statement and Postgres removes its shows without them ever being
+# loaded. Up to DELETE_INLINE_SHOWS shows that happens inside the request.
+#
+# Past that, one transaction would hold row locks on every show for the
+# whole delete, so the request only queues a deletions.run job (keyed per
+# entity, see jobs.py) and returns 202. The job deletes the shows
+# DELETE_CHUNK_SIZE rows per transaction, then the entity itself; a retry
+# picks up where the last attempt stopped. Progress, from the job row and
+# the shows left, is at GET /<venues|artists>/<id>/deletion.
+#
+# Detail pages of the other side (artists who played the venue, venues the
+# artist played) are touched and dropped from the page cache as their shows
+# go, as for edits.
+
+ENTITIES = {
+    # model: (kind, show column, related model, related show column, cache key, related cache key)
+    Venue: ('venues', Show.venue_id, Artist, Show.artist_id, venue_key, artist_key),
+    Artist: ('artists', Show.artist_id, Venue, Show.venue_id, artist_key, venue_key),
+}
+MODELS = {kind: model for model, (kind, *_) in ENTITIES.items()}
+
+
+def deletion_key(model, id):
+    return f'delete:{ENTITIES[model][0]}:{id}'
+
+
+class Deletion:
+
+    def __init__(self, model, id, name, total, deleted, state, error=None, started=None, finished=None):
+        self.model = model
+        self.id = id
+        self.name = name
+        self.total = total
+        self.deleted = deleted
+        self.state = state
+        self.error = error
+        self.started = started
+        self.finished = finished
+
+    def to_dict(self):
+        return {
+            'entity': ENTITIES[self.model][0],
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'shows_total': self.total,
+            'shows_deleted': self.deleted,
+            'progress': round(self.deleted / self.total, 4) if self.total else 1.0,
+            'error': self.error,
+            'started': self.started and self.started.isoformat(),
+            'finished': self.finished and self.finished.isoformat(),
+        }
+
+
+class DeletionManager:
+
+    def __init__(self, app=None):
+        self.inline_shows = 1000
+        self.chunk_size = 2000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.inline_shows = app.config.get('DELETE_INLINE_SHOWS', self.inline_shows)
+        self.chunk_size = app.config.get('DELETE_CHUNK_SIZE', self.chunk_size)
+        for model, (kind, *_) in ENTITIES.items():
+            app.add_url_rule(f'/{kind}/<int:id>/deletion', f'{kind[:-1]}_deletion',
+                             lambda id, model=model: self.view(model, id))
+
+    def delete(self, model, id):
+        # Returns the Deletion, already 'done' when it ran inline, or None
+        # if there is no such row
+        kind, column, *_ = ENTITIES[model]
+        name = db.session.execute(select(model.name).where(model.id == id)).scalar()
+        if name is None:
+            return None
+        total = db.session.execute(select(func.count()).select_from(Show).where(column == id)).scalar()
+        if total > self.inline_shows:
+            # A deletion already queued or running for this entity wins
+            jobs.enqueue('deletions.run', key=deletion_key(model, id), kind=kind, id=id, name=name, total=total)
+            db.session.commit()
+            return self.progress(model, id)
+        self._finish(model, id, self._related_ids(model, id))
+        return Deletion(model, id, name, total, total, 'done')
+
+    def progress(self, model, id):
+        # The latest background deletion of this entity, or None
+        job = db.session.execute(
+            select(Job).where(Job.key == deletion_key(model, id)).order_by(Job.id.desc()).limit(1)
+        ).scalar()
+        if job is None:
+            return None
+        _, column, *_ = ENTITIES[model]
+        left = db.session.execute(select(func.count()).select_from(Show).where(column == id)).scalar()
+        total = job.args['total']
+        return Deletion(model, id, job.args['name'], total, max(total - left, 0), job.state,
+                        job.last_error, job.created_at, job.finished_at)
+
+    def view(self, model, id):
+        deletion = self.progress(model, id)
+        if deletion is None:
+            return jsonify({'error': 'not found'}), 404
+        return jsonify(deletion.to_dict())
+
+    def _related_ids(self, model, id):
+        _, column, _, related_column, *_ = ENTITIES[model]
+        return [related_id for related_id, in db.session.execute(
+            select(related_column).where(column == id).distinct()
+        )]
+
+    def run(self, model, id):
+        # Delete the shows a chunk per transaction, then the entity
+        _, column, related_model, related_column, _, related_key = ENTITIES[model]
+        while True:
+            chunk = select(Show.id).where(column == id).limit(self.chunk_size).scalar_subquery()
+            related_ids = set(db.session.execute(
+                delete(Show).where(Show.id.in_(chunk)).returning(related_column)
+            ).scalars())
+            if not related_ids:
+                break
+            touch(related_model, related_ids)
+            db.session.commit()
+            page_cache.invalidate(*[related_key(related_id) for related_id in related_ids])
+        self._finish(model, id, [])
+
+    def _finish(self, model, id, related_ids):
+        # Delete the entity (cascading to any shows left) and refresh the
+        # pages that listed its shows
+        _, _, related_model, _, key, related_key = ENTITIES[model]
+        touch(related_model, related_ids)
+        db.session.execute(delete(model).where(model.id == id))
+        db.session.commit()
+        page_cache.invalidate(key(id), *[related_key(related_id) for related_id in related_ids])
+        search_engine.remove(model, id)
+
+
+deletions = DeletionManager()
+
+
+@jobs.task('deletions.run')
+def run_deletion(kind, id, **_):
+    deletions.run(MODELS[kind], id)
@@ -0,0 +1,113 @@
+import json
+import re
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from models import db, Venue, Artist
+
+# `flask explain-routes`: replay every read route through the test client,
+# capture the SQL it issues and EXPLAIN each statement that touches `shows`.
+# The command exits non-zero if any plan sequentially scans `shows`.
+#
+# Tiny development tables make a sequential scan the cheapest plan whatever
+# indexes exist, so by default the planner is told to avoid them
+# (enable_seqscan = off): a Seq Scan that survives that has no usable index.
+
+SHOWS_RE = re.compile(r'\bshows\b')
+
+
+def sample_requests():
+    venue = db.session.query(Venue.id, Venue.name).order_by(Venue.id).first()
+    artist = db.session.query(Artist.id, Artist.name).order_by(Artist.id).first()
+
+    requests = [
+        ('GET', '/venues', None),
+        ('GET', '/artists', None),
+        ('GET', '/shows', None),
+        ('GET', '/shows?when=upcoming', None),
+        ('GET', '/shows?when=past', None),
+    ]
+    if venue is not None:
+        requests += [
+            ('GET', f'/venues/{venue.id}', None),
+            ('POST', '/venues/search', {'search_term': venue.name[:3]}),
+        ]
+    if artist is not None:
+        requests += [
+            ('GET', f'/artists/{artist.id}', None),
+            ('POST', '/artists/search', {'search_term': artist.name[:3]}),
+        ]
+    return requests
+
+
+def capture_statements(app, method, path, data):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and SHOWS_RE.search(statement):
+            statements.append((statement, parameters))
+
+    # Every bind, not just db.engine: read-replica routed views (routing.py)
+    # run their queries on the replica engines
+    engines = {id(engine): engine for engine in db.engines.values()}.values()
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = app.test_client().open(path, method=method, data=data)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, statements
+
+
+def seq_scans(plan, relation='shows'):
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') == relation:
+        found.append(plan)
+    for child in plan.get('Plans', []):
+        found += seq_scans(child, relation)
+    return found
+
+
+def explain(statement, parameters, allow_seqscan):
+    with db.engine.connect() as conn:
+        if not allow_seqscan:
+            conn.exec_driver_sql('SET enable_seqscan = off')
+        result = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = result.scalar()
+        conn.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+@click.command('explain-routes')
+@click.option('--allow-seqscan-costing', is_flag=True,
+              help='Leave enable_seqscan on and report the plans Postgres would really pick.')
+@click.option('--verbose', '-v', is_flag=True, help='Print every statement that was checked.')
+@with_appcontext
+def explain_routes(allow_seqscan_costing, verbose):
+    """EXPLAIN the queries behind each route; fail on a Seq Scan of shows."""
+    app = current_app._get_current_object()
+    failures = 0
+
+    for method, path, data in sample_requests():
+        status, statements = capture_statements(app, method, path, data)
+        click.echo(f'{method} {path} -> {status}, {len(statements)} statement(s) on shows')
+        for statement, parameters in statements:
+            plan = explain(statement, parameters, allow_seqscan_costing)
+            scans = seq_scans(plan)
+            if scans:
+                failures += 1
+                click.echo(f'  FAIL: sequential scan of shows\n    {" ".join(statement.split())}', err=True)
+            elif verbose:
+                click.echo(f'  ok: {" ".join(statement.split())}')
+
+    if failures:
+        click.echo(f'{failures} statement(s) sequentially scan shows', err=True)
+        sys.exit(1)
+    click.echo('No sequential scans of shows.')
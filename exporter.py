@@ -0,0 +1,72 @@
+import sys
+
+import click
+from flask import Blueprint, Response, abort, stream_with_context
+from flask.cli import with_appcontext
+
+from api import RESOURCES
+from auth import token_required
+from models import db
+from routing import read_replica
+from serialization import chunked, gzipped, iter_csv, iter_ndjson
+
+# Streaming CSV/NDJSON export of venues, artists and shows.
+#
+# Rows come from a server-side cursor (yield_per) and are encoded and written
+# as they arrive, so memory use does not depend on table size. Available as
+# `flask export` and as GET /export/<entity>.<csv|ndjson>[.gz], which requires
+# `Authorization: Bearer <EXPORT_TOKEN>` and is disabled when no token is set.
+
+export = Blueprint('export', __name__)
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+STREAM_BATCH_SIZE = 2000
+
+
+def export_statement(entity):
+    resource = RESOURCES[entity]
+    columns = list(resource.fields)
+    stmt = resource.select(columns).order_by(*resource.order_by)
+    return stmt.execution_options(yield_per=STREAM_BATCH_SIZE), columns
+
+
+def iter_export(entity, fmt, compress=False):
+    stmt, columns = export_statement(entity)
+    rows = db.session.execute(stmt).mappings()
+    lines = iter_csv(rows, columns) if fmt == 'csv' else iter_ndjson(dict(row) for row in rows)
+    chunks = chunked(lines)
+    return gzipped(chunks) if compress else chunks
+
+
+@export.route('/export/<entity>.<fmt>')
+@export.route('/export/<entity>.<fmt>.gz', defaults={'compress': True})
+@token_required('EXPORT_TOKEN')
+@read_replica
+def download(entity, fmt, compress=False):
+    if entity not in RESOURCES or fmt not in FORMATS:
+        abort(404)
+
+    filename = f'{entity}.{fmt}' + ('.gz' if compress else '')
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'}
+    mimetype = 'application/gzip' if compress else FORMATS[fmt]
+    return Response(stream_with_context(iter_export(entity, fmt, compress)), mimetype=mimetype, headers=headers)
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(sorted(RESOURCES)))
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='ndjson', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='Output file (default: stdout).')
+@with_appcontext
+def export_command(entity, fmt, compress, output):
+    """Stream venues, artists or shows to CSV or NDJSON."""
+    handle = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(entity, fmt, compress):
+            handle.write(chunk)
+    finally:
+        if output:
+            handle.close()
+        else:
+            handle.flush()
@@ -5,14 +5,19 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # Needs requirements-dev.txt; tests that use Postgres are skipped unless
+    # FYYUR_TEST_DATABASE_URL names a database they may empty
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest -q tests")
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench():
+    # Route latency report; run `flask seed` first for realistic volumes
+    local("python benchmarks/routes.py")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
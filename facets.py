@@ -0,0 +1,150 @@
+from flask import current_app, g, url_for
+from sqlalchemy import String, cast, func, select, true
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from cache import page_cache
+from conditional import rows_version
+from forms import Genre, State
+from jobs import jobs
+from models import db, Venue, Artist
+
+# Faceted filters for the /venues and /artists listings.
+#
+#   ?genre=Jazz&genre=Blues   has every listed genre (genres @> ARRAY[...],
+#                             served by the GIN index on genres)
+#   ?state=CA  ?city=Austin   exact match
+#   ?seeking_talent=true      venues only; artists take ?seeking_venue
+#
+# Unknown genre/state names and unparseable booleans are ignored. Facet
+# counts (venues or artists per genre and per state, under the active
+# filters) come from one statement: the rows are joined to unnest(genres)
+# and grouped by GROUPING SETS ((genre), (state)). They are the same for
+# everyone looking at the same filters, so they are cached for
+# FACET_CACHE_TTL seconds under the version of the listed rows from the
+# listing's validators (conditional.py): a write that changes the ETag is a
+# cache miss, so a page never pairs a new ETag with old counts. The
+# facets.warm job refills the unfiltered ones, which every first visit asks
+# for; it is only scheduled with a shared cache, which web processes read.
+
+GENRES = {genre.name: genre.value for genre in Genre}
+STATES = {state.name for state in State}
+TRUE_VALUES = ('1', 'true', 't', 'yes', 'y', 'on')
+FALSE_VALUES = ('0', 'false', 'f', 'no', 'n', 'off')
+
+LISTINGS = {
+    # kind: (model, seeking argument)
+    'venues': (Venue, 'seeking_talent'),
+    'artists': (Artist, 'seeking_venue'),
+}
+
+
+def parse_filters(kind, args):
+    # Normalized filters from request args; the key order is fixed so equal
+    # filters share a cache entry
+    _, seeking = LISTINGS[kind]
+    filters = {}
+    genres = sorted({name for name in args.getlist('genre') if name in GENRES})
+    if genres:
+        filters['genre'] = genres
+    if args.get('state') in STATES:
+        filters['state'] = args['state']
+    if args.get('city', '').strip():
+        filters['city'] = args['city'].strip()
+    value = args.get(seeking, '').lower()
+    if value in TRUE_VALUES or value in FALSE_VALUES:
+        filters[seeking] = value in TRUE_VALUES
+    return filters
+
+
+def filter_clauses(kind, filters):
+    model, seeking = LISTINGS[kind]
+    clauses = []
+    if 'genre' in filters:
+        clauses.append(model.genres.op('@>')(cast(filters['genre'], ARRAY(String))))
+    if 'state' in filters:
+        clauses.append(model.state == filters['state'])
+    if 'city' in filters:
+        clauses.append(model.city == filters['city'])
+    if seeking in filters:
+        clauses.append(getattr(model, seeking).is_(filters[seeking]))
+    return clauses
+
+
+def facet_statement(kind, filters):
+    model, _ = LISTINGS[kind]
+    genre = func.unnest(model.genres).table_valued('genre').render_derived().lateral()
+    return select(
+        genre.c.genre,
+        model.state,
+        func.grouping(genre.c.genre).label('by_state'),
+        func.count(model.id.distinct()).label('count'),
+    ).select_from(model).outerjoin(genre, true()).where(
+        *filter_clauses(kind, filters)
+    ).group_by(func.grouping_sets(genre.c.genre, model.state))
+
+
+def load_facets(kind, filters):
+    genres, states = [], []
+    for row in db.session.execute(facet_statement(kind, filters)):
+        if row.by_state:
+            if row.state is not None:
+                states.append({'name': row.state, 'count': row.count})
+        elif row.genre in GENRES:
+            genres.append({'name': row.genre, 'label': GENRES[row.genre], 'count': row.count})
+    by_count = lambda facet: (-facet['count'], facet['name'])  # noqa: E731
+    return {'genres': sorted(genres, key=by_count), 'states': sorted(states, key=by_count)}
+
+
+def facet_key(kind, filters):
+    parts = [f'{name}={",".join(value) if isinstance(value, list) else value}' for name, value in filters.items()]
+    return f'facets:{kind}:' + '&'.join(parts)
+
+
+def facets(kind, filters):
+    # Cached under the version of the listed rows (set by the listing's
+    # validators), so counts never lag behind the page's ETag
+    version = g.get('rows_version') or rows_version(kind, LISTINGS[kind][0])
+    return page_cache.get_or_set(facet_key(kind, filters), lambda: load_facets(kind, filters),
+                                 ttl=current_app.config.get('FACET_CACHE_TTL', 60), version=version)
+
+
+@jobs.task('facets.warm', max_attempts=1)
+def warm_facets():
+    for kind, (model, _) in LISTINGS.items():
+        page_cache.set(facet_key(kind, {}), load_facets(kind, {}),
+                       ttl=current_app.config.get('FACET_CACHE_TTL', 60), version=rows_version(kind, model))
+
+
+def query_args(filters):
+    # url_for() keyword arguments for a set of filters
+    args = {}
+    for name, value in filters.items():
+        if isinstance(value, bool):
+            args[name] = 'true' if value else 'false'
+        elif value:
+            args[name] = value
+    return args
+
+
+def facet_panel(kind, endpoint, filters):
+    # Facet counts plus the link each one leads to: genres toggle in and out
+    # of the filter, a state replaces the current one
+    _, seeking = LISTINGS[kind]
+    counts = facets(kind, filters)
+    active_genres = set(filters.get('genre', ()))
+
+    def link(**changes):
+        return url_for(endpoint, **query_args({**filters, **changes}))
+
+    return {
+        'genres': [dict(facet, active=facet['name'] in active_genres,
+                        url=link(genre=sorted(active_genres ^ {facet['name']})))
+                   for facet in counts['genres']],
+        'states': [dict(facet, active=facet['name'] == filters.get('state'),
+                        url=link(state=None if facet['name'] == filters.get('state') else facet['name']))
+                   for facet in counts['states']],
+        'seeking': {'active': filters.get(seeking), 'url': link(**{seeking: None if filters.get(seeking) else True}),
+                    'label': 'Seeking talent' if kind == 'venues' else 'Seeking a venue'},
+        'city': filters.get('city'),
+        'clear_url': url_for(endpoint) if filters else None,
+    }
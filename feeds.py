@@ -0,0 +1,112 @@
+from flask import Blueprint, Response, abort, request, stream_with_context
+from sqlalchemy import select
+
+from conditional import conditional, venue_feed_validators, artist_feed_validators
+from models import db, Venue, Artist, Show
+from routing import read_replica
+from serialization import chunked
+
+# iCalendar feeds: GET /venues/<id>/shows.ics and /artists/<id>/shows.ics.
+#
+# Calendar clients poll these constantly, so both are conditional: the
+# validator is the venue/artist updated_at alone (a primary-key probe), which
+# moves on every write that changes a feed because show inserts and renames
+# touch the related rows. A current client gets a 304 without the show
+# query running. Otherwise the shows are read from a server-side cursor in
+# start_time order off the (venue_id|artist_id, start_time) index and written
+# out as VEVENTs while they arrive.
+#
+# start_time is local wall-clock time, so DTSTART/DTEND are "floating"
+# times (no zone); DTSTAMP is the show's updated_at in UTC.
+
+feeds = Blueprint('feeds', __name__)
+
+MIMETYPE = 'text/calendar'
+STREAM_BATCH_SIZE = 1000
+PRODID = '-//Fyyur//Show calendar//EN'
+
+
+def escape_text(value):
+    # RFC 5545 TEXT escaping
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    # Content lines are folded at 75 octets, continuation lines start with a space
+    raw = line.encode('utf-8')
+    if len(raw) <= 75:
+        return raw + b'\r\n'
+    parts, limit = [], 75
+    while raw:
+        cut = min(limit, len(raw))
+        while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1  # never split a UTF-8 sequence
+        parts.append(raw[:cut])
+        raw, limit = raw[cut:], 74
+    return b'\r\n '.join(parts) + b'\r\n'
+
+
+def local_time(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def utc_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def iter_calendar(name, rows, host):
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold(f'PRODID:{PRODID}')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold(f'X-WR-CALNAME:{escape_text(name)}')
+    for row in rows:
+        location = ', '.join(part for part in (row.address, row.city, row.state) if part)
+        yield b''.join(fold(line) for line in (
+            'BEGIN:VEVENT',
+            f'UID:show-{row.id}@{host}',
+            f'DTSTAMP:{utc_time(row.updated_at)}',
+            f'DTSTART:{local_time(row.start_time)}',
+            f'DTEND:{local_time(row.end_time)}',
+            f'SUMMARY:{escape_text(f"{row.artist_name} at {row.venue_name}")}',
+            f'LOCATION:{escape_text(location)}',
+            'END:VEVENT',
+        ))
+    yield fold('END:VCALENDAR')
+
+
+def feed_statement(column, id):
+    return select(
+        Show.id, Show.start_time, Show.end_time, Show.updated_at,
+        Artist.name.label('artist_name'), Venue.name.label('venue_name'),
+        Venue.address, Venue.city, Venue.state,
+    ).join(Artist, Artist.id == Show.artist_id).join(Venue, Venue.id == Show.venue_id).where(
+        column == id
+    ).order_by(Show.start_time, Show.id).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+
+def feed_response(model, column, id, kind):
+    name = db.session.execute(select(model.name).where(model.id == id)).scalar()
+    if name is None:
+        abort(404)
+
+    def generate():
+        rows = db.session.execute(feed_statement(column, id))
+        yield from chunked(iter_calendar(name, rows, request.host))
+
+    headers = {'Content-Disposition': f'inline; filename="{kind}-{id}.ics"'}
+    return Response(stream_with_context(generate()), mimetype=MIMETYPE, headers=headers)
+
+
+@feeds.route('/venues/<int:venue_id>/shows.ics')
+@read_replica
+@conditional(venue_feed_validators)
+def venue_feed(venue_id):
+    return feed_response(Venue, Show.venue_id, venue_id, 'venue')
+
+
+@feeds.route('/artists/<int:artist_id>/shows.ics')
+@read_replica
+@conditional(artist_feed_validators)
+def artist_feed(artist_id):
+    return feed_response(Artist, Show.artist_id, artist_id, 'artist')
@@ -0,0 +1,44 @@
+from datetime import date, datetime, time
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+# Datetime rendering for templates.
+#
+# Views hand native datetime objects to the templates; strings are still
+# accepted (and parsed) for backwards compatibility. The babel pattern and
+# locale are compiled once per (format, locale) and reused, and
+# format_datetimes() renders a whole list with one lookup.
+
+NAMED_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_format(format='medium', locale='en'):
+    pattern = NAMED_FORMATS.get(format, format)
+    return babel.dates.parse_pattern(pattern), Locale.parse(locale)
+
+
+def _as_datetime(value):
+    # The patterns include a time of day, which a date lacks: midnight
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    pattern, locale = compiled_format(format, locale)
+    return pattern.apply(_as_datetime(value), locale)
+
+
+def format_datetimes(values, format='medium', locale='en'):
+    pattern, locale = compiled_format(format, locale)
+    apply = pattern.apply
+    return [apply(_as_datetime(value), locale) for value in values]
@@ -1,8 +1,8 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form, FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
 from wtforms.fields.simple import URLField
-from wtforms.validators import DataRequired, AnyOf, URL, Optional
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, NumberRange
 import enum
 import re
 from wtforms import ValidationError
@@ -127,6 +127,9 @@ class ArtistForm(BaseForm):
 
 # ShowForm with specific fields for show creation
 class ShowForm(FlaskForm):
-    artist_id = StringField('Artist ID', validators=[DataRequired()])
-    venue_id = StringField('Venue ID', validators=[DataRequired()])
+    # Integer primary keys (Postgres integer), so a bad id is a form error
+    artist_id = IntegerField('Artist ID', validators=[DataRequired(), NumberRange(min=1, max=2 ** 31 - 1)])
+    venue_id = IntegerField('Venue ID', validators=[DataRequired(), NumberRange(min=1, max=2 ** 31 - 1)])
     start_time = DateTimeField('Start Time', default=datetime.today(), validators=[DataRequired()])
+    duration_minutes = IntegerField('Duration (minutes)', default=120,
+                                    validators=[Optional(), NumberRange(min=15, max=24 * 60)])
@@ -0,0 +1,340 @@
+import csv
+import gzip
+import io
+import json
+import re
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+
+from cache import page_cache, venue_key, artist_key
+from conditional import touch
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, booking_conflict
+
+# `flask import <venues|artists|shows> FILE`: bulk-load CSV or NDJSON.
+#
+# Rows are streamed from the file, validated with the same WTForms classes
+# the create handlers use, and inserted BATCH_SIZE at a time either through
+# one executemany (SQLAlchemy insertmanyvalues) or a Postgres COPY. Rows that
+# fail validation are written to a side file as NDJSON with their errors.
+# A batch of shows that trips an overlap constraint is retried row by row,
+# and the double-booked rows are rejected like invalid ones.
+
+LIST_SEPARATOR_RE = re.compile(r'\s*[;|,]\s*')
+FALSE_VALUES = ('', '0', 'false', 'f', 'no', 'n', 'off')
+
+
+def venue_values(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'address': form.address.data,
+        'phone': form.phone.data,
+        'genres': form.genres.data,
+        'facebook_link': form.facebook_link.data,
+        'image_link': form.image_link.data,
+        'website': form.website_link.data,
+        'seeking_talent': form.seeking_talent.data,
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+def artist_values(form):
+    return {
+        'name': form.name.data,
+        'city': form.city.data,
+        'state': form.state.data,
+        'phone': form.phone.data,
+        'genres': form.genres.data,
+        'facebook_link': form.facebook_link.data,
+        'image_link': form.image_link.data,
+        'website': form.website_link.data,
+        'seeking_venue': form.seeking_venue.data,
+        'seeking_description': form.seeking_description.data,
+    }
+
+
+def show_values(form):
+    return {
+        'artist_id': form.artist_id.data,
+        'venue_id': form.venue_id.data,
+        'start_time': form.start_time.data,
+        'duration_minutes': form.duration_minutes.data or DEFAULT_SHOW_MINUTES,
+    }
+
+
+class Entity:
+
+    def __init__(self, model, form_class, to_values, list_fields=(), bool_fields=()):
+        self.model = model
+        self.form_class = form_class
+        self.to_values = to_values
+        self.list_fields = list_fields
+        self.bool_fields = bool_fields
+
+    def formdata(self, row):
+        # Map a raw CSV/NDJSON row onto what the form would receive from a POST
+        data = MultiDict()
+        for key, value in row.items():
+            if key == 'website':
+                key = 'website_link'
+            if value is None:
+                continue
+            if key in self.list_fields:
+                values = value if isinstance(value, list) else LIST_SEPARATOR_RE.split(str(value).strip())
+                for item in values:
+                    if item:
+                        data.add(key, item)
+            elif key in self.bool_fields:
+                if str(value).strip().lower() not in FALSE_VALUES:
+                    data.add(key, 'y')
+            elif key == 'start_time':
+                data.add(key, normalize_datetime(value))
+            else:
+                data.add(key, str(value))
+        return data
+
+    def validate(self, row, form=None):
+        # Pass a form from new_form() to reuse its bound fields across rows
+        if form is None:
+            form = self.new_form()
+        form.process(formdata=self.formdata(row))
+        if form.validate():
+            return self.to_values(form), None
+        return None, form.errors
+
+    def new_form(self):
+        return self.form_class(formdata=None, meta={'csrf': False})
+
+
+ENTITIES = {
+    'venues': Entity(Venue, VenueForm, venue_values, list_fields=('genres',), bool_fields=('seeking_talent',)),
+    'artists': Entity(Artist, ArtistForm, artist_values, list_fields=('genres',), bool_fields=('seeking_venue',)),
+    'shows': Entity(Show, ShowForm, show_values),
+}
+
+
+def normalize_datetime(value):
+    # ShowForm expects 'YYYY-MM-DD HH:MM:SS'; accept ISO 8601 as well
+    try:
+        return datetime.fromisoformat(str(value).strip()).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return str(value)
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def read_rows(path, fmt):
+    # Yields (line number, row dict) without loading the whole file
+    with open_text(path) as handle:
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(handle, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as e:
+                        yield number, {'_error': str(e)}
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'ndjson'
+
+
+def copy_literal(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{' + ','.join('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                              for item in value) + '}'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def insert_copy(model, rows):
+    # COPY ... FROM STDIN in CSV format; unquoted empty fields load as NULL
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([copy_literal(row[column]) for column in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY {model.__tablename__} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer
+        )
+    finally:
+        cursor.close()
+
+
+def insert_batch(entity, rows, method):
+    if entity.model is Show:
+        # Shows reference venues and artists, so their pages change too
+        venue_ids = {row['venue_id'] for row in rows}
+        artist_ids = {row['artist_id'] for row in rows}
+        touch(Venue, venue_ids)
+        touch(Artist, artist_ids)
+    if method == 'copy':
+        insert_copy(entity.model, rows)
+    else:
+        db.session.execute(insert(entity.model), rows)
+    db.session.commit()
+    if entity.model is Show:
+        page_cache.invalidate(*[venue_key(id) for id in venue_ids], *[artist_key(id) for id in artist_ids])
+
+
+def insert_shows_singly(pending, report):
+    # One savepoint per row, so each double booking is rejected on its own
+    inserted = []
+    for number, row, values in pending:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Show), [values])
+        except Exception as e:
+            conflict = booking_conflict(e)
+            if conflict is None:
+                raise
+            report.reject(number, row, {'start_time': [conflict]})
+        else:
+            inserted.append(values)
+    venue_ids = {values['venue_id'] for values in inserted}
+    artist_ids = {values['artist_id'] for values in inserted}
+    touch(Venue, venue_ids)
+    touch(Artist, artist_ids)
+    db.session.commit()
+    page_cache.invalidate(*[venue_key(id) for id in venue_ids], *[artist_key(id) for id in artist_ids])
+    return len(inserted)
+
+
+def missing_references(rows):
+    # Show rows whose venue or artist does not exist, checked once per batch
+    venue_ids = {row['venue_id'] for _, row in rows}
+    artist_ids = {row['artist_id'] for _, row in rows}
+    known_venues = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+    known_artists = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+    missing = {}
+    for number, row in rows:
+        errors = {}
+        if row['venue_id'] not in known_venues:
+            errors['venue_id'] = ['Unknown venue.']
+        if row['artist_id'] not in known_artists:
+            errors['artist_id'] = ['Unknown artist.']
+        if errors:
+            missing[number] = errors
+    return missing
+
+
+class Report:
+
+    def __init__(self, rejects_path):
+        self.rejects_path = rejects_path
+        self._rejects = None
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+
+    def reject(self, number, row, errors):
+        if self._rejects is None:
+            self._rejects = open(self.rejects_path, 'w', encoding='utf-8')
+        self._rejects.write(json.dumps({'line': number, 'row': row, 'errors': errors}, default=str) + '\n')
+        self.rejected += 1
+
+    def close(self):
+        if self._rejects is not None:
+            self._rejects.close()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self, count):
+        return count / self.elapsed if self.elapsed else 0.0
+
+
+def run_import(entity, path, fmt, batch_size, method, report, echo=None):
+    pending = []  # (line number, raw row, values)
+    form = entity.new_form()
+
+    def flush():
+        if not pending:
+            return
+        if entity.model is Show:
+            missing = missing_references([(number, values) for number, _, values in pending])
+            for number, row, _ in pending:
+                if number in missing:
+                    report.reject(number, row, missing[number])
+            rows = [values for number, _, values in pending if number not in missing]
+        else:
+            rows = [values for _, _, values in pending]
+        if rows:
+            try:
+                insert_batch(entity, rows, method)
+                report.inserted += len(rows)
+            except Exception as e:
+                if booking_conflict(e) is None:
+                    raise
+                db.session.rollback()
+                report.inserted += insert_shows_singly(
+                    [(number, row, values) for number, row, values in pending if number not in missing], report
+                )
+        pending.clear()
+        if echo is not None:
+            echo(f'{report.read} read, {report.inserted} inserted, {report.rejected} rejected, '
+                 f'{report.rate(report.inserted):.0f} rows/s')
+
+    for number, row in read_rows(path, fmt):
+        report.read += 1
+        if '_error' in row:
+            report.reject(number, None, {'_row': [row['_error']]})
+            continue
+        values, errors = entity.validate(row, form)
+        if errors:
+            report.reject(number, row, errors)
+            continue
+        pending.append((number, row, values))
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    return report
+
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT/COPY and commit.')
+@click.option('--method', type=click.Choice(['executemany', 'copy']), default='executemany', show_default=True,
+              help='copy uses Postgres COPY FROM STDIN.')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False),
+              help='Where to write rejected rows (default: PATH.rejects.ndjson).')
+@with_appcontext
+def import_command(entity, path, fmt, batch_size, method, rejects_path):
+    """Bulk import venues, artists or shows from CSV or NDJSON."""
+    report = Report(rejects_path or path + '.rejects.ndjson')
+    try:
+        run_import(ENTITIES[entity], path, fmt or detect_format(path), batch_size, method, report, click.echo)
+    finally:
+        report.close()
+
+    click.echo(f'Imported {report.inserted} of {report.read} {entity} in {report.elapsed:.2f}s '
+               f'({report.rate(report.inserted):.0f} rows/s inserted, {report.rate(report.read):.0f} rows/s read).')
+    if report.rejected:
+        click.echo(f'{report.rejected} rejected row(s) written to {report.rejects_path}', err=True)
@@ -0,0 +1,440 @@
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from metrics import metrics
+from models import db, Job
+from routing import RoutingSession
+
+# Background jobs on a table in the application database.
+#
+# jobs.enqueue(name, **args) inserts a row into the caller's transaction,
+# so a job exists exactly when the write that asked for it commits. A
+# dispatcher thread claims ready rows (UPDATE ... FOR UPDATE SKIP LOCKED)
+# for a bounded pool of JOB_WORKERS threads; any number of processes can
+# run one. A job that raises is retried JOB_MAX_ATTEMPTS times in all,
+# JOB_BACKOFF * 2^(attempt - 1) seconds apart (at most JOB_BACKOFF_MAX),
+# then marked failed. Running jobs are heartbeated; a job whose process
+# died is requeued once its lock is JOB_LOCK_TIMEOUT seconds old. On exit
+# a process stops claiming and gives running jobs JOB_SHUTDOWN_TIMEOUT
+# seconds; claimed jobs that never started go back to the queue as they
+# were, and unfinished ones are requeued as a spent attempt.
+#
+# A job keyed with key= is deduplicated: while one with that key is queued
+# or running, enqueueing another does nothing. JOB_SCHEDULE entries
+# ({name: seconds}) are keyed jobs that enqueue their next run when they
+# finish, so each runs once per interval however many workers there are;
+# every dispatcher also re-queues missing ones in its maintenance pass.
+#
+# With JOB_RUNNER = 'thread' every web process runs a dispatcher, started
+# on its first request. With 'external' the web processes only enqueue and
+# `flask jobs work` runs the jobs. Queue depth and lag are exported to
+# /metrics at scrape time.
+
+NOW = "timezone('utc', now())"
+PENDING = ('queued', 'running')
+
+CLAIM = text(f"""
+UPDATE jobs SET state = 'running', attempts = attempts + 1, locked_at = {NOW}, locked_by = :worker
+WHERE id IN (SELECT id FROM jobs WHERE state = 'queued' AND run_at <= {NOW}
+             ORDER BY run_at, id LIMIT :limit FOR UPDATE SKIP LOCKED)
+RETURNING id, name, args, key, attempts, max_attempts
+""")
+
+DONE = text(f"""
+UPDATE jobs SET state = 'done', finished_at = {NOW}, locked_at = NULL, last_error = NULL WHERE id = :id
+""")
+
+RETRY = text(f"""
+UPDATE jobs SET state = 'queued', run_at = {NOW} + make_interval(secs => :delay),
+                locked_at = NULL, locked_by = NULL, last_error = :error
+WHERE id = :id
+""")
+
+FAIL = text(f"""
+UPDATE jobs SET state = 'failed', finished_at = {NOW}, locked_at = NULL, last_error = :error WHERE id = :id
+""")
+
+# Claimed jobs that never started (the process is exiting) go back as they were
+RELEASE = text("""
+UPDATE jobs SET state = 'queued', attempts = attempts - 1, locked_at = NULL, locked_by = NULL
+WHERE state = 'running' AND id = ANY(:ids)
+""")
+
+# Jobs still running when the process gave up waiting for them
+ABANDON = text(f"""
+UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN {NOW} END,
+                locked_at = NULL, locked_by = NULL,
+                last_error = 'worker ' || locked_by || ' exited before the job finished'
+WHERE state = 'running' AND id = ANY(:ids)
+""")
+
+HEARTBEAT = text(f"UPDATE jobs SET locked_at = {NOW} WHERE state = 'running' AND id = ANY(:ids)")
+
+# Jobs of a process that stopped heartbeating go back to the queue
+RECOVER = text(f"""
+UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN {NOW} END,
+                locked_at = NULL, locked_by = NULL,
+                last_error = 'worker ' || locked_by || ' stopped responding'
+WHERE state = 'running' AND locked_at < {NOW} - make_interval(secs => :timeout)
+""")
+
+# The next run of a periodic job: an interval after the last one finished,
+# or now if it never ran
+SCHEDULE = text(f"""
+INSERT INTO jobs (name, key, run_at)
+SELECT :name, :key, coalesce(max(finished_at) + make_interval(secs => :every), {NOW})
+FROM jobs WHERE key = :key
+ON CONFLICT (key) WHERE state IN ('queued', 'running') DO NOTHING
+""")
+
+PRUNE = text(f"""
+DELETE FROM jobs WHERE state IN ('done', 'failed') AND finished_at < {NOW} - make_interval(secs => :retention)
+""")
+
+DEPTH = text(f"""
+SELECT name, state, count(*) AS count,
+       count(*) FILTER (WHERE state = 'queued' AND run_at <= {NOW}) AS ready,
+       extract(epoch FROM {NOW} - min(run_at) FILTER (WHERE state = 'queued' AND run_at <= {NOW})) AS lag
+FROM jobs WHERE state IN ('queued', 'running')
+GROUP BY name, state ORDER BY name, state
+""")
+
+Task = namedtuple('Task', ['name', 'function', 'max_attempts'])
+
+
+class JobQueue:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tasks = {}
+        self.schedule = {}
+        self.runner = 'thread'
+        self.workers = 2
+        self.poll_interval = 1.0
+        self.max_attempts = 5
+        self.backoff = 5
+        self.backoff_max = 900
+        self.lock_timeout = 300
+        self.shutdown_timeout = 30
+        self.retention = 7 * 24 * 3600
+        self.worker_id = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._workers = []
+        self._thread = None
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self._running = {}  # job id -> claimed row
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.runner = app.config.get('JOB_RUNNER', self.runner)
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff = app.config.get('JOB_BACKOFF', self.backoff)
+        self.backoff_max = app.config.get('JOB_BACKOFF_MAX', self.backoff_max)
+        self.lock_timeout = app.config.get('JOB_LOCK_TIMEOUT', self.lock_timeout)
+        self.shutdown_timeout = app.config.get('JOB_SHUTDOWN_TIMEOUT', self.shutdown_timeout)
+        self.retention = app.config.get('JOB_RETENTION', self.retention)
+        self.schedule = dict(app.config.get('JOB_SCHEDULE') or {})
+        if self.runner == 'thread':
+            app.before_request(self._start_in_process)
+        metrics.collectors.append(self.collect)
+
+    def task(self, name, max_attempts=None):
+        # Register a function as the job `name`; it is called with the job's
+        # args as keyword arguments inside an app context
+        def decorator(function):
+            self.tasks[name] = Task(name, function, max_attempts)
+            return function
+        return decorator
+
+    # Enqueueing ------------------------------------------------------------
+
+    def enqueue(self, name, /, key=None, delay=0, max_attempts=None, **args):
+        # Adds the job to the current transaction and returns its id, or
+        # None when a job with the same key is already pending
+        task = self.tasks.get(name)
+        values = {
+            'name': name,
+            'args': args,
+            'key': key,
+            'max_attempts': max_attempts or (task and task.max_attempts) or self.max_attempts,
+        }
+        if delay:
+            values['run_at'] = func.timezone('utc', func.now()) + timedelta(seconds=delay)
+        statement = insert(Job).values(**values).on_conflict_do_nothing(
+            index_elements=['key'], index_where=Job.state.in_(PENDING)
+        ).returning(Job.id)
+        id = db.session.execute(statement).scalar()
+        db.session.info['jobs_enqueued'] = True
+        return id
+
+    def schedule_all(self):
+        for name, every in self.schedule.items():
+            self._schedule(name, every)
+        db.session.commit()
+
+    def _schedule(self, name, every):
+        db.session.execute(SCHEDULE, {'name': name, 'key': f'schedule:{name}', 'every': every})
+
+    def wake(self):
+        self._wake.set()
+
+    # Running ---------------------------------------------------------------
+
+    def _start_in_process(self):
+        if self._pid != os.getpid():
+            self.start()
+
+    def start(self, workers=None):
+        # Idempotent per process; a forked child starts its own dispatcher
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.worker_id = f'{socket.gethostname()}:{self._pid}'
+            self._stopping.clear()
+            self._running = {}
+            self._queue = queue.SimpleQueue()
+            # Daemon threads, unlike a ThreadPoolExecutor's, cannot hold up
+            # interpreter exit past stop()'s timeout
+            self._workers = [threading.Thread(target=self._work, name=f'fyyur-job-{n}', daemon=True)
+                             for n in range(workers or self.workers)]
+            for thread in self._workers:
+                thread.start()
+            self._thread = threading.Thread(target=self._loop, name='fyyur-job-dispatcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        # Stop claiming and wait up to timeout (JOB_SHUTDOWN_TIMEOUT) seconds
+        # for running jobs; then hand every unfinished claimed job back
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join()
+        unstarted = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                unstarted.append(row.id)
+        for _ in self._workers:
+            self._queue.put(None)
+        deadline = time.monotonic() + (self.shutdown_timeout if timeout is None else timeout)
+        for thread in self._workers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        unfinished = [id for id in list(self._running) if id not in unstarted]
+        if unstarted or unfinished:
+            with self.app.app_context():
+                try:
+                    if unstarted:
+                        db.session.execute(RELEASE, {'ids': unstarted})
+                    if unfinished:
+                        db.session.execute(ABANDON, {'ids': unfinished})
+                        self.app.logger.warning('Requeued %d job(s) still running at exit: %s',
+                                                len(unfinished), unfinished)
+                    db.session.commit()
+                except Exception:
+                    self.app.logger.exception('Requeueing claimed jobs at exit failed')
+                finally:
+                    db.session.remove()
+        self._pid = None
+
+    def _loop(self):
+        next_maintenance = 0.0
+        while not self._stopping.is_set():
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    if time.monotonic() >= next_maintenance:
+                        self._maintain()
+                        next_maintenance = time.monotonic() + self.lock_timeout / 5
+                    self._dispatch()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Job dispatcher failed')
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.poll_interval)
+
+    def _dispatch(self):
+        free = len(self._workers) - len(self._running)
+        if free <= 0:
+            return
+        rows = db.session.execute(CLAIM, {'worker': self.worker_id, 'limit': free}).all()
+        db.session.commit()
+        for row in rows:
+            self._running[row.id] = row
+            self._queue.put(row)
+
+    def _work(self):
+        while (row := self._queue.get()) is not None:
+            try:
+                self._run(row)
+            finally:
+                self._running.pop(row.id, None)
+                self._wake.set()
+
+    def _maintain(self):
+        running = list(self._running)
+        if running:
+            db.session.execute(HEARTBEAT, {'ids': running})
+        recovered = db.session.execute(RECOVER, {'timeout': self.lock_timeout}).rowcount
+        db.session.commit()
+        if recovered:
+            self.app.logger.warning('Requeued %d job(s) from unresponsive workers', recovered)
+        # Periodic jobs reschedule themselves when they finish; one that was
+        # lost, or that RECOVER failed, is queued again here
+        self.schedule_all()
+        if metrics.directory:
+            metrics.flush()
+
+    def _run(self, job):
+        started = time.perf_counter()
+        task = self.tasks.get(job.name)
+        with self.app.app_context():
+            try:
+                try:
+                    if task is None:
+                        raise LookupError(f'No task named {job.name!r}')
+                    task.function(**job.args)
+                    # Whatever the task left uncommitted commits with DONE
+                    db.session.execute(DONE, {'id': job.id})
+                    outcome = 'done'
+                except Exception as e:
+                    db.session.rollback()
+                    error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+                    self.app.logger.exception('Job %s %d failed (attempt %d of %d)',
+                                              job.name, job.id, job.attempts, job.max_attempts)
+                    if task is None or job.attempts >= job.max_attempts:
+                        db.session.execute(FAIL, {'id': job.id, 'error': error})
+                        outcome = 'failed'
+                    else:
+                        delay = min(self.backoff * 2 ** (job.attempts - 1), self.backoff_max)
+                        db.session.execute(RETRY, {'id': job.id, 'delay': delay, 'error': error})
+                        outcome = 'retried'
+                if outcome != 'retried' and job.key == f'schedule:{job.name}' and job.name in self.schedule:
+                    self._schedule(job.name, self.schedule[job.name])
+                db.session.commit()
+            except Exception:
+                # The job stays running until RECOVER requeues it
+                db.session.rollback()
+                self.app.logger.exception('Recording the outcome of job %s %d failed', job.name, job.id)
+                outcome = 'lost'
+            finally:
+                db.session.remove()
+        metrics.inc('fyyur_jobs_total', (('name', job.name), ('outcome', outcome)))
+        metrics.observe('fyyur_job_duration_seconds', (('name', job.name),), time.perf_counter() - started)
+
+    # Inspection ------------------------------------------------------------
+
+    def depth(self):
+        with db.engine.connect() as connection:
+            return connection.execute(DEPTH).all()
+
+    def collect(self):
+        # Queue gauges for /metrics, read once per scrape: they describe the
+        # shared table, not this process, so they are not written to the
+        # multi-process files
+        gauges = {}
+        try:
+            rows = self.depth()
+        except Exception:
+            self.app.logger.exception('Reading job queue depth failed')
+            return {'gauges': gauges}
+        for row in rows:
+            labels = (('name', row.name), ('state', row.state))
+            gauges[('fyyur_jobs', labels)] = row.count
+            if row.state == 'queued':
+                gauges[('fyyur_jobs_ready', (('name', row.name),))] = row.ready
+                gauges[('fyyur_jobs_lag_seconds', (('name', row.name),))] = float(row.lag or 0)
+        return {'gauges': gauges}
+
+
+jobs = JobQueue()
+# The job threads are daemons: stop them at exit rather than let the
+# interpreter freeze them with claimed jobs still marked running
+atexit.register(jobs.stop)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _wake_dispatcher(session):
+    # Jobs enqueued in this transaction are claimable now
+    if session.info.pop('jobs_enqueued', False):
+        jobs.wake()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_enqueued(session, previous_transaction):
+    session.info.pop('jobs_enqueued', None)
+
+
+@jobs.task('jobs.prune')
+def prune_jobs():
+    # Drop finished jobs older than JOB_RETENTION seconds
+    db.session.execute(PRUNE, {'retention': jobs.retention})
+
+
+jobs_command = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_command.command('work')
+@click.option('--workers', type=int, help='Worker threads (default JOB_WORKERS).')
+def work_command(workers):
+    """Run jobs in the foreground until interrupted."""
+    jobs.start(workers)
+    click.echo(f'Running jobs with {workers or jobs.workers} worker(s) as {jobs.worker_id}.', err=True)
+    try:
+        while jobs._thread.is_alive():
+            jobs._thread.join(1)
+    except KeyboardInterrupt:
+        click.echo(f'Stopping; waiting up to {jobs.shutdown_timeout}s for running jobs.', err=True)
+        jobs.stop()
+
+
+@jobs_command.command('status')
+def status_command():
+    """Show queued and running jobs by name."""
+    rows = jobs.depth()
+    if not rows:
+        click.echo('No queued or running jobs.')
+    for row in rows:
+        lag = f', oldest ready {row.lag:.0f}s ago' if row.lag is not None else ''
+        ready = f' ({row.ready} ready{lag})' if row.state == 'queued' else ''
+        click.echo(f'{row.name:<32} {row.state:<8} {row.count}{ready}')
+
+
+@jobs_command.command('enqueue')
+@click.argument('name')
+@click.option('--args', 'arguments', default='{}', help='Job arguments as a JSON object.')
+@click.option('--key', help='Deduplication key.')
+def enqueue_command(name, arguments, key):
+    """Queue a job by name."""
+    if name not in jobs.tasks:
+        raise click.BadParameter(f'unknown job; known: {", ".join(sorted(jobs.tasks))}', param_hint='NAME')
+    id = jobs.enqueue(name, key=key, **json.loads(arguments))
+    db.session.commit()
+    click.echo(f'Queued job {id}.' if id else f'A job with key {key!r} is already pending.')
@@ -0,0 +1,79 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from jobs import jobs
+from models import db
+
+# `flask reconcile-locations`: recount venues, artists and upcoming shows per
+# location.
+#
+# Triggers keep the counts in step with every insert, update and delete.
+# upcoming_show_count counts shows starting after the location's
+# shows_after, and readers subtract the ones that have started since (see
+# venues() in app.py). Run this periodically (or after bulk surgery done
+# with triggers disabled): it is one grouped pass over venues, artists and
+# upcoming shows that moves shows_after up to now, so that subtraction
+# stays a short index range. counted_at only moves for a location whose
+# displayed counts were wrong. The locations.reconcile job runs it on the
+# JOB_SCHEDULE interval.
+
+RECONCILE = text("""
+WITH recount AS (
+    SELECT locations.id, coalesce(venues.count, 0) AS venues, coalesce(artists.count, 0) AS artists,
+           coalesce(upcoming.count, 0) AS upcoming,
+           (locations.venue_count, locations.artist_count,
+            locations.upcoming_show_count - coalesce(started.count, 0))
+           IS DISTINCT FROM (coalesce(venues.count, 0), coalesce(artists.count, 0), coalesce(upcoming.count, 0))
+           AS drifted
+    FROM locations
+    LEFT JOIN (SELECT location_id, count(*) FROM venues GROUP BY location_id) AS venues
+        ON venues.location_id = locations.id
+    LEFT JOIN (SELECT location_id, count(*) FROM artists GROUP BY location_id) AS artists
+        ON artists.location_id = locations.id
+    LEFT JOIN (SELECT venues.location_id, count(*) FROM shows JOIN venues ON venues.id = shows.venue_id
+               WHERE shows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id) AS upcoming
+        ON upcoming.location_id = locations.id
+    LEFT JOIN (SELECT venues.location_id, count(*) FROM shows JOIN venues ON venues.id = shows.venue_id
+               JOIN locations ON locations.id = venues.location_id
+               WHERE shows.start_time > locations.shows_after AND shows.start_time <= LOCALTIMESTAMP
+               GROUP BY venues.location_id) AS started
+        ON started.location_id = locations.id
+), updated AS (
+    UPDATE locations SET venue_count = recount.venues,
+                         artist_count = recount.artists,
+                         upcoming_show_count = recount.upcoming,
+                         shows_after = LOCALTIMESTAMP,
+                         counted_at = CASE WHEN recount.drifted THEN timezone('utc', now())
+                                           ELSE locations.counted_at END
+    FROM recount WHERE locations.id = recount.id
+    RETURNING recount.drifted
+)
+SELECT count(*) FILTER (WHERE drifted) FROM updated
+""")
+
+
+def reconcile_locations():
+    # Returns the number of locations whose counts had drifted
+    corrected = db.session.execute(RECONCILE).scalar()
+    db.session.commit()
+    return corrected
+
+
+@jobs.task('locations.reconcile')
+def reconcile_locations_job():
+    corrected = reconcile_locations()
+    if corrected:
+        current_app.logger.info('Corrected counts of %d location(s)', corrected)
+
+
+@click.command('reconcile-locations')
+@with_appcontext
+def reconcile_locations_command():
+    """Recount venues, artists and upcoming shows per location."""
+    started = time.perf_counter()
+    corrected = reconcile_locations()
+    click.echo(f'Corrected {corrected} location(s) in {time.perf_counter() - started:.2f}s.')
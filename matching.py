@@ -0,0 +1,157 @@
+import heapq
+import sys
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from forms import Genre
+from models import db, Venue, Artist
+from serialization import iter_ndjson
+
+# Venue <-> artist matching on genre bitmasks.
+#
+# venues.genre_mask and artists.genre_mask are generated columns: bit i is
+# set when forms.Genre member i is in genres (migration e7b3d5a0f1c8). A
+# seeking_talent venue and a seeking_venue artist in the same state match
+# when their masks share a bit, and score popcount(venue_mask & artist_mask),
+# the number of genres they share; ties go to the lower id.
+#
+# Candidates for one state come from a partial index on (state, genre_mask,
+# id) and are scored in batches: with numpy (optional dependency) a batch of
+# venues against every artist is one AND plus one popcount over a 2-D array,
+# otherwise int.bit_count() in a loop.
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+GENRE_BITS = {genre.name: 1 << index for index, genre in enumerate(Genre)}
+BATCH_SIZE = 512       # venues scored per 2-D batch
+DEFAULT_LIMIT = 10
+
+SIDES = {
+    # kind: (model, seeking column, counterpart kind)
+    'venues': (Venue, Venue.seeking_talent, 'artists'),
+    'artists': (Artist, Artist.seeking_venue, 'venues'),
+}
+
+
+def genre_mask(names):
+    # Same value as the database's fyyur_genre_mask(); unknown names are ignored
+    mask = 0
+    for name in names or ():
+        mask |= GENRE_BITS.get(name, 0)
+    return mask
+
+
+if numpy is not None:
+    if hasattr(numpy, 'bitwise_count'):
+        _popcount = numpy.bitwise_count
+    else:
+        _BYTE_COUNTS = numpy.array([bin(value).count('1') for value in range(256)], dtype=numpy.uint8)
+
+        def _popcount(values):
+            as_bytes = values.astype(numpy.uint32).view(numpy.uint8).reshape(values.shape + (4,))
+            return _BYTE_COUNTS[as_bytes].sum(axis=-1, dtype=numpy.uint8)
+
+
+def top(ids, scores, limit):
+    # (id, score) pairs with score > 0, best first, ties by id; ids ascend
+    if numpy is not None:
+        scores = numpy.asarray(scores)
+        positive = numpy.flatnonzero(scores)
+        # Stable sort on -score keeps ascending ids within a score
+        order = numpy.argsort(-scores[positive].astype(numpy.int16), kind='stable')[:limit]
+        return [(ids[index], int(scores[index])) for index in positive[order]]
+    best = heapq.nsmallest(limit, ((-score, id) for id, score in zip(ids, scores) if score))
+    return [(id, -negative) for negative, id in best]
+
+
+def score(mask, masks):
+    # Shared genres between one mask and every mask in a candidate list
+    if numpy is not None:
+        return _popcount(numpy.bitwise_and(numpy.asarray(masks, dtype=numpy.uint32), numpy.uint32(mask)))
+    return [(mask & other).bit_count() for other in masks]
+
+
+def score_batch(masks, candidate_masks):
+    # Rows of shared-genre counts, one row per mask in masks
+    if numpy is not None:
+        left = numpy.asarray(masks, dtype=numpy.uint32)[:, None]
+        right = numpy.asarray(candidate_masks, dtype=numpy.uint32)[None, :]
+        return _popcount(left & right)
+    return [[(mask & other).bit_count() for other in candidate_masks] for mask in masks]
+
+
+def candidates(kind, state):
+    # (ids, masks) of everyone seeking on this side in one state, id order
+    model, seeking, _ = SIDES[kind]
+    rows = db.session.execute(
+        select(model.id, model.genre_mask).where(seeking.is_(True), model.state == state,
+                                                 model.genre_mask != 0).order_by(model.id)
+    ).all()
+    return [row.id for row in rows], [row.genre_mask for row in rows]
+
+
+def matches_for(kind, id, limit=DEFAULT_LIMIT):
+    # Best counterparts for one venue or artist, or None if it does not exist
+    model, _, other = SIDES[kind]
+    entity = db.session.execute(select(model.state, model.genre_mask).where(model.id == id)).first()
+    if entity is None:
+        return None
+    ids, masks = candidates(other, entity.state)
+    return top(ids, score(entity.genre_mask, masks), limit)
+
+
+def states():
+    venue_states = select(Venue.state).where(Venue.seeking_talent.is_(True)).distinct()
+    artist_states = select(Artist.state).where(Artist.seeking_venue.is_(True)).distinct()
+    return sorted(state for state, in db.session.execute(venue_states.intersect(artist_states)) if state)
+
+
+def top_batch(ids, scores, limit):
+    # top() for every row of a score_batch() result
+    if numpy is None:
+        return [top(ids, row, limit) for row in scores]
+    # One stable sort per batch; within a score, columns stay in id order
+    order = numpy.argsort(-scores.astype(numpy.int16), axis=1, kind='stable')[:, :limit]
+    best = numpy.take_along_axis(scores, order, axis=1)
+    return [[(ids[index], int(value)) for index, value in zip(row_order, row_best) if value]
+            for row_order, row_best in zip(order.tolist(), best.tolist())]
+
+
+def catalog_matches(state=None, limit=DEFAULT_LIMIT, batch_size=BATCH_SIZE):
+    # Yields (state, venue_id, [(artist_id, score), ...]) for every seeking
+    # venue with at least one match, BATCH_SIZE venues scored at a time
+    for current in [state] if state else states():
+        venue_ids, venue_masks = candidates('venues', current)
+        artist_ids, artist_masks = candidates('artists', current)
+        if not venue_ids or not artist_ids:
+            continue
+        for start in range(0, len(venue_ids), batch_size):
+            scores = score_batch(venue_masks[start:start + batch_size], artist_masks)
+            for venue_id, ranked in zip(venue_ids[start:start + batch_size], top_batch(artist_ids, scores, limit)):
+                if ranked:
+                    yield current, venue_id, ranked
+
+
+@click.command('match')
+@click.option('--state', help='Only match venues and artists in this state.')
+@click.option('--limit', default=DEFAULT_LIMIT, show_default=True, help='Artists per venue.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Venues scored per batch.')
+@with_appcontext
+def match_command(state, limit, batch_size):
+    """Rank seeking artists for every seeking venue by shared genres (NDJSON)."""
+    started = time.perf_counter()
+    venues = 0
+    for current, venue_id, ranked in catalog_matches(state, limit, batch_size):
+        row = {'state': current, 'venue_id': venue_id,
+               'artists': [{'id': artist_id, 'score': value} for artist_id, value in ranked]}
+        sys.stdout.buffer.writelines(iter_ndjson([row]))
+        venues += 1
+    sys.stdout.buffer.flush()
+    click.echo(f'Matched {venues} venues in {time.perf_counter() - started:.2f}s '
+               f'({"numpy" if numpy is not None else "pure Python"} scoring).', err=True)
@@ -0,0 +1,289 @@
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+from auth import token_required
+from models import db
+from pool import TimedQueuePool
+
+# Prometheus text-format metrics, served at GET /metrics to scrapers that
+# send `Authorization: Bearer <DIAGNOSTICS_TOKEN>` (see auth.py).
+#
+# Collection is lock-free on the hot path: every thread writes to its own
+# shard (plain dicts only that thread mutates) and a scrape sums the shards.
+# The only lock is taken once per thread, when its shard is registered.
+#
+# With METRICS_MULTIPROC_DIR set, each worker also writes its totals to
+# <dir>/<pid>.json at most every METRICS_FLUSH_INTERVAL seconds, and a scrape
+# on any worker merges all files. Counters and histograms of exited workers
+# are kept so totals stay monotonic; gauges only count live workers.
+#
+# Collectors (callables returning {'gauges': {...}}) describe state shared
+# by every worker, such as the job queue, and run once per scrape.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+JOB_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 1800.0)
+
+METRICS = {
+    'fyyur_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'fyyur_http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'fyyur_http_requests_in_flight': ('gauge', 'Requests currently being handled.', None),
+    'fyyur_template_render_seconds': ('histogram', 'Template render time.', LATENCY_BUCKETS),
+    'fyyur_db_request_seconds': ('histogram', 'Time spent in SQL per request.', LATENCY_BUCKETS),
+    'fyyur_db_statements_per_request': ('histogram', 'SQL statements per request.', STATEMENT_BUCKETS),
+    'fyyur_db_pool_size': ('gauge', 'Configured pool size.', None),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections checked out of the pool.', None),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', None),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Pool checkouts.', None),
+    'fyyur_db_pool_timeouts_total': ('counter', 'Pool checkouts that timed out.', None),
+    'fyyur_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for pool checkouts.', None),
+    'fyyur_jobs': ('gauge', 'Queued and running jobs by name and state.', None),
+    'fyyur_jobs_ready': ('gauge', 'Queued jobs whose run time has passed.', None),
+    'fyyur_jobs_lag_seconds': ('gauge', 'How long the oldest ready job has been waiting.', None),
+    'fyyur_jobs_total': ('counter', 'Job attempts by name and outcome (done, retried, failed).', None),
+    'fyyur_job_duration_seconds': ('histogram', 'Job run time by name.', JOB_BUCKETS),
+}
+
+
+class Shard:
+
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> float
+        self.gauges = {}      # (name, labels) -> float
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+
+class Metrics:
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.flush_interval = 5
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self.collectors = []
+
+    def init_app(self, app):
+        # Register after sql_profiler so the request's SQL profile is still
+        # on g when _finish runs (after_request handlers run in reverse)
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        self.directory = app.config.get('METRICS_MULTIPROC_DIR')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+        app.add_url_rule('/metrics', 'metrics', token_required('DIAGNOSTICS_TOKEN')(self.view))
+
+    # Recording -------------------------------------------------------------
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def add(self, name, labels=(), amount=1):
+        gauges = self._shard().gauges
+        key = (name, labels)
+        gauges[key] = gauges.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        buckets = METRICS[name][2]
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                entry[index] += 1
+                break
+        entry[-2] += value
+        entry[-1] += 1
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched'
+        self.add('fyyur_http_requests_in_flight', (('endpoint', g.metrics_endpoint),))
+
+    def _finish(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        endpoint = g.metrics_endpoint
+        self.inc('fyyur_http_requests_total',
+                 (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+        self.observe('fyyur_http_request_duration_seconds', (('endpoint', endpoint),),
+                     time.perf_counter() - started)
+        profile = g.get('sql_profile')
+        if profile is not None:
+            self.observe('fyyur_db_request_seconds', (('endpoint', endpoint),), profile.db_time)
+            self.observe('fyyur_db_statements_per_request', (('endpoint', endpoint),), profile.statements)
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+        return response
+
+    def _teardown(self, exc):
+        # Runs even when the view raised, so in-flight never drifts upward
+        if g.pop('metrics_started', None) is not None:
+            self.add('fyyur_http_requests_in_flight', (('endpoint', g.metrics_endpoint),), -1)
+
+    def _before_render(self, sender, template, context, **extra):
+        g.setdefault('metrics_renders', []).append(time.perf_counter())
+
+    def _rendered(self, sender, template, context, **extra):
+        starts = g.get('metrics_renders')
+        if starts:
+            self.observe('fyyur_template_render_seconds', (('template', template.name or 'string'),),
+                         time.perf_counter() - starts.pop())
+
+    # Collection ------------------------------------------------------------
+
+    def snapshot(self):
+        # This process's totals, plus pool state read at collection time
+        counters, gauges, histograms = {}, {}, {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in shard.gauges.copy().items():
+                gauges[key] = gauges.get(key, 0) + value
+            for key, entry in shard.histograms.copy().items():
+                _merge_histogram(histograms, key, list(entry))
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, TimedQueuePool):
+                continue
+            labels = (('bind', bind or 'default'),)
+            gauges[('fyyur_db_pool_size', labels)] = pool.size()
+            gauges[('fyyur_db_pool_checked_out', labels)] = pool.checkedout()
+            gauges[('fyyur_db_pool_overflow', labels)] = max(0, pool.overflow())
+            stats = pool.checkout_stats
+            counters[('fyyur_db_pool_checkouts_total', labels)] = stats.checkouts
+            counters[('fyyur_db_pool_timeouts_total', labels)] = stats.timeouts
+            counters[('fyyur_db_pool_wait_seconds_total', labels)] = stats.wait_total
+        return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+        snapshot = self.snapshot()
+        data = {kind: [[name, list(labels), value] for (name, labels), value in values.items()]
+                for kind, values in snapshot.items()}
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as handle:
+            json.dump(data, handle)
+        os.replace(tmp, path)
+
+    def collect(self):
+        merged = self.snapshot()
+        for collector in self.collectors:
+            for kind, values in collector().items():
+                merged[kind].update(values)
+        if not self.directory:
+            return merged
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            pid = int(os.path.basename(path)[:-len('.json')])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            alive = _alive(pid)
+            for kind in ('counters', 'gauges', 'histograms'):
+                if kind == 'gauges' and not alive:
+                    continue
+                for name, labels, value in data.get(kind, []):
+                    key = (name, tuple(tuple(pair) for pair in labels))
+                    if kind == 'histograms':
+                        _merge_histogram(merged[kind], key, value)
+                    else:
+                        merged[kind][key] = merged[kind].get(key, 0) + value
+        return merged
+
+    def render(self):
+        data = self.collect()
+        by_name = {}
+        for kind in ('counters', 'gauges', 'histograms'):
+            for (name, labels), value in data[kind].items():
+                by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, description, buckets) in METRICS.items():
+            series = by_name.get(name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {value[-1]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+                lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _merge_histogram(histograms, key, entry):
+    current = histograms.get(key)
+    if current is None:
+        histograms[key] = list(entry)
+    else:
+        for index, value in enumerate(entry):
+            current[index] += value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+metrics = Metrics()
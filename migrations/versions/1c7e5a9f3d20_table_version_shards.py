@@ -0,0 +1,77 @@
+"""spread table version counters over shards so writers don't queue
+
+Revision ID: 1c7e5a9f3d20
+Revises: d6a2c8e4f0b3
+Create Date: 2026-10-18 09:12:37.284615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c7e5a9f3d20'
+down_revision = 'd6a2c8e4f0b3'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('venues', 'artists', 'shows')
+SHARDS = 16
+
+# A table's version is the sum of its shards. Each bump takes a shard no
+# other transaction holds (SKIP LOCKED), so concurrent writers to one table
+# no longer wait on a single row lock until commit; they only wait when all
+# shards are held. The bump stays transactional: readers see it exactly
+# when the rows it stands for become visible, which a sequence's
+# non-transactional nextval would not give.
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION fyyur_bump_table_version() RETURNS trigger AS $$
+DECLARE
+    slot smallint;
+BEGIN
+    SELECT shard INTO slot FROM table_versions WHERE table_name = TG_TABLE_NAME
+    ORDER BY random() LIMIT 1 FOR UPDATE SKIP LOCKED;
+    IF NOT FOUND THEN
+        slot := floor(random() * %(shards)d);
+    END IF;
+    UPDATE table_versions SET version = version + 1, changed_at = timezone('utc', now())
+    WHERE table_name = TG_TABLE_NAME AND shard = slot;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+""" % {'shards': SHARDS}
+
+PREVIOUS_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION fyyur_bump_table_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE table_versions SET version = version + 1, changed_at = timezone('utc', now())
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    op.add_column('table_versions', sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name', 'shard'])
+    op.execute(sa.text(f"""
+        INSERT INTO table_versions (table_name, shard)
+        SELECT table_name, n FROM table_versions, generate_series(1, {SHARDS - 1}) AS n
+    """))
+    op.execute(FUNCTIONS)
+
+
+def downgrade():
+    op.execute(PREVIOUS_FUNCTIONS)
+    op.execute(sa.text("""
+        UPDATE table_versions SET version = totals.version
+        FROM (SELECT table_name, sum(version) AS version FROM table_versions GROUP BY table_name) AS totals
+        WHERE table_versions.table_name = totals.table_name AND table_versions.shard = 0
+    """))
+    op.execute(sa.text('DELETE FROM table_versions WHERE shard <> 0'))
+    op.drop_constraint('table_versions_pkey', 'table_versions', type_='primary')
+    op.create_primary_key('table_versions_pkey', 'table_versions', ['table_name'])
+    op.drop_column('table_versions', 'shard')
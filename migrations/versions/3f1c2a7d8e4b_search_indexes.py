@@ -0,0 +1,54 @@
+"""full-text and trigram search indexes for venues and artists
+
+Revision ID: 3f1c2a7d8e4b
+Revises: 9ac34f179e00
+Create Date: 2026-10-18 09:12:41.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d8e4b'
+down_revision = '9ac34f179e00'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_DOCUMENT = 'fyyur_search_document(name, city, state, genres)'
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # array_to_string() is only STABLE, so wrap the document in an IMMUTABLE
+    # function that generated columns and index expressions may use
+    op.execute("""
+        CREATE OR REPLACE FUNCTION fyyur_search_document(
+            name varchar, city varchar, state varchar, genres varchar[]
+        ) RETURNS tsvector AS $$
+            SELECT setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+                || setweight(to_tsvector('simple', coalesce(city, '') || ' ' || coalesce(state, '')), 'B')
+                || setweight(to_tsvector('simple', coalesce(array_to_string(genres, ' '), '')), 'C')
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    """)
+
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column(
+            'search_vector', postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_DOCUMENT, persisted=True), nullable=True
+        ))
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+        op.create_index(f'ix_{table}_name_trgm', table, ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_search_document(varchar, varchar, varchar, varchar[])')
@@ -0,0 +1,213 @@
+"""count each location's upcoming shows from a stored boundary
+
+Revision ID: 4e8b2d6f0a19
+Revises: 1c7e5a9f3d20
+Create Date: 2026-10-18 10:03:51.472906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b2d6f0a19'
+down_revision = '1c7e5a9f3d20'
+branch_labels = None
+depends_on = None
+
+
+# upcoming_show_count becomes the number of the location's shows starting
+# after its shows_after, rather than after whenever a trigger last ran, so
+# it no longer drifts: the area listing subtracts the few shows that have
+# started since shows_after, which locations.reconcile moves up to the
+# present. A new location starts counting from its creation.
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION fyyur_venue_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET venue_count = l.venue_count + d.venues
+        FROM (SELECT location_id, count(*) AS venues FROM new_rows GROUP BY location_id) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET venue_count = l.venue_count + d.venues,
+                               upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT location_id, sum(venues) AS venues, sum(upcoming) AS upcoming FROM (
+                SELECT moved.location_id, moved.sign AS venues, moved.sign * (
+                    SELECT count(*) FROM shows JOIN locations ON locations.id = moved.location_id
+                    WHERE shows.venue_id = moved.id AND shows.start_time > locations.shows_after
+                ) AS upcoming
+                FROM (
+                    SELECT n.id, n.location_id, 1 AS sign FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                    UNION ALL
+                    SELECT o.id, o.location_id, -1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                ) moved
+            ) moves GROUP BY location_id
+        ) d
+        WHERE l.id = d.location_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fyyur_venue_location_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE locations SET venue_count = venue_count - 1,
+                         upcoming_show_count = upcoming_show_count - (
+                             SELECT count(*) FROM shows WHERE venue_id = OLD.id AND start_time > locations.shows_after
+                         )
+    WHERE id = OLD.location_id;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fyyur_show_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM new_rows JOIN venues ON venues.id = new_rows.venue_id
+                          JOIN locations ON locations.id = venues.location_id
+            WHERE new_rows.start_time > locations.shows_after GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count - d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM old_rows JOIN venues ON venues.id = old_rows.venue_id
+                          JOIN locations ON locations.id = venues.location_id
+            WHERE old_rows.start_time > locations.shows_after GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, sum(changes.sign) AS upcoming FROM (
+                SELECT venue_id, start_time, 1 AS sign FROM new_rows
+                UNION ALL
+                SELECT venue_id, start_time, -1 FROM old_rows
+            ) changes JOIN venues ON venues.id = changes.venue_id
+                      JOIN locations ON locations.id = venues.location_id
+            WHERE changes.start_time > locations.shows_after
+            GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id AND d.upcoming <> 0;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+COUNT = """
+UPDATE locations SET upcoming_show_count = coalesce(upcoming.count, 0)
+FROM locations AS counted
+LEFT JOIN (SELECT venues.location_id, count(*) FROM shows JOIN venues ON venues.id = shows.venue_id
+           JOIN locations ON locations.id = venues.location_id
+           WHERE shows.start_time > locations.shows_after GROUP BY venues.location_id) AS upcoming
+    ON upcoming.location_id = counted.id
+WHERE locations.id = counted.id
+"""
+
+# As migration f2a8c6d4b9e1 created them
+PREVIOUS_FUNCTIONS = """
+-- AFTER INSERT / UPDATE statement triggers on venues: one UPDATE of the
+-- affected locations per statement, however many rows (COPY included).
+-- A venue that moves takes its upcoming shows along.
+CREATE OR REPLACE FUNCTION fyyur_venue_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET venue_count = l.venue_count + d.venues
+        FROM (SELECT location_id, count(*) AS venues FROM new_rows GROUP BY location_id) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET venue_count = l.venue_count + d.venues,
+                               upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT location_id, sum(venues) AS venues, sum(upcoming) AS upcoming FROM (
+                SELECT moved.location_id, moved.sign AS venues, moved.sign * (
+                    SELECT count(*) FROM shows WHERE shows.venue_id = moved.id AND shows.start_time > LOCALTIMESTAMP
+                ) AS upcoming
+                FROM (
+                    SELECT n.id, n.location_id, 1 AS sign FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                    UNION ALL
+                    SELECT o.id, o.location_id, -1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                ) moved
+            ) moves GROUP BY location_id
+        ) d
+        WHERE l.id = d.location_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- BEFORE DELETE row trigger on venues. It runs while the venue's shows
+-- still exist, whether they are removed first (ORM cascade) or after it
+-- (ON DELETE CASCADE); the shows trigger skips shows whose venue is gone.
+CREATE OR REPLACE FUNCTION fyyur_venue_location_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE locations SET venue_count = venue_count - 1,
+                         upcoming_show_count = upcoming_show_count - (
+                             SELECT count(*) FROM shows WHERE venue_id = OLD.id AND start_time > LOCALTIMESTAMP
+                         )
+    WHERE id = OLD.location_id;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+-- AFTER INSERT / UPDATE / DELETE statement triggers on shows: upcoming
+-- shows per location of their venue
+CREATE OR REPLACE FUNCTION fyyur_show_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM new_rows JOIN venues ON venues.id = new_rows.venue_id
+            WHERE new_rows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count - d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM old_rows JOIN venues ON venues.id = old_rows.venue_id
+            WHERE old_rows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, sum(changes.sign) AS upcoming FROM (
+                SELECT venue_id, 1 AS sign FROM new_rows WHERE start_time > LOCALTIMESTAMP
+                UNION ALL
+                SELECT venue_id, -1 FROM old_rows WHERE start_time > LOCALTIMESTAMP
+            ) changes JOIN venues ON venues.id = changes.venue_id
+            GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id AND d.upcoming <> 0;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    op.add_column('locations', sa.Column('shows_after', sa.DateTime(), server_default=sa.text('LOCALTIMESTAMP'),
+                                         nullable=False))
+    op.execute(FUNCTIONS)
+    op.execute(COUNT)
+
+
+def downgrade():
+    op.execute(PREVIOUS_FUNCTIONS)
+    # The old triggers count from the time they run
+    op.execute('UPDATE locations SET shows_after = LOCALTIMESTAMP')
+    op.execute(COUNT)
+    op.drop_column('locations', 'shows_after')
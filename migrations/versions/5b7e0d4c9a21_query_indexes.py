@@ -0,0 +1,43 @@
+"""indexes for the show, area and genre query shapes
+
+Revision ID: 5b7e0d4c9a21
+Revises: 3f1c2a7d8e4b
+Create Date: 2026-10-18 10:03:17.842660
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0d4c9a21'
+down_revision = '3f1c2a7d8e4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Detail pages: shows for one venue/artist split on start_time
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    # /shows keyset pagination on (start_time, id)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'], unique=False)
+    # /artists keyset pagination on (name, id)
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'], unique=False)
+    # Area grouping and location filters
+    op.create_index('ix_venues_city_state', 'venues', ['city', 'state'], unique=False)
+    op.create_index('ix_artists_city_state', 'artists', ['city', 'state'], unique=False)
+    # Genre containment (genres @> ARRAY[...])
+    op.create_index('ix_venues_genres', 'venues', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
+    op.drop_index('ix_artists_city_state', table_name='artists')
+    op.drop_index('ix_venues_city_state', table_name='venues')
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,32 @@
+"""updated_at tracking on venues, artists and shows
+
+Revision ID: 8d2f6b1e0c37
+Revises: 5b7e0d4c9a21
+Create Date: 2026-10-18 11:26:54.019385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f6b1e0c37'
+down_revision = '5b7e0d4c9a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("timezone('utc', now())")
+        ))
+        # max(updated_at) backs the listing page validators
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,34 @@
+"""delete shows with their venue or artist in the database
+
+Revision ID: a9d1e3c5b7f2
+Revises: f2a8c6d4b9e1
+Create Date: 2026-10-18 19:02:55.613027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d1e3c5b7f2'
+down_revision = 'f2a8c6d4b9e1'
+branch_labels = None
+depends_on = None
+
+
+FOREIGN_KEYS = {
+    'shows_venue_id_fkey': ('venue_id', 'venues'),
+    'shows_artist_id_fkey': ('artist_id', 'artists'),
+}
+
+
+def upgrade():
+    for name, (column, table) in FOREIGN_KEYS.items():
+        op.drop_constraint(name, 'shows', type_='foreignkey')
+        op.create_foreign_key(name, 'shows', table, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for name, (column, table) in FOREIGN_KEYS.items():
+        op.drop_constraint(name, 'shows', type_='foreignkey')
+        op.create_foreign_key(name, 'shows', table, [column], ['id'])
@@ -0,0 +1,56 @@
+"""durable background job table
+
+Revision ID: b5f7d9e2c4a6
+Revises: a9d1e3c5b7f2
+Create Date: 2026-10-18 20:11:37.250194
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f7d9e2c4a6'
+down_revision = 'a9d1e3c5b7f2'
+branch_labels = None
+depends_on = None
+
+
+NOW = sa.text("timezone('utc', now())")
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('args', postgresql.JSONB(), server_default=sa.text("'{}'::jsonb"), nullable=False),
+        sa.Column('key', sa.String(length=255), nullable=True),
+        sa.Column('state', sa.String(length=16), server_default='queued', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('max_attempts', sa.Integer(), server_default='5', nullable=False),
+        sa.Column('run_at', sa.DateTime(), server_default=NOW, nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('locked_by', sa.String(length=120), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=NOW, nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint("state IN ('queued', 'running', 'done', 'failed')", name='ck_jobs_state'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Claim order; only queued rows are indexed, so the index stays small
+    # however many finished jobs are kept
+    op.create_index('ix_jobs_queued_run_at_id', 'jobs', ['run_at', 'id'], unique=False,
+                    postgresql_where=sa.text("state = 'queued'"))
+    # Deduplication: one pending job per key (periodic jobs, deletions)
+    op.create_index('ux_jobs_pending_key', 'jobs', ['key'], unique=True,
+                    postgresql_where=sa.text("state IN ('queued', 'running')"))
+    op.create_index('ix_jobs_key_finished_at', 'jobs', ['key', 'finished_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_key_finished_at', table_name='jobs')
+    op.drop_index('ux_jobs_pending_key', table_name='jobs')
+    op.drop_index('ix_jobs_queued_run_at_id', table_name='jobs')
+    op.drop_table('jobs')
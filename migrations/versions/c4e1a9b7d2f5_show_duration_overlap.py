@@ -0,0 +1,63 @@
+"""show duration and database-enforced double-booking prevention
+
+Revision ID: c4e1a9b7d2f5
+Revises: 8d2f6b1e0c37
+Create Date: 2026-10-18 14:05:41.530217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a9b7d2f5'
+down_revision = '8d2f6b1e0c37'
+branch_labels = None
+depends_on = None
+
+# A show occupies [start_time, end_time). The venue/artist id is wrapped in a
+# single-value int4range so the built-in GiST range operator class covers
+# both columns and no btree_gist extension is needed.
+EXCLUSIONS = {
+    'ex_shows_venue_overlap': 'venue_id',
+    'ex_shows_artist_overlap': 'artist_id',
+}
+
+OVERLAPS = """
+SELECT count(*) FROM (
+    SELECT start_time < lag(end_time) OVER (PARTITION BY {column} ORDER BY start_time) AS clashes
+    FROM shows
+) AS ordered
+WHERE clashes
+"""
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(), nullable=False, server_default='120'))
+    op.create_check_constraint('ck_shows_duration_positive', 'shows', 'duration_minutes > 0')
+    op.add_column('shows', sa.Column(
+        'end_time', sa.DateTime(),
+        sa.Computed("start_time + duration_minutes * interval '1 minute'", persisted=True),
+        nullable=False,
+    ))
+
+    connection = op.get_bind()
+    for name, column in EXCLUSIONS.items():
+        conflicts = connection.execute(sa.text(OVERLAPS.format(column=column))).scalar()
+        if conflicts:
+            raise RuntimeError(
+                f'{conflicts} existing show(s) overlap another show with the same {column}; '
+                f'shorten or remove them before adding {name}.'
+            )
+        op.execute(
+            f'ALTER TABLE shows ADD CONSTRAINT {name} EXCLUDE USING gist '
+            f"(int4range({column}, {column}, '[]') WITH =, tsrange(start_time, end_time) WITH &&)"
+        )
+
+
+def downgrade():
+    for name in reversed(list(EXCLUSIONS)):
+        op.drop_constraint(name, 'shows')
+    op.drop_column('shows', 'end_time')
+    op.drop_constraint('ck_shows_duration_positive', 'shows', type_='check')
+    op.drop_column('shows', 'duration_minutes')
@@ -0,0 +1,55 @@
+"""per-table insert/delete counters for listing validators
+
+Revision ID: d6a2c8e4f0b3
+Revises: b5f7d9e2c4a6
+Create Date: 2026-10-19 10:24:51.613807
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6a2c8e4f0b3'
+down_revision = 'b5f7d9e2c4a6'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('venues', 'artists', 'shows')
+
+# One counter row per table, bumped once per INSERT, DELETE or TRUNCATE
+# statement (COPY and cascaded deletes included). Updates already move
+# max(updated_at).
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION fyyur_bump_table_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE table_versions SET version = version + 1, changed_at = timezone('utc', now())
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    op.create_table(
+        'table_versions',
+        sa.Column('table_name', sa.String(length=63), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False),
+        sa.PrimaryKeyConstraint('table_name')
+    )
+    op.execute(sa.text('INSERT INTO table_versions (table_name) VALUES ' +
+                       ', '.join(f"('{table}')" for table in TABLES)))
+    op.execute(FUNCTIONS)
+    for table in TABLES:
+        op.execute(f'CREATE TRIGGER {table}_table_version AFTER INSERT OR DELETE OR TRUNCATE ON {table} '
+                   'FOR EACH STATEMENT EXECUTE FUNCTION fyyur_bump_table_version()')
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_table_version ON {table}')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_bump_table_version()')
+    op.drop_table('table_versions')
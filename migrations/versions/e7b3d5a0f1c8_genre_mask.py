@@ -0,0 +1,54 @@
+"""genre bitmasks on venues and artists for matching
+
+Revision ID: e7b3d5a0f1c8
+Revises: c4e1a9b7d2f5
+Create Date: 2026-10-18 16:22:09.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3d5a0f1c8'
+down_revision = 'c4e1a9b7d2f5'
+branch_labels = None
+depends_on = None
+
+
+GENRE_MASK = 'fyyur_genre_mask(genres)'
+
+# Bit i is forms.Genre member i at the time of this migration. New genres
+# must be appended (and the function replaced) so existing bits keep their
+# meaning.
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'HipHop',
+          'HeavyMetal', 'Instrumental', 'Jazz', 'MusicalTheatre', 'Pop', 'Punk', 'RB', 'Reggae',
+          'Rock', 'Soul', 'Swing', 'Other']
+
+SEEKING = {'venues': 'seeking_talent', 'artists': 'seeking_venue'}
+
+
+def upgrade():
+    genres = ', '.join(f"'{genre}'" for genre in GENRES)
+    # Unknown names have no position and drop out of bit_or
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION fyyur_genre_mask(genres varchar[]) RETURNS integer AS $$
+            SELECT coalesce(bit_or(1 << (array_position(ARRAY[{genres}]::varchar[], genre) - 1)), 0)
+            FROM unnest(genres) AS genre
+        $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    """)
+
+    for table, seeking in SEEKING.items():
+        op.add_column(table, sa.Column(
+            'genre_mask', sa.Integer(), sa.Computed(GENRE_MASK, persisted=True), nullable=False
+        ))
+        # Matching candidates: everyone seeking in one state, read index-only
+        op.create_index(f'ix_{table}_seeking_state_genre_mask', table, ['state', 'genre_mask', 'id'],
+                        unique=False, postgresql_where=sa.text(seeking))
+
+
+def downgrade():
+    for table in reversed(list(SEEKING)):
+        op.drop_index(f'ix_{table}_seeking_state_genre_mask', table_name=table)
+        op.drop_column(table, 'genre_mask')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_genre_mask(varchar[])')
@@ -0,0 +1,278 @@
+"""normalized locations for venues and artists, with maintained counts
+
+Revision ID: f2a8c6d4b9e1
+Revises: e7b3d5a0f1c8
+Create Date: 2026-10-18 17:40:12.093184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c6d4b9e1'
+down_revision = 'e7b3d5a0f1c8'
+branch_labels = None
+depends_on = None
+
+
+# A location is (upper(state), lower(city)) after trimming and collapsing
+# whitespace, so "San Francisco" and "san  francisco " share one row. The
+# displayed city is the most common spelling at backfill time, or the first
+# one seen afterwards.
+FUNCTIONS = r"""
+CREATE OR REPLACE FUNCTION fyyur_tidy(value varchar) RETURNS varchar AS $$
+    SELECT regexp_replace(btrim(coalesce(value, '')), '\s+', ' ', 'g')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- BEFORE INSERT / UPDATE OF city, state on venues and artists
+CREATE OR REPLACE FUNCTION fyyur_assign_location() RETURNS trigger AS $$
+DECLARE
+    key_state varchar := upper(fyyur_tidy(NEW.state));
+    key_city varchar := lower(fyyur_tidy(NEW.city));
+BEGIN
+    SELECT id INTO NEW.location_id FROM locations WHERE state = key_state AND city_key = key_city;
+    IF NOT FOUND THEN
+        INSERT INTO locations (city, state, city_key) VALUES (fyyur_tidy(NEW.city), key_state, key_city)
+        ON CONFLICT (state, city_key) DO NOTHING
+        RETURNING id INTO NEW.location_id;
+        IF NEW.location_id IS NULL THEN  -- a concurrent insert won
+            SELECT id INTO NEW.location_id FROM locations WHERE state = key_state AND city_key = key_city;
+        END IF;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- AFTER INSERT / UPDATE statement triggers on venues: one UPDATE of the
+-- affected locations per statement, however many rows (COPY included).
+-- A venue that moves takes its upcoming shows along.
+CREATE OR REPLACE FUNCTION fyyur_venue_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET venue_count = l.venue_count + d.venues
+        FROM (SELECT location_id, count(*) AS venues FROM new_rows GROUP BY location_id) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET venue_count = l.venue_count + d.venues,
+                               upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT location_id, sum(venues) AS venues, sum(upcoming) AS upcoming FROM (
+                SELECT moved.location_id, moved.sign AS venues, moved.sign * (
+                    SELECT count(*) FROM shows WHERE shows.venue_id = moved.id AND shows.start_time > LOCALTIMESTAMP
+                ) AS upcoming
+                FROM (
+                    SELECT n.id, n.location_id, 1 AS sign FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                    UNION ALL
+                    SELECT o.id, o.location_id, -1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE n.location_id IS DISTINCT FROM o.location_id
+                ) moved
+            ) moves GROUP BY location_id
+        ) d
+        WHERE l.id = d.location_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- BEFORE DELETE row trigger on venues. It runs while the venue's shows
+-- still exist, whether they are removed first (ORM cascade) or after it
+-- (ON DELETE CASCADE); the shows trigger skips shows whose venue is gone.
+CREATE OR REPLACE FUNCTION fyyur_venue_location_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE locations SET venue_count = venue_count - 1,
+                         upcoming_show_count = upcoming_show_count - (
+                             SELECT count(*) FROM shows WHERE venue_id = OLD.id AND start_time > LOCALTIMESTAMP
+                         )
+    WHERE id = OLD.location_id;
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+-- AFTER INSERT / UPDATE / DELETE statement triggers on artists. A
+-- transition table only exists for the events that have it, hence one
+-- statement per event.
+CREATE OR REPLACE FUNCTION fyyur_artist_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET artist_count = l.artist_count + d.artists
+        FROM (SELECT location_id, count(*) AS artists FROM new_rows GROUP BY location_id) d
+        WHERE l.id = d.location_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE locations l SET artist_count = l.artist_count - d.artists
+        FROM (SELECT location_id, count(*) AS artists FROM old_rows GROUP BY location_id) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET artist_count = l.artist_count + d.artists
+        FROM (
+            SELECT location_id, sum(sign) AS artists FROM (
+                SELECT n.location_id, 1 AS sign FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE n.location_id IS DISTINCT FROM o.location_id
+                UNION ALL
+                SELECT o.location_id, -1 FROM new_rows n JOIN old_rows o ON o.id = n.id
+                WHERE n.location_id IS DISTINCT FROM o.location_id
+            ) moves GROUP BY location_id
+        ) d
+        WHERE l.id = d.location_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- AFTER INSERT / UPDATE / DELETE statement triggers on shows: upcoming
+-- shows per location of their venue
+CREATE OR REPLACE FUNCTION fyyur_show_location_counts() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM new_rows JOIN venues ON venues.id = new_rows.venue_id
+            WHERE new_rows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count - d.upcoming
+        FROM (
+            SELECT venues.location_id, count(*) AS upcoming
+            FROM old_rows JOIN venues ON venues.id = old_rows.venue_id
+            WHERE old_rows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id;
+    ELSE
+        UPDATE locations l SET upcoming_show_count = l.upcoming_show_count + d.upcoming
+        FROM (
+            SELECT venues.location_id, sum(changes.sign) AS upcoming FROM (
+                SELECT venue_id, 1 AS sign FROM new_rows WHERE start_time > LOCALTIMESTAMP
+                UNION ALL
+                SELECT venue_id, -1 FROM old_rows WHERE start_time > LOCALTIMESTAMP
+            ) changes JOIN venues ON venues.id = changes.venue_id
+            GROUP BY venues.location_id
+        ) d
+        WHERE l.id = d.location_id AND d.upcoming <> 0;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+BACKFILL = """
+INSERT INTO locations (city, state, city_key)
+SELECT DISTINCT ON (state, city_key) city, state, city_key FROM (
+    SELECT fyyur_tidy(city) AS city, upper(fyyur_tidy(state)) AS state, lower(fyyur_tidy(city)) AS city_key,
+           count(*) AS uses
+    FROM (SELECT city, state FROM venues UNION ALL SELECT city, state FROM artists) AS places
+    GROUP BY 1, 2, 3
+) AS spellings
+ORDER BY state, city_key, uses DESC, city;
+
+UPDATE venues SET location_id = locations.id FROM locations
+WHERE locations.state = upper(fyyur_tidy(venues.state)) AND locations.city_key = lower(fyyur_tidy(venues.city));
+
+UPDATE artists SET location_id = locations.id FROM locations
+WHERE locations.state = upper(fyyur_tidy(artists.state)) AND locations.city_key = lower(fyyur_tidy(artists.city));
+"""
+
+# Same statement as locations.RECONCILE, frozen here
+COUNTS = """
+UPDATE locations SET venue_count = coalesce(venues.count, 0),
+                     artist_count = coalesce(artists.count, 0),
+                     upcoming_show_count = coalesce(upcoming.count, 0),
+                     counted_at = timezone('utc', now())
+FROM locations AS counted
+LEFT JOIN (SELECT location_id, count(*) FROM venues GROUP BY location_id) AS venues
+    ON venues.location_id = counted.id
+LEFT JOIN (SELECT location_id, count(*) FROM artists GROUP BY location_id) AS artists
+    ON artists.location_id = counted.id
+LEFT JOIN (SELECT venues.location_id, count(*) FROM shows JOIN venues ON venues.id = shows.venue_id
+           WHERE shows.start_time > LOCALTIMESTAMP GROUP BY venues.location_id) AS upcoming
+    ON upcoming.location_id = counted.id
+WHERE locations.id = counted.id
+"""
+
+TRIGGERS = """
+CREATE TRIGGER venues_assign_location BEFORE INSERT OR UPDATE OF city, state ON venues
+    FOR EACH ROW EXECUTE FUNCTION fyyur_assign_location();
+CREATE TRIGGER artists_assign_location BEFORE INSERT OR UPDATE OF city, state ON artists
+    FOR EACH ROW EXECUTE FUNCTION fyyur_assign_location();
+
+CREATE TRIGGER venues_location_insert AFTER INSERT ON venues REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_venue_location_counts();
+CREATE TRIGGER venues_location_update AFTER UPDATE ON venues
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_venue_location_counts();
+CREATE TRIGGER venues_location_delete BEFORE DELETE ON venues
+    FOR EACH ROW EXECUTE FUNCTION fyyur_venue_location_delete();
+
+CREATE TRIGGER artists_location_insert AFTER INSERT ON artists REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_artist_location_counts();
+CREATE TRIGGER artists_location_update AFTER UPDATE ON artists
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_artist_location_counts();
+CREATE TRIGGER artists_location_delete AFTER DELETE ON artists REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_artist_location_counts();
+
+CREATE TRIGGER shows_location_insert AFTER INSERT ON shows REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_show_location_counts();
+CREATE TRIGGER shows_location_update AFTER UPDATE ON shows
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_show_location_counts();
+CREATE TRIGGER shows_location_delete AFTER DELETE ON shows REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION fyyur_show_location_counts();
+"""
+
+TRIGGER_NAMES = {
+    'venues': ['venues_assign_location', 'venues_location_insert', 'venues_location_update',
+               'venues_location_delete'],
+    'artists': ['artists_assign_location', 'artists_location_insert', 'artists_location_update',
+                'artists_location_delete'],
+    'shows': ['shows_location_insert', 'shows_location_update', 'shows_location_delete'],
+}
+
+
+def upgrade():
+    op.create_table(
+        'locations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city_key', sa.String(length=120), nullable=False),
+        sa.Column('venue_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('artist_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('counted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    # Also the area listing's scan order
+    op.create_index('ux_locations_state_city_key', 'locations', ['state', 'city_key'], unique=True)
+    op.execute(FUNCTIONS)
+
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('location_id', sa.Integer(), nullable=True))
+    op.execute(BACKFILL)
+    for table in ('venues', 'artists'):
+        op.alter_column(table, 'location_id', nullable=False)
+        op.create_foreign_key(f'{table}_location_id_fkey', table, 'locations', ['location_id'], ['id'])
+    op.create_index('ix_venues_location_id_name_id', 'venues', ['location_id', 'name', 'id'], unique=False)
+    op.create_index('ix_artists_location_id', 'artists', ['location_id'], unique=False)
+
+    op.execute(COUNTS)
+    op.execute(TRIGGERS)
+
+
+def downgrade():
+    for table, names in TRIGGER_NAMES.items():
+        for name in names:
+            op.execute(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+    op.drop_index('ix_artists_location_id', table_name='artists')
+    op.drop_index('ix_venues_location_id_name_id', table_name='venues')
+    for table in ('artists', 'venues'):
+        op.drop_constraint(f'{table}_location_id_fkey', table, type_='foreignkey')
+        op.drop_column(table, 'location_id')
+    for function in ('fyyur_show_location_counts', 'fyyur_artist_location_counts', 'fyyur_venue_location_delete',
+                     'fyyur_venue_location_counts', 'fyyur_assign_location'):
+        op.execute(f'DROP FUNCTION IF EXISTS {function}()')
+    op.execute('DROP FUNCTION IF EXISTS fyyur_tidy(varchar)')
+    op.drop_index('ux_locations_state_city_key', table_name='locations')
+    op.drop_table('locations')
@@ -1,5 +1,55 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, ExcludeConstraint
+
+from routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Weighted full-text document over name (A), city/state (B) and genres (C).
+# fyyur_search_document() is created by migration 3f1c2a7d8e4b.
+SEARCH_DOCUMENT = 'fyyur_search_document(name, city, state, genres)'
+
+# Genres as a bitmask, bit i = forms.Genre member i (see matching.py).
+# fyyur_genre_mask() is created by migration e7b3d5a0f1c8.
+GENRE_MASK = 'fyyur_genre_mask(genres)'
+
+class Location(db.Model):
+    # One row per normalized (city, state), maintained by triggers from
+    # migration f2a8c6d4b9e1: venues/artists get location_id on write and
+    # the counts follow inserts, moves and deletes. upcoming_show_count
+    # counts shows starting after shows_after (migration 4e8b2d6f0a19);
+    # readers subtract those that have started since, and `flask
+    # reconcile-locations` moves shows_after up to the present.
+    __tablename__ = 'locations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    city_key = db.Column(db.String(120), nullable=False)
+    venue_count = db.Column(db.Integer, nullable=False, server_default='0')
+    artist_count = db.Column(db.Integer, nullable=False, server_default='0')
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    shows_after = db.Column(db.DateTime, nullable=False, server_default=db.text('LOCALTIMESTAMP'))
+    counted_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ux_locations_state_city_key', 'state', 'city_key', unique=True),
+    )
+
+class TableVersion(db.Model):
+    # Bumped by statement triggers (migration d6a2c8e4f0b3) on every INSERT,
+    # DELETE or TRUNCATE of venues, artists and shows; listing validators
+    # read it instead of counting rows. A table's version is the sum over
+    # its shards (migration 1c7e5a9f3d20), so concurrent writers each bump
+    # a different row.
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(63), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, server_default='0')
+    version = db.Column(db.BigInteger, nullable=False, server_default='0')
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
 
 class Venue(db.Model):
     __tablename__ = 'venues'
@@ -9,6 +59,8 @@ class Venue(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False,
+                            server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
@@ -16,6 +68,22 @@ class Venue(db.Model):
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_DOCUMENT, persisted=True)))
+    genre_mask = db.Column(db.Integer, db.Computed(GENRE_MASK, persisted=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_venues_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_city_state', 'city', 'state'),
+        db.Index('ix_venues_location_id_name_id', 'location_id', 'name', 'id'),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_updated_at', 'updated_at'),
+        db.Index('ix_venues_seeking_state_genre_mask', 'state', 'genre_mask', 'id',
+                 postgresql_where=db.text('seeking_talent')),
+    )
 
 class Artist(db.Model):
     __tablename__ = 'artists'
@@ -24,6 +92,8 @@ class Artist(db.Model):
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False,
+                            server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
     phone = db.Column(db.String(120))
     genres = db.Column(db.ARRAY(db.String))
     image_link = db.Column(db.String(500))
@@ -31,15 +101,103 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(SEARCH_DOCUMENT, persisted=True)))
+    genre_mask = db.Column(db.Integer, db.Computed(GENRE_MASK, persisted=True), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_artists_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_city_state', 'city', 'state'),
+        db.Index('ix_artists_location_id', 'location_id'),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_updated_at', 'updated_at'),
+        db.Index('ix_artists_seeking_state_genre_mask', 'state', 'genre_mask', 'id',
+                 postgresql_where=db.text('seeking_venue')),
+    )
+
+
+DEFAULT_SHOW_MINUTES = 120
+
+BOOKING_CONFLICTS = {
+    'ex_shows_venue_overlap': 'The venue already has a show booked at that time.',
+    'ex_shows_artist_overlap': 'The artist is already booked at that time.',
+}
+
+
+def booking_conflict(error):
+    # Form error message for an IntegrityError (or a raw psycopg2 error from
+    # COPY) raised by one of the overlap constraints, or None for anything else
+    orig = getattr(error, 'orig', error)
+    if getattr(orig, 'pgcode', None) != '23P01':
+        return None
+    return BOOKING_CONFLICTS.get(orig.diag.constraint_name, 'That time overlaps another show.')
 
 
 class Show(db.Model):
     __tablename__ = 'shows'
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+    end_time = db.Column(db.DateTime, db.Computed("start_time + duration_minutes * interval '1 minute'",
+                                                  persisted=True), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.text("timezone('utc', now())"))
+
+    # No venue or artist can have two shows whose [start_time, end_time)
+    # ranges overlap; enforced by GiST exclusion constraints (migration
+    # c4e1a9b7d2f5), so a booking check is one index probe
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.Index('ix_shows_updated_at', 'updated_at'),
+        db.CheckConstraint('duration_minutes > 0', name='ck_shows_duration_positive'),
+        ExcludeConstraint((db.func.int4range(venue_id, venue_id, '[]'), '='),
+                          (db.func.tsrange(start_time, end_time), '&&'),
+                          name='ex_shows_venue_overlap', using='gist'),
+        ExcludeConstraint((db.func.int4range(artist_id, artist_id, '[]'), '='),
+                          (db.func.tsrange(start_time, end_time), '&&'),
+                          name='ex_shows_artist_overlap', using='gist'),
+    )
+
+    # Shows go with their venue/artist through ON DELETE CASCADE (migration
+    # a9d1e3c5b7f2); passive_deletes keeps the ORM from loading them first
+    artist = db.relationship('Artist', backref=db.backref('shows', cascade='all, delete', passive_deletes=True))
+    venue = db.relationship('Venue', backref=db.backref('shows', cascade='all, delete', passive_deletes=True))
+
+
+class Job(db.Model):
+    # Durable background work (see jobs.py). A job is claimed with FOR UPDATE
+    # SKIP LOCKED, so any number of worker threads and processes can share
+    # the table. At most one queued or running job exists per non-null key.
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    args = db.Column(JSONB, nullable=False, server_default=db.text("'{}'::jsonb"))
+    key = db.Column(db.String(255))
+    state = db.Column(db.String(16), nullable=False, server_default='queued')
+    attempts = db.Column(db.Integer, nullable=False, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False, server_default='5')
+    run_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(120))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    finished_at = db.Column(db.DateTime)
 
-    artist = db.relationship('Artist', backref=db.backref('shows', cascade='all, delete'))
-    venue = db.relationship('Venue', backref=db.backref('shows', cascade='all, delete'))
\ No newline at end of file
+    __table_args__ = (
+        db.CheckConstraint("state IN ('queued', 'running', 'done', 'failed')", name='ck_jobs_state'),
+        db.Index('ix_jobs_queued_run_at_id', 'run_at', 'id', postgresql_where=db.text("state = 'queued'")),
+        db.Index('ux_jobs_pending_key', 'key', unique=True,
+                 postgresql_where=db.text("state IN ('queued', 'running')")),
+        db.Index('ix_jobs_key_finished_at', 'key', 'finished_at'),
+    )
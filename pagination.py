@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+# Keyset (cursor) pagination helpers.
+#
+# A cursor is the sort key of the last row on the current page, encoded as an
+# opaque url-safe token. The next page is fetched with a row-value comparison
+# on that key, so the database seeks straight to it through an index instead
+# of counting and discarding rows the way OFFSET does.
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(*values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, *types):
+    # Returns None for a missing or malformed cursor, which callers treat as
+    # "start from the first page"
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(types):
+            return None
+        return tuple(
+            datetime.fromisoformat(value) if kind is datetime else kind(value)
+            for value, kind in zip(values, types)
+        )
+    except (ValueError, TypeError):
+        return None
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def seek(query, columns, cursor, descending=False):
+    # Apply the keyset condition and ordering for `columns` to `query`
+    if cursor is not None:
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*cursor) if descending else key > tuple_(*cursor))
+    return query.order_by(*[column.desc() if descending else column for column in columns])
+
+
+def paginate(query, columns, cursor, size, descending=False):
+    # Fetch one extra row to learn whether another page exists without a COUNT
+    rows = seek(query, columns, cursor, descending).limit(size + 1).all()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(*[getattr(last, column.key) for column in columns])
+    return rows, next_cursor
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from models import db
+
+# Connection pool configuration and telemetry.
+#
+# PoolMonitor.init_app turns the DB_* settings from config.py into
+# SQLALCHEMY_ENGINE_OPTIONS (explicit engine options still win) and installs
+# TimedQueuePool, which records how long each checkout waited. stats()
+# reports those counters next to the pool's live occupancy for every engine,
+# per worker process.
+
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0)  # seconds; plus one overflow bucket
+
+
+class CheckoutStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if waited < bound:
+                    break
+            else:
+                index = len(WAIT_BUCKETS)
+            self.buckets[index] += 1
+
+    def as_dict(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            labels = [f'<{bound * 1000:g}ms' for bound in WAIT_BUCKETS] + [f'>={WAIT_BUCKETS[-1] * 1000:g}ms']
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_avg_ms': self.wait_total / attempts * 1000 if attempts else 0.0,
+                'wait_max_ms': self.wait_max * 1000,
+                'wait_histogram': dict(zip(labels, self.buckets)),
+            }
+
+
+class TimedQueuePool(QueuePool):
+    # Checkout time includes opening a new connection when the pool grows
+    # into its overflow, which is the latency a request actually sees
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = CheckoutStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            self.checkout_stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.checkout_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(config):
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+class PoolMonitor:
+
+    def init_app(self, app):
+        # Must run before db.init_app, which creates the engines
+        if not app.config.get('SQLALCHEMY_DATABASE_URI', '').startswith('postgresql'):
+            return
+        explicit = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        options = engine_options(app.config)
+        if 'connect_args' in options and 'connect_args' in explicit:
+            explicit = {**explicit, 'connect_args': {**options['connect_args'], **explicit['connect_args']}}
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, **explicit}
+
+    def stats(self):
+        engines = {}
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            entry = {'pool': type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                entry.update({
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'checked_in': pool.checkedin(),
+                    'overflow': max(0, pool.overflow()),
+                    'max_overflow': pool._max_overflow,
+                    'timeout': pool.timeout(),
+                })
+            if isinstance(pool, TimedQueuePool):
+                entry.update(pool.checkout_stats.as_dict())
+            engines[bind or 'default'] = entry
+        return {'pid': os.getpid(), 'engines': engines}
+
+
+pool_monitor = PoolMonitor()
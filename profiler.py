@@ -0,0 +1,127 @@
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL profiler and N+1 detector.
+#
+# Every statement executed during a request is counted, timed and reduced to
+# a "shape" (whitespace collapsed, bound parameters and IN-lists replaced by
+# ?). After the request:
+#
+#   - requests slower than SQL_PROFILER_SLOW_MS, or issuing more than
+#     SQL_PROFILER_MAX_STATEMENTS statements, are logged through app.logger
+#     (error.log outside debug mode) with the endpoint and the most repeated
+#     shapes
+#   - SQL_PROFILER_SERVER_TIMING adds a Server-Timing header (db, app)
+#
+# With SQL_PROFILER_RAISE (on by default when TESTING), a shape executed more
+# than SQL_PROFILER_REPEAT_LIMIT times in one request raises
+# RepeatedQueryError from the statement that crossed the limit.
+
+PARAM_RE = re.compile(r'%\([^)]+\)s|%s|\?|\$\d+')
+LIST_RE = re.compile(r'\?(\s*,\s*\?)+')
+SPACE_RE = re.compile(r'\s+')
+
+
+class RepeatedQueryError(Exception):
+    pass
+
+
+def statement_shape(statement):
+    shape = SPACE_RE.sub(' ', statement).strip()
+    shape = PARAM_RE.sub('?', shape)
+    return LIST_RE.sub('?, ...', shape)
+
+
+class RequestProfile:
+
+    def __init__(self, raise_after=None):
+        self.raise_after = raise_after
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.statements += 1
+        self.db_time += elapsed
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        return shape, self.shapes[shape]
+
+    def repeated(self, limit=3):
+        return [(shape, count) for shape, count in self.shapes.most_common(limit) if count > 1]
+
+
+class SQLProfiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 500
+        self.max_statements = 30
+        self.repeat_limit = 10
+        self.server_timing = False
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('SQL_PROFILER_ENABLED', True)
+        if not self.enabled:
+            return
+        self.slow_ms = config.get('SQL_PROFILER_SLOW_MS', self.slow_ms)
+        self.max_statements = config.get('SQL_PROFILER_MAX_STATEMENTS', self.max_statements)
+        self.repeat_limit = config.get('SQL_PROFILER_REPEAT_LIMIT', self.repeat_limit)
+        self.server_timing = config.get('SQL_PROFILER_SERVER_TIMING', self.server_timing)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start(self):
+        # Read per request so tests can flip TESTING after the app is built
+        raising = current_app.config.get('SQL_PROFILER_RAISE', current_app.testing)
+        g.sql_profile = RequestProfile(self.repeat_limit if raising else None)
+
+    def _finish(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        db_ms = profile.db_time * 1000
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing', f'db;dur={db_ms:.1f};desc="{profile.statements} queries", app;dur={total_ms:.1f}'
+            )
+        if total_ms >= self.slow_ms or profile.statements > self.max_statements:
+            repeated = '; '.join(f'{count}x {shape[:200]}' for shape, count in profile.repeated())
+            current_app.logger.warning(
+                'slow request %s %s %s: %d statements, %.1f ms in SQL, %.1f ms total%s',
+                request.endpoint, request.method, request.full_path.rstrip('?'),
+                profile.statements, db_ms, total_ms, f'; repeated: {repeated}' if repeated else '',
+            )
+        return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['profiler_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('profiler_started', None)
+    if started is None or not has_request_context():
+        return
+    profile = g.get('sql_profile')
+    if profile is None:
+        return
+    shape, count = profile.record(statement, time.perf_counter() - started)
+    if profile.raise_after is not None and count > profile.raise_after:
+        raise RepeatedQueryError(
+            f'{request.endpoint}: statement executed {count} times in one request: {shape[:500]}'
+        )
+
+
+sql_profiler = SQLProfiler()
@@ -0,0 +1,153 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Read-replica routing.
+#
+# Replica URIs (SQLALCHEMY_REPLICA_URIS) become extra Flask-SQLAlchemy binds,
+# so they share the primary's engine options and pool telemetry. Views
+# decorated with @read_replica send their SELECTs to a healthy replica;
+# everything else (writes, flushes, raw connections, CLI commands) uses the
+# primary.
+#
+# Read-your-writes: a request that commits pins the client to the primary
+# for REPLICA_STICKY_SECONDS through a timestamp in the signed session
+# cookie. A replica that fails its health check or drops a connection is
+# skipped for REPLICA_RETRY_SECONDS, and when none is left reads fall back
+# to the primary.
+
+STICKY_KEY = '_primary_until'
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.keys = []
+        self.sticky_seconds = 5
+        self.retry_seconds = 30
+        self.health_interval = 5
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._down_until = {}   # bind key -> monotonic time
+        self._checked_at = {}   # bind key -> monotonic time
+        self._engine_keys = {}  # replica engine -> bind key
+
+    def init_app(self, app):
+        # Must run before db.init_app, which creates the engines
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        self.keys = []
+        for index, uri in enumerate(uris):
+            key = f'replica_{index}'
+            binds[key] = uri
+            self.keys.append(key)
+        app.config['SQLALCHEMY_BINDS'] = binds
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', self.retry_seconds)
+        self.health_interval = app.config.get('REPLICA_HEALTH_INTERVAL', self.health_interval)
+        app.after_request(self._remember_write)
+        if self.keys and not event.contains(Engine, 'handle_error', self._on_error):
+            event.listen(Engine, 'handle_error', self._on_error)
+
+    def reading(self):
+        return bool(self.keys) and has_request_context() and g.get('read_replica', False)
+
+    def pinned(self):
+        return session.get(STICKY_KEY, 0) > time.time()
+
+    def replica(self, engines):
+        key = self.replica_key(engines)
+        return None if key is None else engines[key]
+
+    def replica_key(self, engines):
+        # Round-robin over replicas that are up; None means use the primary
+        now = time.monotonic()
+        candidates = [key for key in self.keys if self._down_until.get(key, 0) <= now]
+        for _ in range(len(candidates)):
+            key = candidates[next(self._counter) % len(candidates)]
+            self._engine_keys[engines[key]] = key
+            if self._healthy(key, engines[key], now):
+                return key
+        return None
+
+    def track(self, engine, key):
+        # Another engine on a replica's bind (asgi.py's async engines): its
+        # dropped connections mark the replica down too
+        self._engine_keys[engine] = key
+
+    def _healthy(self, key, engine, now):
+        with self._lock:
+            if now - self._checked_at.get(key, float('-inf')) < self.health_interval:
+                return True
+            self._checked_at[key] = now
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+        except Exception:
+            self.mark_down(key)
+            return False
+        return True
+
+    def mark_down(self, key):
+        with self._lock:
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+            self._checked_at.pop(key, None)
+
+    def _on_error(self, context):
+        key = self._engine_keys.get(context.engine)
+        if key is not None and (context.is_disconnect or context.connection is None):
+            self.mark_down(key)
+
+    def _remember_write(self, response):
+        if g.get('db_committed'):
+            session[STICKY_KEY] = time.time() + self.sticky_seconds
+        return response
+
+    @contextmanager
+    def primary(self):
+        # Force primary reads inside a replica-routed view
+        previous = g.get('read_replica', False)
+        g.read_replica = False
+        try:
+            yield
+        finally:
+            g.read_replica = previous
+
+    def status(self):
+        now = time.monotonic()
+        return {key: 'down' if self._down_until.get(key, 0) > now else 'up' for key in self.keys}
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False) and router.reading():
+            engine = router.replica(self._db.engines)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_commit(session):
+    if has_request_context():
+        g.db_committed = True
+
+
+def read_replica(view):
+    # Route this view's reads to a replica unless the client just wrote
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = not router.pinned()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+router = ReplicaRouter()
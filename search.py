@@ -0,0 +1,256 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import case, func, or_
+
+from models import db, Venue, Artist
+
+# Search engine behind /venues/search and /artists/search.
+#
+# Two interchangeable backends implement the same small interface:
+#
+#   search(model, term, limit) -> list of rows with .id and .name, best first
+#   index(obj) / remove(model, id) -> keep the backend in step with writes
+#
+# PostgresSearchBackend ranks with the weighted `search_vector` tsvector
+# column and, for terms of TRIGRAM_MIN_LENGTH characters or more, falls
+# back to the trigram index on the name for infix matches (ILIKE) and
+# misspellings (pg_trgm similarity). MemorySearchBackend is a
+# pure-Python inverted index used where those Postgres features are
+# unavailable (SQLite, tests); a search word that prefixes nothing matches
+# indexed words within TYPO_DISTANCE edits instead, at TYPO_WEIGHT.
+
+SearchResult = namedtuple('SearchResult', ['id', 'name'])
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Field weights, highest first; these mirror the A/B/C weights that
+# fyyur_search_document() assigns in the database
+WEIGHTS = {'name': 1.0, 'location': 0.4, 'genres': 0.2}
+
+# Words shorter than 4 characters must match exactly (as a prefix); longer
+# ones allow one edit, 8 and longer two. A transposition counts as one.
+TYPO_WEIGHT = 0.5
+
+# A term shorter than a trigram cannot use the trigram index: ILIKE
+# '%ab%' would scan every name, so such terms only match word prefixes
+TRIGRAM_MIN_LENGTH = 3
+
+
+def typo_distance(word):
+    return 0 if len(word) < 4 else 1 if len(word) < 8 else 2
+
+
+def edit_distance(left, right, limit):
+    # Optimal string alignment distance, or limit + 1 once it exceeds limit
+    if abs(len(left) - len(right)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(right) + 1))
+    for i in range(1, len(left) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(right)
+        for j in range(1, len(right) + 1):
+            cost = left[i - 1] != right[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and left[i - 1] == right[j - 2] and left[i - 2] == right[j - 1]):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearchBackend:
+
+    def search(self, model, term, limit):
+        tokens = tokenize(term)
+        query = db.session.query(model.id, model.name)
+        if not tokens:
+            return query.order_by(model.name, model.id).limit(limit).all()
+
+        # Every token must match as a prefix of a word
+        tsquery = func.to_tsquery('simple', ' & '.join(token + ':*' for token in tokens))
+        pattern = escape_like(term.strip())
+        rank = func.ts_rank(model.search_vector, tsquery) + case(
+            (model.name.ilike(pattern + '%', escape='\\'), 1.0), else_=0.0
+        ) + func.similarity(model.name, term.strip()) * TYPO_WEIGHT
+        matches = [model.search_vector.op('@@')(tsquery)]
+        if len(term.strip()) >= TRIGRAM_MIN_LENGTH:
+            matches += [
+                model.name.ilike('%' + pattern + '%', escape='\\'),
+                # pg_trgm similarity above pg_trgm.similarity_threshold,
+                # served by the same gin_trgm_ops index
+                model.name.op('%')(term.strip()),
+            ]
+        return query.filter(or_(*matches)).order_by(rank.desc(), model.name, model.id).limit(limit).all()
+
+    def index(self, obj):
+        # search_vector is a generated column, the database keeps it current
+        pass
+
+    def remove(self, model, id):
+        pass
+
+
+class MemorySearchBackend:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def _fields(self, obj):
+        return {
+            'name': tokenize(obj.name),
+            'location': tokenize(obj.city) + tokenize(obj.state),
+            'genres': [token for genre in (obj.genres or []) for token in tokenize(genre)],
+        }
+
+    def _index_for(self, model):
+        index = self._indexes.get(model)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(model)
+                if index is None:
+                    index = _InvertedIndex()
+                    rows = db.session.query(
+                        model.id, model.name, model.city, model.state, model.genres
+                    ).yield_per(1000)
+                    for row in rows:
+                        index.add(row.id, row.name, self._fields(row), sort_vocabulary=False)
+                    index.vocabulary = sorted(index.postings)
+                    self._indexes[model] = index
+        return index
+
+    def search(self, model, term, limit):
+        return self._index_for(model).search(tokenize(term), limit)
+
+    def index(self, obj):
+        model = type(obj)
+        if model in self._indexes:
+            with self._lock:
+                self._indexes[model].add(obj.id, obj.name, self._fields(obj))
+
+    def remove(self, model, id):
+        if model in self._indexes:
+            with self._lock:
+                self._indexes[model].discard(id)
+
+
+class _InvertedIndex:
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # token -> {id: weight}
+        self.names = {}                    # id -> name
+        self.documents = {}                # id -> tokens, for removal
+        self.vocabulary = []               # sorted tokens, for prefix lookups
+
+    def add(self, id, name, fields, sort_vocabulary=True):
+        self.discard(id)
+        tokens = set()
+        for field, field_tokens in fields.items():
+            for token in field_tokens:
+                postings = self.postings[token]
+                postings[id] = postings.get(id, 0.0) + WEIGHTS[field]
+                tokens.add(token)
+        for token in tokens if sort_vocabulary else ():
+            position = bisect_left(self.vocabulary, token)
+            if position == len(self.vocabulary) or self.vocabulary[position] != token:
+                self.vocabulary.insert(position, token)
+        self.names[id] = name
+        self.documents[id] = tokens
+
+    def discard(self, id):
+        for token in self.documents.pop(id, ()):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(id, None)
+                if not postings:
+                    del self.postings[token]
+                    position = bisect_left(self.vocabulary, token)
+                    del self.vocabulary[position]
+        self.names.pop(id, None)
+
+    def _prefix_scores(self, prefix):
+        scores = defaultdict(float)
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            for id, weight in self.postings[self.vocabulary[position]].items():
+                scores[id] = max(scores[id], weight)
+            position += 1
+        return scores
+
+    def _typo_scores(self, word):
+        # Indexed words within typo_distance(word) edits of a search word
+        # that prefixes nothing; a linear pass, taken only on such misses
+        limit = typo_distance(word)
+        scores = defaultdict(float)
+        if not limit:
+            return scores
+        for token in self.vocabulary:
+            if edit_distance(word, token, limit) <= limit:
+                for id, weight in self.postings[token].items():
+                    scores[id] = max(scores[id], weight * TYPO_WEIGHT)
+        return scores
+
+    def search(self, tokens, limit):
+        if not tokens:
+            ids = sorted(self.names, key=lambda id: (self.names[id], id))[:limit]
+            return [SearchResult(id, self.names[id]) for id in ids]
+
+        scores = None
+        for token in tokens:
+            token_scores = self._prefix_scores(token) or self._typo_scores(token)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {id: score + token_scores[id] for id, score in scores.items() if id in token_scores}
+            if not scores:
+                return []
+        ranked = sorted(scores, key=lambda id: (-scores[id], self.names[id], id))[:limit]
+        return [SearchResult(id, self.names[id]) for id in ranked]
+
+
+BACKENDS = {
+    'postgres': PostgresSearchBackend,
+    'memory': MemorySearchBackend,
+}
+
+
+class SearchEngine:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.limit = 100
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('SEARCH_BACKEND')
+        if name is None:
+            uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+            name = 'postgres' if uri.startswith('postgres') else 'memory'
+        self.backend = BACKENDS[name]()
+        self.limit = app.config.get('SEARCH_RESULT_LIMIT', self.limit)
+
+    def search_venues(self, term):
+        return self.backend.search(Venue, term, self.limit)
+
+    def search_artists(self, term):
+        return self.backend.search(Artist, term, self.limit)
+
+    def index(self, obj):
+        self.backend.index(obj)
+
+    def remove(self, model, id):
+        self.backend.remove(model, id)
+
+
+search_engine = SearchEngine()
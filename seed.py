@@ -0,0 +1,220 @@
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+
+from cache import page_cache
+from importer import insert_copy
+from models import db, Venue, Artist, Show
+
+# `flask seed`: fill venues, artists and shows with synthetic data.
+#
+# Everything is drawn from one random.Random(seed), so a given seed and scale
+# always produce the same rows (show times are relative to today). The shape
+# is skewed like real listings: cities and genres follow Zipf-like
+# popularity, a few venues host most of the shows and a few artists play most
+# of them. Shows last two hours and start in one of the evening SLOT_HOURS.
+# Each venue's shows take distinct slots and an artist is never given a slot
+# it already plays elsewhere, so nothing trips the overlap constraints. Rows
+# are loaded with COPY, BATCH_SIZE at a time.
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('San Francisco', 'CA'),
+    ('Austin', 'TX'), ('Nashville', 'TN'), ('Seattle', 'WA'), ('New Orleans', 'LA'),
+    ('Atlanta', 'GA'), ('Boston', 'MA'), ('Denver', 'CO'), ('Portland', 'OR'),
+    ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Miami', 'FL'),
+    ('Houston', 'TX'), ('Phoenix', 'AZ'), ('Las Vegas', 'NV'), ('Memphis', 'TN'),
+]
+# Rough popularity order; Genre.choices() order is alphabetical
+GENRES = ['Rock', 'Pop', 'HipHop', 'Jazz', 'Electronic', 'Country', 'RB', 'Alternative', 'Folk',
+          'Blues', 'Punk', 'Soul', 'Classical', 'HeavyMetal', 'Reggae', 'Funk', 'Instrumental',
+          'MusicalTheatre', 'Swing', 'Other']
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Crimson', 'Lucky',
+              'Wild', 'Hidden', 'Neon', 'Rusty', 'Broken', 'Painted', 'Empty', 'Little']
+VENUE_NOUNS = ['Room', 'Hall', 'Lounge', 'Tavern', 'Ballroom', 'Garage', 'Cellar', 'Theatre', 'Club', 'Barn']
+ARTIST_NOUNS = ['Owls', 'Engines', 'Sisters', 'Brothers', 'Tides', 'Ghosts', 'Wolves', 'Machines',
+                'Kids', 'Saints', 'Echoes', 'Riders']
+STREETS = ['Main St', 'Oak Ave', 'Market St', 'Broadway', 'Elm St', '2nd Ave', 'Pine St', 'Sunset Blvd']
+
+BATCH_SIZE = 50000
+SLOT_HOURS = (19, 21, 23)  # two hours apart, matching DEFAULT_SHOW_MINUTES
+WEIGHTED_ATTEMPTS = 8
+
+
+def zipf_weights(count, exponent=1.0):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+class Generator:
+
+    def __init__(self, seed, venues, artists, shows, past_days=730, future_days=365):
+        self.rng = random.Random(seed)
+        self.counts = {'venues': venues, 'artists': artists, 'shows': shows}
+        self.city_weights = cumulative(zipf_weights(len(CITIES), 1.1))
+        self.genre_weights = cumulative(zipf_weights(len(GENRES), 0.9))
+        self.start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=past_days)
+        self.days = past_days + future_days
+        self.slots = self.days * len(SLOT_HOURS)
+
+    def city(self):
+        return self.rng.choices(CITIES, cum_weights=self.city_weights)[0]
+
+    def genres(self):
+        picked = self.rng.choices(GENRES, cum_weights=self.genre_weights, k=self.rng.choice((1, 1, 2, 2, 3)))
+        return list(dict.fromkeys(picked))
+
+    def phone(self):
+        return f'{self.rng.randint(200, 999)}-{self.rng.randint(200, 999)}-{self.rng.randint(0, 9999):04d}'
+
+    def slug(self, name):
+        return name.lower().replace(' ', '')
+
+    def venue(self, number):
+        city, state = self.city()
+        name = f'The {self.rng.choice(ADJECTIVES)} {self.rng.choice(VENUE_NOUNS)} {number}'
+        seeking = self.rng.random() < 0.3
+        return {
+            'name': name, 'city': city, 'state': state,
+            'address': f'{self.rng.randint(1, 9999)} {self.rng.choice(STREETS)}',
+            'phone': self.phone(), 'genres': self.genres(),
+            'image_link': f'https://images.example.com/venues/{number}.jpg',
+            'facebook_link': f'https://www.facebook.com/{self.slug(name)}',
+            'website': f'https://{self.slug(name)}.example.com',
+            'seeking_talent': seeking,
+            'seeking_description': 'Looking for local acts on weeknights.' if seeking else None,
+        }
+
+    def artist(self, number):
+        city, state = self.city()
+        name = f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(ARTIST_NOUNS)} {number}'
+        seeking = self.rng.random() < 0.4
+        return {
+            'name': name, 'city': city, 'state': state,
+            'phone': self.phone(), 'genres': self.genres(),
+            'image_link': f'https://images.example.com/artists/{number}.jpg',
+            'facebook_link': f'https://www.facebook.com/{self.slug(name)}',
+            'website': f'https://{self.slug(name)}.example.com' if self.rng.random() < 0.7 else None,
+            'seeking_venue': seeking,
+            'seeking_description': 'Touring and looking for venues.' if seeking else None,
+        }
+
+    def show_counts(self, venue_ids):
+        # Zipf-distributed shows per venue, capped by the venue's free slots
+        slots = self.slots
+        weights = zipf_weights(len(venue_ids), 0.8)
+        order = list(venue_ids)
+        self.rng.shuffle(order)
+        scale = self.counts['shows'] / sum(weights)
+        counts = {venue_id: min(slots, round(weight * scale)) for venue_id, weight in zip(order, weights)}
+        # Hand any shortfall from rounding and capping to venues with room
+        shortfall = self.counts['shows'] - sum(counts.values())
+        for venue_id in itertools.cycle(order):
+            if shortfall <= 0:
+                break
+            if counts[venue_id] < slots:
+                counts[venue_id] += 1
+                shortfall -= 1
+        return counts
+
+    def free_artist(self, slot, artist_weights, booked):
+        # Popular artists first; once they are busy, any artist free at slot
+        artists = len(artist_weights)
+        for index in self.rng.choices(range(artists), cum_weights=artist_weights, k=WEIGHTED_ATTEMPTS):
+            if not booked[index * self.slots + slot]:
+                return index
+        start = self.rng.randrange(artists)
+        for offset in range(artists):
+            index = (start + offset) % artists
+            if not booked[index * self.slots + slot]:
+                return index
+        return None
+
+    def shows(self, venue_ids, artist_ids):
+        artist_weights = cumulative(zipf_weights(len(artist_ids), 0.7))
+        booked = bytearray(len(artist_ids) * self.slots)  # one byte per (artist, slot)
+        for venue_id, count in self.show_counts(venue_ids).items():
+            if not count:
+                continue
+            for slot in self.rng.sample(range(self.slots), count):
+                index = self.free_artist(slot, artist_weights, booked)
+                if index is None:
+                    continue  # every artist already plays this slot
+                booked[index * self.slots + slot] = 1
+                day, hour = divmod(slot, len(SLOT_HOURS))
+                yield {
+                    'artist_id': artist_ids[index],
+                    'venue_id': venue_id,
+                    'start_time': self.start + timedelta(days=day, hours=SLOT_HOURS[hour]),
+                }
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load(model, rows, batch_size, echo):
+    started = time.perf_counter()
+    loaded = 0
+    for batch in batches(rows, batch_size):
+        insert_copy(model, batch)
+        db.session.commit()
+        loaded += len(batch)
+        echo(f'  {model.__tablename__}: {loaded} rows ({loaded / (time.perf_counter() - started):.0f} rows/s)')
+    return loaded
+
+
+@click.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=5000, show_default=True)
+@click.option('--shows', default=100000, show_default=True)
+@click.option('--seed', 'seed_value', default=42, show_default=True, help='Random seed.')
+@click.option('--truncate', is_flag=True, help='Empty venues, artists, shows and locations first.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows per COPY and commit.')
+@with_appcontext
+def seed_command(venues, artists, shows, seed_value, truncate, batch_size):
+    """Fill the database with synthetic venues, artists and shows."""
+    if truncate:
+        db.session.execute(text('TRUNCATE shows, artists, venues, locations RESTART IDENTITY CASCADE'))
+        db.session.commit()
+    generator = Generator(seed_value, venues, artists, shows)
+    capacity = min(venues, artists) * generator.slots
+    if shows > capacity:
+        raise click.UsageError(f'{venues} venues and {artists} artists have only {capacity} show slots.')
+    started = time.perf_counter()
+
+    first_venue = (db.session.query(db.func.max(Venue.id)).scalar() or 0) + 1
+    load(Venue, (generator.venue(number) for number in range(first_venue, first_venue + venues)),
+         batch_size, click.echo)
+    first_artist = (db.session.query(db.func.max(Artist.id)).scalar() or 0) + 1
+    load(Artist, (generator.artist(number) for number in range(first_artist, first_artist + artists)),
+         batch_size, click.echo)
+
+    # Only the new venues and artists get shows, so existing bookings are never overlapped
+    venue_ids = [id for id, in db.session.query(Venue.id).filter(Venue.id >= first_venue).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).filter(Artist.id >= first_artist).order_by(Artist.id)]
+    # Fewer shows than asked for when every artist already plays a slot
+    inserted = 0
+    if shows and venue_ids and artist_ids:
+        inserted = load(Show, generator.shows(venue_ids, artist_ids), batch_size, click.echo)
+
+    db.session.execute(text('ANALYZE locations, venues, artists, shows'))
+    db.session.commit()
+    page_cache.clear()
+    short = f' (of {shows} requested)' if inserted < shows else ''
+    click.echo(f'Seeded {venues} venues, {artists} artists and {inserted} shows{short} '
+               f'in {time.perf_counter() - started:.1f}s (seed {seed_value}).')
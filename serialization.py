@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+# Compact JSON encoding for API responses and bulk streams with orjson
+# (requirements.txt). Where it is not installed the stdlib fallback
+# produces the same output for the types we emit.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj)
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default)
+
+    def dumps(obj):
+        return _encoder.encode(obj).encode('utf-8')
+
+
+def iter_ndjson(rows):
+    # One JSON document per line, for application/x-ndjson streams
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+
+def _csv_value(value):
+    # Lists are joined with ';' so exported files re-import with `flask import`
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def iter_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+
+
+def chunked(lines, size=64 * 1024):
+    # Coalesce small lines into ~size byte chunks before writing/sending
+    parts, length = [], 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,94 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py reads the environment when it is imported, so this runs first.
+# Tests that need Postgres use FYYUR_TEST_DATABASE_URL (a database they may
+# empty) and are skipped without it; the rest build their own small apps.
+TEST_DATABASE_URL = os.environ.get('FYYUR_TEST_DATABASE_URL')
+os.environ['FYYUR_ENV'] = 'testing'
+os.environ['CACHE_ENABLED'] = 'false'
+os.environ['JOB_RUNNER'] = 'external'
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('FYYUR_TEST_DATABASE_URL is not set')
+    import flask_migrate
+    from app import app
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(app.root_path, 'migrations'))
+    # migrations/env.py runs logging.config.fileConfig, which disables
+    # every logger that already exists
+    app.logger.disabled = False
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from sqlalchemy import text
+    from models import db
+
+    with app.app_context():
+        db.session.execute(text('TRUNCATE shows, venues, artists, locations, jobs RESTART IDENTITY CASCADE'))
+        db.session.commit()
+    return app.test_client()
+
+
+@pytest.fixture
+def catalog(app, client):
+    # Three cities, each venue with past and upcoming shows by several artists
+    from models import db, Venue, Artist, Show
+
+    with app.app_context():
+        places = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX')]
+        venues = [Venue(name=f'Venue {i}', city=places[i % 3][0], state=places[i % 3][1],
+                        address=f'{i} Main St', genres=['Jazz', 'Rock'], seeking_talent=bool(i % 2))
+                  for i in range(6)]
+        artists = [Artist(name=f'Artist {i}', city=places[i % 3][0], state=places[i % 3][1],
+                          genres=['Jazz'], seeking_venue=bool(i % 2))
+                   for i in range(5)]
+        db.session.add_all(venues + artists)
+        db.session.flush()
+        start = datetime.now().replace(minute=0, second=0, microsecond=0)
+        for i in range(30):
+            db.session.add(Show(venue_id=venues[i % 6].id, artist_id=artists[i % 5].id,
+                                start_time=start + timedelta(days=(i - 15) * 2, hours=i % 5)))
+        db.session.commit()
+        return {'venues': [venue.id for venue in venues], 'artists': [artist.id for artist in artists]}
+
+
+def use_cache(backend):
+    from cache import page_cache
+
+    saved = page_cache.backend, page_cache.enabled
+    page_cache.backend, page_cache.enabled = backend, True
+    return saved
+
+
+@pytest.fixture
+def cache(app):
+    # Per-process memory cache on, as in production; the suite runs with it off
+    from cache import MemoryCache, page_cache
+
+    saved = use_cache(MemoryCache())
+    yield page_cache
+    page_cache.backend, page_cache.enabled = saved
+
+
+@pytest.fixture
+def shared_cache(app):
+    from cache import LocalStoreClient, SharedStoreCache, page_cache
+
+    saved = use_cache(SharedStoreCache(LocalStoreClient()))
+    yield page_cache
+    page_cache.backend, page_cache.enabled = saved
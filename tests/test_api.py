@@ -0,0 +1,78 @@
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from models import db
+
+
+@contextmanager
+def statements(app):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_fields_select_only_those_columns(app, client, catalog):
+    with statements(app) as seen:
+        response = client.get('/api/v1/venues?fields=name,city&limit=100')
+    assert response.status_code == 200
+    rows = response.get_json()['data']
+    assert len(rows) == 6
+    assert all(set(row) == {'name', 'city'} for row in rows)
+    # The sort key is selected for the cursor but not returned
+    listing = next(statement for statement in seen if 'FROM venues' in statement)
+    assert 'venues.phone' not in listing and 'venues.id' in listing
+
+    response = client.get('/api/v1/venues?fields=name,nickname')
+    assert response.status_code == 400
+    assert 'nickname' in response.get_json()['error']
+
+
+def test_show_fields_join_only_what_they_need(app, client, catalog):
+    with statements(app) as seen:
+        rows = client.get('/api/v1/shows?fields=id,venue_name&limit=5').get_json()['data']
+    assert set(rows[0]) == {'id', 'venue_name'}
+    listing = next(statement for statement in seen if 'FROM shows' in statement)
+    assert 'JOIN venues' in listing and 'JOIN artists' not in listing
+
+
+def test_cursor_pages_cover_every_row(app, client, catalog):
+    ids, url = [], '/api/v1/shows?fields=id&limit=7'
+    while url:
+        payload = client.get(url).get_json()
+        ids += [row['id'] for row in payload['data']]
+        url = payload['next'] and f"/api/v1/shows?fields=id&limit=7&after={payload['next']}"
+    with app.app_context():
+        assert ids == db.session.execute(text('SELECT id FROM shows ORDER BY start_time, id')).scalars().all()
+
+
+def test_ndjson_streams_every_matching_row(app, client, catalog):
+    response = client.get('/api/v1/shows?fields=id,start_time', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 30
+    rows = [json.loads(line) for line in lines]
+    assert all(set(row) == {'id', 'start_time'} for row in rows)
+    assert [row['start_time'] for row in rows] == sorted(row['start_time'] for row in rows)
+
+    # ?format=ndjson, with the filters of a page request
+    venue_id = catalog['venues'][0]
+    response = client.get(f'/api/v1/shows?format=ndjson&fields=venue_id&venue_id={venue_id}')
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == [{'venue_id': venue_id}] * 5
+
+
+def test_detail_fields_and_missing_rows(client, catalog):
+    artist_id = catalog['artists'][0]
+    assert client.get(f'/api/v1/artists/{artist_id}?fields=name').get_json() == {'data': {'name': 'Artist 0'}}
+    assert client.get('/api/v1/artists/999999').status_code == 404
+    assert client.get('/api/v1/tickets').status_code == 404
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+pytest.importorskip('asyncpg')
+
+
+def fetch(app, *requests):
+    # (path, headers) pairs against a fresh AsyncReadApp; its engine is bound
+    # to the event loop it was created on
+    from asgi import AsyncReadApp
+
+    async def run():
+        application = AsyncReadApp(app)
+        transport = httpx.ASGITransport(app=application)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return [await client.get(path, headers=headers) for path, headers in requests]
+        finally:
+            await application.dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_detail_matches_the_sync_view(app, client, catalog):
+    venue_id, artist_id = catalog['venues'][0], catalog['artists'][0]
+    for path in (f'/venues/{venue_id}', f'/artists/{artist_id}'):
+        sync = client.get(path)
+        first, second = fetch(app, (path, {}), (path, {'If-None-Match': sync.headers['ETag']}))
+        assert first.status_code == 200
+        assert first.text == sync.text
+        assert first.headers['ETag'] == sync.headers['ETag']
+        assert second.status_code == 304
+
+
+def test_async_detail_unknown_id(app, client, catalog):
+    response, = fetch(app, ('/venues/999999', {}))
+    assert response.status_code == 404
+
+
+def test_async_validators_follow_replica_routing(app, client, catalog, monkeypatch):
+    # The test database stands in for a replica: which engine ran each
+    # statement is what counts
+    import time
+    from sqlalchemy import event
+    from asgi import AsyncReadApp
+    from routing import STICKY_KEY, router
+
+    monkeypatch.setattr(router, 'keys', ['replica_0'])
+    monkeypatch.setattr(router, 'replica_key', lambda engines: 'replica_0')
+    monkeypatch.setitem(app.config['SQLALCHEMY_BINDS'], 'replica_0', app.config['SQLALCHEMY_DATABASE_URI'])
+    browser = app.test_client()
+    with browser.session_transaction() as session:
+        session[STICKY_KEY] = time.time() + 60
+    pinned = {'Cookie': f"session={browser.get_cookie('session').value}"}
+    path = f"/venues/{catalog['venues'][0]}"
+
+    async def run():
+        application = AsyncReadApp(app)
+        used = []
+        for name, engine in (('primary', application.get_engine()), ('replica', application.get_engine('replica_0'))):
+            event.listen(engine.sync_engine, 'before_cursor_execute',
+                         lambda *args, name=name: used.append(name))
+        transport = httpx.ASGITransport(app=application)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as http:
+                await http.get(path)
+                fresh, used[:] = list(used), []
+                await http.get(path, headers=pinned)
+                return fresh, used
+        finally:
+            await application.dispose()
+
+    fresh, after_write = asyncio.run(run())
+    # Validators from the replica, the page (a cache fill) from the primary;
+    # a client that just wrote reads everything from the primary
+    assert fresh == ['replica', 'primary', 'primary', 'primary']
+    assert after_write == ['primary'] * 4
@@ -0,0 +1,139 @@
+import gzip
+import json
+
+import pytest
+
+from assets import assets, build, brotli, hashed_name, rewrite_reference, MANIFEST
+
+CSS = b'''body { background: url("../img/bg.png"); }
+@font-face { src: url(../fonts/icons.woff?v=2#iefix); }
+.remote { background: url(https://example.com/x.png); }
+.inline { background: url(data:image/gif;base64,R0lGOD); }
+''' + b'/* padding so the stylesheet compresses */\n' * 20
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+
+def write(directory, path, content):
+    target = directory / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(content)
+
+
+@pytest.fixture
+def static(tmp_path):
+    source = tmp_path / 'static'
+    write(source, 'css/main.css', CSS)
+    write(source, 'img/bg.png', PNG)
+    write(source, 'fonts/icons.woff', b'wOFF' + bytes(64))
+    write(source, 'js/app.js', b'console.log(1);\n//# sourceMappingURL=app.js.map\n')
+    write(source, 'js/app.js.map', b'{"version": 3}')
+    write(source, '.hidden', b'skipped')
+    return source
+
+
+def test_hashed_names_follow_content():
+    assert hashed_name('css/main.css', b'a') != hashed_name('css/main.css', b'b')
+    assert hashed_name('css/main.css', b'a').startswith('css/main.')
+    assert hashed_name('css/main.css', b'a').endswith('.css')
+
+
+def test_rewrite_reference():
+    hashed = {'img/bg.png': 'img/bg.0123456789ab.png'}
+    assert rewrite_reference('css/main.css', '../img/bg.png', hashed) == '../img/bg.0123456789ab.png'
+    assert rewrite_reference('css/main.css', '../img/bg.png?v=1#x', hashed) == '../img/bg.0123456789ab.png?v=1#x'
+    # Unknown, absolute and inline references are left alone
+    assert rewrite_reference('css/main.css', '../img/other.png', hashed) == '../img/other.png'
+    assert rewrite_reference('css/main.css', '/static/img/bg.png', hashed) == '/static/img/bg.png'
+    assert rewrite_reference('css/main.css', 'data:image/gif;base64,R0', hashed) == 'data:image/gif;base64,R0'
+
+
+def test_build_fingerprints_and_compresses(static, tmp_path):
+    output = tmp_path / 'build'
+    manifest = build(str(static), str(output))
+    assert set(manifest) == {'css/main.css', 'img/bg.png', 'fonts/icons.woff', 'js/app.js', 'js/app.js.map'}
+    assert json.loads((output / MANIFEST).read_bytes()) == manifest
+
+    png, woff = manifest['img/bg.png']['path'], manifest['fonts/icons.woff']['path']
+    css = (output / manifest['css/main.css']['path']).read_bytes()
+    assert f'url("../{png}")'.encode() in css
+    assert f'url(../{woff}?v=2#iefix)'.encode() in css
+    assert b'url(https://example.com/x.png)' in css and b'url(data:image/gif;base64,R0lGOD)' in css
+    js = (output / manifest['js/app.js']['path']).read_bytes()
+    assert f'sourceMappingURL={manifest["js/app.js.map"]["path"].split("/")[-1]}'.encode() in js
+
+    # The stylesheet's hash covers the rewritten content
+    assert manifest['css/main.css']['path'] == hashed_name('css/main.css', css)
+
+    # Text gets a smaller gzip variant; images and fonts are left as they are
+    entry = manifest['css/main.css']
+    assert 'gzip' in entry['encodings'] and ('br' in entry['encodings']) == (brotli is not None)
+    assert gzip.decompress((output / (entry['path'] + '.gz')).read_bytes()) == css
+    assert manifest['img/bg.png']['encodings'] == {} and manifest['fonts/icons.woff']['encodings'] == {}
+    assert not (output / (png + '.gz')).exists()
+
+
+def test_rebuilding_keeps_earlier_files(static, tmp_path):
+    output = tmp_path / 'build'
+    before = build(str(static), str(output))['css/main.css']['path']
+    write(static, 'css/main.css', CSS + b'.new {}\n')
+    after = build(str(static), str(output))['css/main.css']['path']
+    assert before != after
+    assert (output / before).exists() and (output / after).exists()
+
+
+@pytest.fixture
+def built(app, static, tmp_path, monkeypatch):
+    output = tmp_path / 'build'
+    manifest = build(str(static), str(output))
+    for name, value in (('directory', str(output)), ('enabled', True), ('manifest', {}),
+                        ('encodings', {}), ('version', '')):
+        monkeypatch.setattr(assets, name, value)
+    assets.load()
+    return manifest
+
+
+def test_serves_the_precompressed_variant_when_accepted(app, built):
+    entry = built['css/main.css']
+    with app.test_request_context():
+        url = assets.url('css/main.css')
+    assert url == f'/assets/{entry["path"]}'
+    assert assets.version
+
+    client = app.test_client()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+    with open(f'{assets.directory}/{entry["path"]}', 'rb') as handle:
+        plain = handle.read()
+    assert gzip.decompress(response.get_data()) == plain
+
+    # Without a usable encoding the plain file is sent
+    for accept in (None, 'identity', 'deflate'):
+        response = client.get(url, headers={'Accept-Encoding': accept} if accept else {})
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == plain
+
+
+def test_incompressible_assets_and_unknown_paths(app, built):
+    client = app.test_client()
+    response = client.get(f'/assets/{built["img/bg.png"]["path"]}', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == PNG
+    # Only the hashed paths listed in the manifest are served
+    assert client.get('/assets/img/bg.png').status_code == 404
+    assert client.get('/assets/manifest.json').status_code == 404
+
+
+def test_falls_back_to_static_without_a_manifest(app, tmp_path, monkeypatch):
+    for name, value in (('directory', str(tmp_path / 'missing')), ('enabled', True), ('manifest', {}),
+                        ('encodings', {}), ('version', '')):
+        monkeypatch.setattr(assets, name, value)
+    assets.load()
+    assert (assets.manifest, assets.version) == ({}, '')
+    with app.test_request_context():
+        assert assets.url('css/main.css') == '/static/css/main.css'
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+
+from cache import page_cache
+from models import db
+
+
+def write_elsewhere(app, statement, **params):
+    # A write this process never invalidates, like one made through another
+    # worker's memory cache
+    with app.app_context():
+        db.session.execute(text(statement), params)
+        db.session.commit()
+
+
+def test_cached_page_follows_its_validators(app, client, catalog, cache):
+    venue_id = catalog['venues'][0]
+    stale = page_cache.stale
+    first = client.get(f'/venues/{venue_id}')
+    assert client.get(f'/venues/{venue_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    write_elsewhere(app, "UPDATE venues SET name = 'Renamed Hall', updated_at = timezone('utc', now()) "
+                         "WHERE id = :id", id=venue_id)
+    second = client.get(f'/venues/{venue_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert b'Renamed Hall' in second.data
+    assert page_cache.stale == stale + 1
+
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows'])
+def test_listing_etag_changes_when_a_row_is_deleted(app, client, catalog, path):
+    before = client.get(path).headers['ETag']
+    assert client.get(path, headers={'If-None-Match': before}).status_code == 304
+
+    # The oldest row: max(updated_at) does not move
+    table = 'artists' if path == '/artists' else 'venues'
+    write_elsewhere(app, f'DELETE FROM {table} WHERE id = (SELECT min(id) FROM {table})')
+    after = client.get(path, headers={'If-None-Match': before})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before
+
+
+def test_concurrent_inserts_do_not_wait_on_the_table_version(app, client, catalog):
+    version = text("SELECT sum(version) FROM table_versions WHERE table_name = 'venues'")
+    insert = text("INSERT INTO venues (name, city, state, address, genres) "
+                  "VALUES (:name, :city, :state, '1 Main St', '{Jazz}')")
+    with app.app_context():
+        before = db.session.execute(version).scalar()
+        db.session.commit()
+        with db.engine.connect() as other:
+            other.execute(insert, {'name': 'First', 'city': 'Austin', 'state': 'TX'})
+            # This would time out waiting on the other transaction's table
+            # version lock (another city, so not on a location row either)
+            db.session.execute(text("SET LOCAL lock_timeout = '1s'"))
+            db.session.execute(insert, {'name': 'Second', 'city': 'New York', 'state': 'NY'})
+            other.commit()
+            db.session.commit()
+        assert db.session.execute(version).scalar() == before + 2
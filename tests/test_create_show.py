@@ -0,0 +1,13 @@
+import logging
+
+START = '2031-05-01 20:00:00'
+
+
+def test_unknown_venue_is_logged(client, catalog, caplog):
+    with caplog.at_level(logging.ERROR, logger='app'):
+        response = client.post('/shows/create', data={
+            'artist_id': catalog['artists'][0], 'venue_id': 999999, 'start_time': START,
+        })
+    assert response.status_code == 302
+    record, = [record for record in caplog.records if record.message == 'Show could not be listed']
+    assert 'venue_id' in str(record.exc_info[1])
@@ -0,0 +1,131 @@
+from sqlalchemy import text
+
+import deletions as deletions_module
+from deletions import deletions
+from jobs import jobs, CLAIM
+from models import db, Venue, Artist, Show, Location
+
+
+def counts(app, venue_id):
+    with app.app_context():
+        return db.session.execute(text(
+            "SELECT (SELECT count(*) FROM shows WHERE venue_id = :id) AS shows,"
+            "       (SELECT count(*) FROM venues WHERE id = :id) AS venues"), {'id': venue_id}).one()
+
+
+def location_counts(app, location_id):
+    # Stored counts next to the ones recomputed from the rows
+    with app.app_context():
+        location = db.session.get(Location, location_id)
+        venues = db.session.query(Venue).filter(Venue.location_id == location_id).count()
+        upcoming = db.session.query(Show).join(Venue).filter(
+            Venue.location_id == location_id, Show.start_time > location.shows_after).count()
+        return (location.venue_count, location.upcoming_show_count), (venues, upcoming)
+
+
+def run_queued_job(app):
+    with app.app_context():
+        rows = db.session.execute(CLAIM, {'worker': jobs.worker_id, 'limit': 1}).all()
+        db.session.commit()
+    assert len(rows) == 1
+    jobs._run(rows[0])
+    return rows[0]
+
+
+def test_small_delete_runs_inline_and_cascades_to_shows(app, client, catalog):
+    venue_id = catalog['venues'][0]
+    with app.app_context():
+        location_id = db.session.get(Venue, venue_id).location_id
+    assert counts(app, venue_id) == (5, 1)
+
+    response = client.delete(f'/venues/{venue_id}')
+    assert response.status_code == 302
+    assert counts(app, venue_id) == (0, 0)
+    stored, actual = location_counts(app, location_id)
+    assert stored == actual
+
+    # Nothing was queued, and the artists' shows at other venues remain
+    with app.app_context():
+        assert db.session.execute(text("SELECT count(*) FROM jobs WHERE name = 'deletions.run'")).scalar() == 0
+        assert db.session.query(Show).count() == 25
+    assert client.get(f'/venues/{venue_id}/deletion').status_code == 404
+
+
+def test_artist_delete_cascades_to_shows(app, client, catalog):
+    artist_id = catalog['artists'][0]
+    response = client.delete(f'/artists/{artist_id}')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(Artist, artist_id) is None
+        assert db.session.query(Show).filter(Show.artist_id == artist_id).count() == 0
+        assert db.session.query(Show).count() == 24
+
+
+def test_large_delete_is_queued_and_runs_in_chunks(app, client, catalog, monkeypatch):
+    monkeypatch.setattr(deletions, 'inline_shows', 3)
+    monkeypatch.setattr(deletions, 'chunk_size', 2)
+    invalidated = []
+    original = deletions_module.page_cache.invalidate
+    monkeypatch.setattr(deletions_module.page_cache, 'invalidate',
+                        lambda *keys: (invalidated.append(keys), original(*keys)))
+    venue_id = catalog['venues'][0]
+    with app.app_context():
+        location_id = db.session.get(Venue, venue_id).location_id
+
+    response = client.delete(f'/venues/{venue_id}')
+    assert response.status_code == 202
+    assert response.headers['Location'].endswith(f'/venues/{venue_id}/deletion')
+    body = response.get_json()
+    assert (body['state'], body['shows_total'], body['shows_deleted']) == ('queued', 5, 0)
+    # The request deleted nothing
+    assert counts(app, venue_id) == (5, 1)
+
+    # A second request while the first is pending queues nothing new
+    assert client.delete(f'/venues/{venue_id}').status_code == 202
+    with app.app_context():
+        assert db.session.execute(text("SELECT count(*) FROM jobs WHERE name = 'deletions.run'")).scalar() == 1
+
+    run_queued_job(app)
+    assert counts(app, venue_id) == (0, 0)
+    # Three chunks of shows (2 + 2 + 1), each committed and invalidated on
+    # its own, then the venue itself
+    assert len(invalidated) == 4
+    assert invalidated[-1][0] == f'venue:{venue_id}'
+    stored, actual = location_counts(app, location_id)
+    assert stored == actual
+
+    progress = client.get(f'/venues/{venue_id}/deletion').get_json()
+    assert progress['state'] == 'done'
+    assert (progress['shows_total'], progress['shows_deleted'], progress['progress']) == (5, 5, 1.0)
+
+
+def test_interrupted_chunked_delete_resumes(app, client, catalog, monkeypatch):
+    monkeypatch.setattr(deletions, 'inline_shows', 3)
+    monkeypatch.setattr(deletions, 'chunk_size', 2)
+    venue_id = catalog['venues'][1]
+    assert client.delete(f'/venues/{venue_id}').status_code == 202
+
+    # The first attempt dies in its second chunk, after the first committed
+    calls = []
+    touch = deletions_module.touch
+
+    def crash(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError('worker lost')
+        touch(*args)
+
+    monkeypatch.setattr(deletions_module, 'touch', crash)
+    job = run_queued_job(app)
+    progress = client.get(f'/venues/{venue_id}/deletion').get_json()
+    assert progress['state'] == 'queued' and 'worker lost' in progress['error']
+    assert (progress['shows_total'], progress['shows_deleted']) == (5, 2)
+    assert counts(app, venue_id) == (3, 1)
+
+    monkeypatch.setattr(deletions_module, 'touch', touch)
+    with app.app_context():
+        db.session.execute(text("UPDATE jobs SET run_at = timezone('utc', now()) WHERE id = :id"), {'id': job.id})
+        db.session.commit()
+    run_queued_job(app)
+    assert counts(app, venue_id) == (0, 0)
+    assert client.get(f'/venues/{venue_id}/deletion').get_json()['state'] == 'done'
@@ -0,0 +1,22 @@
+import pytest
+
+ENDPOINTS = ['/_stats/cache', '/_stats/pool', '/metrics']
+
+
+@pytest.fixture
+def token(app):
+    app.config['DIAGNOSTICS_TOKEN'] = 'diagnostics-secret'
+    yield 'diagnostics-secret'
+    app.config['DIAGNOSTICS_TOKEN'] = None
+
+
+@pytest.mark.parametrize('path', ENDPOINTS)
+def test_disabled_without_a_token(client, path):
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize('path', ENDPOINTS)
+def test_requires_the_bearer_token(client, token, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get(path, headers={'Authorization': f'Bearer {token}'}).status_code == 200
@@ -0,0 +1,60 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from sqlalchemy import text
+
+from exporter import export_command
+from models import db
+
+
+@pytest.fixture
+def auth(app):
+    app.config['EXPORT_TOKEN'] = 'export-secret'
+    yield {'Authorization': 'Bearer export-secret'}
+    app.config['EXPORT_TOKEN'] = None
+
+
+def test_disabled_without_a_token(client, catalog):
+    assert client.get('/export/venues.csv').status_code == 404
+
+
+def test_requires_the_export_token(client, catalog, auth):
+    assert client.get('/export/venues.csv').status_code == 401
+    assert client.get('/export/venues.csv', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+
+def test_csv_has_a_header_and_every_row(app, client, catalog, auth):
+    response = client.get('/export/venues.csv', headers=auth)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="venues.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [int(row['id']) for row in rows] == catalog['venues']
+    assert rows[0]['name'] == 'Venue 0' and rows[0]['city'] == 'San Francisco'
+
+
+def test_ndjson_and_gzip_carry_the_same_rows(app, client, catalog, auth):
+    plain = client.get('/export/shows.ndjson', headers=auth)
+    packed = client.get('/export/shows.ndjson.gz', headers=auth)
+    assert packed.mimetype == 'application/gzip'
+    assert gzip.decompress(packed.data) == plain.data
+    rows = [json.loads(line) for line in plain.get_data(as_text=True).splitlines()]
+    with app.app_context():
+        expected = db.session.execute(text('SELECT id FROM shows ORDER BY start_time, id')).scalars().all()
+    assert [row['id'] for row in rows] == expected
+    assert {'venue_name', 'artist_name', 'start_time'} <= set(rows[0])
+
+
+def test_unknown_entity_or_format(client, auth):
+    assert client.get('/export/tickets.csv', headers=auth).status_code == 404
+    assert client.get('/export/venues.xml', headers=auth).status_code == 404
+
+
+def test_cli_writes_the_same_bytes(app, client, catalog, auth, tmp_path):
+    output = tmp_path / 'artists.csv'
+    result = app.test_cli_runner().invoke(export_command, ['artists', '--format', 'csv', '-o', str(output)])
+    assert result.exit_code == 0, result.output
+    assert output.read_bytes() == client.get('/export/artists.csv', headers=auth).data
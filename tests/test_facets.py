@@ -0,0 +1,60 @@
+import re
+
+from sqlalchemy import text
+
+from facets import load_facets, parse_filters
+from models import db
+from werkzeug.datastructures import MultiDict
+
+FACET_RE = re.compile(r'class="genre(?: active)?">([^<(]+) \((\d+)\)</a>')
+
+
+def counts(response):
+    assert response.status_code == 200
+    return {name.strip(): int(count) for name, count in FACET_RE.findall(response.get_data(as_text=True))}
+
+
+def test_counts_under_filters(app, catalog):
+    with app.app_context():
+        assert load_facets('venues', {}) == {
+            'genres': [{'name': 'Jazz', 'label': 'Jazz', 'count': 6}, {'name': 'Rock', 'label': 'Rock', 'count': 6}],
+            'states': [{'name': 'CA', 'count': 2}, {'name': 'NY', 'count': 2}, {'name': 'TX', 'count': 2}],
+        }
+        seeking = load_facets('venues', parse_filters('venues', MultiDict({'seeking_talent': 'yes'})))
+        assert [facet['count'] for facet in seeking['genres']] == [3, 3]
+        assert sum(facet['count'] for facet in seeking['states']) == 3
+
+        texas = load_facets('artists', parse_filters('artists', MultiDict({'state': 'TX', 'genre': 'Jazz'})))
+        assert texas['states'] == [{'name': 'TX', 'count': 1}]
+        assert texas['genres'] == [{'name': 'Jazz', 'label': 'Jazz', 'count': 1}]
+
+
+def test_unknown_filters_are_ignored():
+    filters = parse_filters('venues', MultiDict([('genre', 'Jazz'), ('genre', 'Polka'), ('state', 'ZZ'),
+                                                 ('seeking_talent', 'maybe'), ('city', ' Austin ')]))
+    assert filters == {'genre': ['Jazz'], 'city': 'Austin'}
+
+
+def test_cached_counts_follow_the_listing_etag(app, client, catalog, cache):
+    first = client.get('/venues')
+    assert counts(first)['CA'] == 2
+
+    # Not invalidated anywhere: the new row changes the ETag, so the cached
+    # counts must not be served with it
+    with app.app_context():
+        db.session.execute(text("INSERT INTO venues (name, city, state, address, genres) "
+                                "VALUES ('New Hall', 'Oakland', 'CA', '1 Side St', '{Jazz}')"))
+        db.session.commit()
+    second = client.get('/venues', headers={'If-None-Match': first.headers['ETag']})
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert counts(second)['CA'] == 3
+    assert counts(second)['Jazz'] == 7
+
+
+def test_warming_is_only_scheduled_with_a_shared_cache(app):
+    # The suite runs without a cache, like a memory cache: nothing to warm
+    from jobs import jobs
+
+    assert 'facets.warm' in app.config['JOB_SCHEDULE']
+    assert 'facets.warm' not in jobs.schedule
+    assert 'locations.reconcile' in jobs.schedule
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from feeds import escape_text, fold
+from models import db
+
+
+def test_escape_text():
+    assert escape_text('Jazz, Blues; and\\more\nlater') == r'Jazz\, Blues\; and\\more\nlater'
+    assert escape_text(None) == ''
+
+
+def test_fold_short_and_long_lines():
+    assert fold('SUMMARY:short') == b'SUMMARY:short\r\n'
+    line = 'SUMMARY:' + 'x' * 200
+    folded = fold(line)
+    parts = folded[:-2].split(b'\r\n')
+    assert all(len(part) <= 75 for part in parts)
+    assert all(part.startswith(b' ') for part in parts[1:])
+    assert b''.join([parts[0]] + [part[1:] for part in parts[1:]]).decode() == line
+
+
+def test_fold_never_splits_a_character():
+    line = 'SUMMARY:' + 'é' * 100  # two octets each
+    for part in fold(line)[:-2].split(b'\r\n'):
+        assert len(part) <= 75
+        part.decode('utf-8')  # each line is valid on its own
+
+
+def test_feed_lists_shows_and_answers_304(app, client, catalog):
+    venue_id = catalog['venues'][0]
+    response = client.get(f'/venues/{venue_id}/shows.ics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    body = response.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n')
+    assert body.count('BEGIN:VEVENT') == 5
+    assert 'LOCATION:0 Main St\\, San Francisco\\, CA' in body
+
+    etag = response.headers['ETag']
+    assert client.get(f'/venues/{venue_id}/shows.ics', headers={'If-None-Match': etag}).status_code == 304
+
+    # A rename shows up in every SUMMARY, so it is a new version
+    with app.app_context():
+        db.session.execute(text("UPDATE venues SET name = 'Renamed Hall', updated_at = timezone('utc', now()) "
+                                'WHERE id = :id'), {'id': venue_id})
+        db.session.commit()
+    renamed = client.get(f'/venues/{venue_id}/shows.ics', headers={'If-None-Match': etag})
+    assert renamed.status_code == 200
+    assert 'at Renamed Hall' in renamed.get_data(as_text=True)
+    assert client.get('/artists/999999/shows.ics').status_code == 404
+
+
+def test_shows_api_time_range(app, client, catalog):
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    since, until = (start - timedelta(days=4)).isoformat(), (start + timedelta(days=4)).isoformat()
+    rows = client.get(f'/api/v1/shows?fields=id,start_time&from={since}&to={until}').get_json()['data']
+    with app.app_context():
+        expected = db.session.execute(text('SELECT id FROM shows WHERE start_time >= :since AND start_time < :until '
+                                           'ORDER BY start_time, id'), {'since': since, 'until': until}).scalars().all()
+    assert expected and [row['id'] for row in rows] == expected
+    assert client.get('/api/v1/shows?from=tomorrow').status_code == 400
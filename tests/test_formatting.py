@@ -0,0 +1,11 @@
+from datetime import date, datetime
+
+from formatting import format_datetime, format_datetimes
+
+
+def test_dates_strings_and_datetimes_agree():
+    midnight = datetime(2026, 5, 21)
+    expected = format_datetime(midnight)
+    assert format_datetime(date(2026, 5, 21)) == expected
+    assert format_datetime('2026-05-21T00:00:00') == expected
+    assert format_datetimes([date(2026, 5, 21), midnight], 'full') == [format_datetime(midnight, 'full')] * 2
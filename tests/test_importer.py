@@ -0,0 +1,26 @@
+import json
+
+from importer import ENTITIES, Report, run_import
+
+
+def test_bad_show_ids_are_rejected_not_fatal(app, client, catalog, tmp_path):
+    venue_id, artist_id = catalog['venues'][0], catalog['artists'][0]
+    path = tmp_path / 'shows.csv'
+    path.write_text(
+        'artist_id,venue_id,start_time\n'
+        f'{artist_id},{venue_id},2031-01-01 20:00:00\n'
+        f'abc,{venue_id},2031-01-02 20:00:00\n'
+        f'{artist_id},9999999999999,2031-01-03 20:00:00\n'
+        f'{artist_id},999999,2031-01-04 20:00:00\n'
+    )
+    report = Report(str(tmp_path / 'rejects.ndjson'))
+    with app.app_context():
+        run_import(ENTITIES['shows'], str(path), 'csv', 100, 'executemany', report)
+    report.close()
+
+    assert (report.read, report.inserted, report.rejected) == (4, 1, 3)
+    rejects = [json.loads(line) for line in (tmp_path / 'rejects.ndjson').read_text().splitlines()]
+    assert [reject['line'] for reject in rejects] == [3, 4, 5]
+    assert 'artist_id' in rejects[0]['errors']
+    assert rejects[1]['errors'] == {'venue_id': ['Number must be between 1 and 2147483647.']}
+    assert rejects[2]['errors'] == {'venue_id': ['Unknown venue.']}
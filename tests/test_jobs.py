@@ -0,0 +1,62 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+from jobs import jobs
+from models import db, Job
+
+
+def scheduled(name):
+    return db.session.execute(text("SELECT state FROM jobs WHERE key = :key ORDER BY id"),
+                              {'key': f'schedule:{name}'}).scalars().all()
+
+
+def test_maintenance_requeues_lost_periodic_jobs(app, client):
+    with app.app_context():
+        jobs._maintain()
+        assert scheduled('jobs.prune') == ['queued']
+
+        # A run whose worker died and that RECOVER gave up on
+        db.session.execute(text("UPDATE jobs SET state = 'failed', finished_at = timezone('utc', now()) "
+                                "WHERE key = 'schedule:jobs.prune'"))
+        db.session.commit()
+        jobs._maintain()
+        assert scheduled('jobs.prune') == ['failed', 'queued']
+
+        # Upserting again while one is pending changes nothing
+        jobs._maintain()
+        assert scheduled('jobs.prune') == ['failed', 'queued']
+        assert db.session.query(Job).filter(Job.state == 'queued').count() == len(jobs.schedule)
+
+
+def test_exit_requeues_claimed_jobs_after_the_timeout(app, client, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    @jobs.task('tests.block')
+    def block():
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(jobs, 'schedule', {})
+    with app.app_context():
+        first = jobs.enqueue('tests.block', key='first')
+        second = jobs.enqueue('tests.block', key='second')
+        db.session.commit()
+    jobs.start(workers=1)
+    try:
+        assert started.wait(5)
+        began = time.monotonic()
+        jobs.stop(timeout=0.2)
+        assert time.monotonic() - began < 2
+        with app.app_context():
+            rows = {job.id: job for job in db.session.query(Job).filter(Job.name == 'tests.block')}
+            assert rows[first].state == 'queued' and rows[first].attempts == 1
+            assert 'exited before the job finished' in rows[first].last_error
+            assert rows[second].state == 'queued' and rows[second].attempts == 0
+    finally:
+        # In a real exit the interpreter ends the job; here it finishes
+        release.set()
+        for thread in jobs._workers:
+            thread.join(5)
+        jobs.tasks.pop('tests.block')
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+import matching
+from matching import GENRE_BITS, catalog_matches, genre_mask, matches_for, match_command
+from models import db, Venue, Artist
+
+# Shared genres between the venue and each artist below: 2, 1, 2, 0, and an
+# artist in another state
+MASKS = [['Jazz', 'Blues'], ['Jazz'], ['Blues', 'Jazz', 'Folk'], ['Folk'], ['Jazz', 'Blues']]
+STATES = ['TX', 'TX', 'TX', 'TX', 'CA']
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def scoring(request, monkeypatch):
+    # Both scoring paths must rank the same way
+    if request.param == 'python':
+        monkeypatch.setattr(matching, 'numpy', None)
+    elif matching.numpy is None:
+        pytest.skip('numpy is not installed')
+    return request.param
+
+
+def test_genre_mask():
+    assert genre_mask(['Jazz', 'Blues']) == GENRE_BITS['Jazz'] | GENRE_BITS['Blues']
+    assert genre_mask(['Jazz', 'Polka']) == GENRE_BITS['Jazz']
+    assert genre_mask(None) == 0
+
+
+def test_scores_rank_by_shared_genres_then_id(scoring):
+    venue = genre_mask(['Jazz', 'Blues'])
+    masks = [genre_mask(names) for names in MASKS]
+    ids = [10, 11, 12, 13, 14]
+    assert list(matching.score(venue, masks)) == [2, 1, 2, 0, 2]
+    assert matching.top(ids, matching.score(venue, masks), 3) == [(10, 2), (12, 2), (14, 2)]
+    assert matching.top(ids, matching.score(venue, masks), 10) == [(10, 2), (12, 2), (14, 2), (11, 1)]
+
+    batch = matching.score_batch([venue, genre_mask(['Folk'])], masks)
+    assert matching.top_batch(ids, batch, 2) == [[(10, 2), (12, 2)], [(12, 1), (13, 1)]]
+
+
+@pytest.fixture
+def seeking(app, client):
+    with app.app_context():
+        venue = Venue(name='Blue Room', city='Austin', state='TX', address='1 Main St',
+                      genres=['Jazz', 'Blues'], seeking_talent=True)
+        artists = [Artist(name=f'Player {i}', city='Austin', state=state, genres=genres, seeking_venue=True)
+                   for i, (genres, state) in enumerate(zip(MASKS, STATES))]
+        artists.append(Artist(name='Not looking', city='Austin', state='TX', genres=['Jazz'], seeking_venue=False))
+        db.session.add_all([venue] + artists)
+        db.session.commit()
+        return venue.id, [artist.id for artist in artists]
+
+
+def test_database_masks_match_python(app, seeking):
+    with app.app_context():
+        for genres, mask in db.session.execute(text('SELECT genres, genre_mask FROM artists')):
+            assert mask == genre_mask(genres)
+
+
+def test_matches_in_the_same_state(app, client, seeking, scoring):
+    venue_id, artist_ids = seeking
+    with app.app_context():
+        assert matches_for('venues', venue_id) == [(artist_ids[0], 2), (artist_ids[2], 2), (artist_ids[1], 1)]
+        assert matches_for('artists', artist_ids[3]) == []
+        assert matches_for('venues', 999999) is None
+        assert list(catalog_matches()) == [('TX', venue_id, matches_for('venues', venue_id))]
+
+    payload = client.get(f'/api/v1/venues/{venue_id}/matches?limit=2').get_json()
+    assert [(row['id'], row['score']) for row in payload['data']] == [(artist_ids[0], 2), (artist_ids[2], 2)]
+
+    result = app.test_cli_runner().invoke(match_command, ['--state', 'TX'])
+    assert json.loads(result.stdout.splitlines()[0])['artists'][0] == {'id': artist_ids[0], 'score': 2}
@@ -0,0 +1,76 @@
+from sqlalchemy import func, select
+
+from models import db, Job, Show
+
+# Writes refresh the pages they change before the response: the written
+# row's own page, a new show's venue and artist, and (without a shared
+# cache) the other side's pages. Only the fan-out with a shared cache is
+# left to a job.
+#
+# Writes go through their own test client: they flash a message, and pages
+# carrying flashes are served without validators.
+
+VENUE_FORM = {
+    'name': 'Renamed Hall', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+    'phone': '415-555-0100', 'genres': ['Jazz'], 'facebook_link': '',
+}
+
+
+def etag(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return response.headers['ETag']
+
+
+def pending_jobs(app):
+    with app.app_context():
+        return db.session.execute(select(Job.name).where(Job.state == 'queued')).scalars().all()
+
+
+def artist_of(app, venue_id):
+    with app.app_context():
+        return db.session.execute(select(func.min(Show.artist_id)).where(Show.venue_id == venue_id)).scalar()
+
+
+def test_new_show_refreshes_both_pages(app, client, catalog, cache):
+    venue_id, artist_id = catalog['venues'][0], catalog['artists'][0]
+    venue_page, artist_page = f'/venues/{venue_id}', f'/artists/{artist_id}'
+    before = etag(client, venue_page), etag(client, artist_page)
+
+    response = app.test_client().post('/shows/create', data={
+        'artist_id': artist_id, 'venue_id': venue_id, 'start_time': '2031-05-01 20:00:00',
+    })
+    assert response.status_code == 302
+    assert etag(client, venue_page) != before[0]
+    assert etag(client, artist_page) != before[1]
+    assert 'pages.refresh_dependents' not in pending_jobs(app)
+
+
+def test_edit_refreshes_dependents_inline_with_a_memory_cache(app, client, catalog, cache):
+    venue_id = catalog['venues'][0]
+    artist_page = f'/artists/{artist_of(app, venue_id)}'
+    before = etag(client, artist_page)
+
+    assert app.test_client().post(f'/venues/{venue_id}/edit', data=VENUE_FORM).status_code == 302
+    assert etag(client, artist_page) != before
+    assert 'Renamed Hall' in client.get(artist_page).get_data(as_text=True)
+    assert pending_jobs(app) == []
+
+
+def test_edit_defers_dependents_with_a_shared_cache(app, client, catalog, shared_cache):
+    from app import refresh_dependents
+
+    venue_id = catalog['venues'][0]
+    venue_page, artist_page = f'/venues/{venue_id}', f'/artists/{artist_of(app, venue_id)}'
+    before = etag(client, venue_page), etag(client, artist_page)
+
+    assert app.test_client().post(f'/venues/{venue_id}/edit', data=VENUE_FORM).status_code == 302
+    # The venue's own page is refreshed before the redirect
+    assert etag(client, venue_page) != before[0]
+    assert 'Renamed Hall' in client.get(venue_page).get_data(as_text=True)
+    assert pending_jobs(app) == ['pages.refresh_dependents']
+
+    with app.app_context():
+        refresh_dependents(kind='venues', id=venue_id)
+    assert etag(client, artist_page) != before[1]
+    assert 'Renamed Hall' in client.get(artist_page).get_data(as_text=True)
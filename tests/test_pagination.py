@@ -0,0 +1,88 @@
+import html
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import db, Show
+from pagination import decode_cursor, encode_cursor
+
+NEXT_RE = re.compile(r'<li class="next"><a href="([^"]+)">')
+SHOW_RE = re.compile(r'<a href="/artists/(\d+)">.*?<a href="/venues/(\d+)">', re.S)
+
+
+def walk(client, url, pattern):
+    # Every row of every page, following the "Next page" links
+    rows, pages = [], 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.get_data(as_text=True)
+        rows += [tuple(int(id) for id in match) if isinstance(match, tuple) else int(match)
+                 for match in pattern.findall(page)]
+        pages += 1
+        next_link = NEXT_RE.search(page)
+        url = html.unescape(next_link.group(1)) if next_link else None
+    return rows, pages
+
+
+def test_cursor_round_trip():
+    start = datetime(2026, 5, 21, 20, 30)
+    assert decode_cursor(encode_cursor(start, 42), datetime, int) == (start, 42)
+    assert decode_cursor(encode_cursor('The Musical Hop', 7), str, int) == ('The Musical Hop', 7)
+    # Missing, malformed or mistyped cursors start from the first page
+    assert decode_cursor(None, datetime, int) is None
+    assert decode_cursor('not a cursor', datetime, int) is None
+    assert decode_cursor(encode_cursor(1, 2, 3), datetime, int) is None
+    assert decode_cursor(encode_cursor('yesterday', 1), datetime, int) is None
+
+
+def test_shows_pages_cover_every_show_once_in_order(app, client, catalog):
+    # Three shows starting at the same moment: the id breaks the tie, so a
+    # page boundary between them neither repeats nor skips one
+    with app.app_context():
+        tie = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=100)
+        for i in range(3):
+            db.session.add(Show(venue_id=catalog['venues'][i], artist_id=catalog['artists'][i], start_time=tie))
+        db.session.commit()
+        ordered = db.session.execute(text(
+            'SELECT artist_id, venue_id FROM shows ORDER BY start_time, id')).all()
+        past = db.session.execute(text(
+            'SELECT artist_id, venue_id FROM shows WHERE start_time < LOCALTIMESTAMP '
+            'ORDER BY start_time DESC, id DESC')).all()
+
+    rows, pages = walk(client, '/shows?limit=4', SHOW_RE)
+    assert rows == [tuple(row) for row in ordered]
+    assert pages == 9  # 33 shows, 4 a page
+
+    rows, _ = walk(client, '/shows?when=past&limit=4', SHOW_RE)
+    assert rows == [tuple(row) for row in past]
+
+
+def test_artists_pages_break_name_ties_by_id(app, client, catalog):
+    # Same-named artists across a page boundary; the upcoming counts come
+    # from the page's context, since the listing does not print them
+    from flask import template_rendered
+    from models import Artist
+
+    with app.app_context():
+        db.session.add_all([Artist(name='Artist 2', city='Austin', state='TX', genres=['Jazz'])
+                            for _ in range(2)])
+        db.session.commit()
+        ordered = db.session.execute(text('SELECT id FROM artists ORDER BY name, id')).scalars().all()
+        upcoming = dict(db.session.execute(text(
+            'SELECT artists.id, count(shows.id) FROM artists '
+            'LEFT JOIN shows ON shows.artist_id = artists.id AND shows.start_time > LOCALTIMESTAMP '
+            'GROUP BY artists.id')).all())
+
+    listed = []
+
+    def record(sender, template, context, **extra):
+        if template.name == 'pages/artists.html':
+            listed.extend(context['artists'])
+
+    with template_rendered.connected_to(record, app):
+        ids, pages = walk(client, '/artists?limit=3', re.compile(r'<a href="/artists/(\d+)">'))
+    assert ids == ordered
+    assert pages == 3  # 7 artists, 3 a page; "Artist 2" x3 spans the first boundary
+    assert {artist['id']: artist['num_upcoming_shows'] for artist in listed} == upcoming
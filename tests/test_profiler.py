@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from profiler import RepeatedQueryError, sql_profiler, statement_shape
+
+
+@pytest.fixture
+def restore_profiler():
+    saved = dict(vars(sql_profiler))
+    yield sql_profiler
+    vars(sql_profiler).clear()
+    vars(sql_profiler).update(saved)
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(SQL_PROFILER_REPEAT_LIMIT=3, SQL_PROFILER_SERVER_TIMING=True, **config)
+    sql_profiler.init_app(app)
+    engine = create_engine('sqlite://')
+
+    @app.route('/loop/<int:times>')
+    def loop(times):
+        # One statement per "row", the N+1 shape the profiler looks for
+        with engine.connect() as connection:
+            for id in range(times):
+                connection.execute(text('SELECT :id'), {'id': id})
+        return 'ok'
+
+    return app
+
+
+def test_repeated_statement_raises_in_tests(restore_profiler):
+    client = make_app(TESTING=True).test_client()
+    assert client.get('/loop/3').status_code == 200
+    with pytest.raises(RepeatedQueryError, match='statement executed 4 times'):
+        client.get('/loop/4')
+
+
+def test_raising_can_be_turned_off(restore_profiler):
+    client = make_app(TESTING=True, SQL_PROFILER_RAISE=False).test_client()
+    response = client.get('/loop/10')
+    assert response.status_code == 200
+    assert 'desc="10 queries"' in response.headers['Server-Timing']
+
+
+def test_does_not_raise_outside_tests(restore_profiler):
+    assert make_app().test_client().get('/loop/10').status_code == 200
+
+
+@pytest.mark.parametrize('statement, shape', [
+    ('SELECT  *\n FROM shows WHERE id = %(id_1)s', 'SELECT * FROM shows WHERE id = ?'),
+    ('SELECT * FROM shows WHERE id IN (%s, %s, %s)', 'SELECT * FROM shows WHERE id IN (?, ...)'),
+    ('SELECT * FROM shows WHERE id = $1', 'SELECT * FROM shows WHERE id = ?'),
+])
+def test_statement_shape(statement, shape):
+    assert statement_shape(statement) == shape
@@ -0,0 +1,30 @@
+import re
+
+import pytest
+
+# Listing and detail pages issue a fixed number of statements however many
+# venues, artists and shows there are; a lazy-load loop shows up here as a
+# higher count (and as RepeatedQueryError from the profiler in test mode).
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def statements(response):
+    assert response.status_code == 200
+    return int(QUERIES_RE.search(response.headers['Server-Timing']).group(1))
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('/venues', 3),
+    ('/artists', 3),
+    ('/shows', 2),
+])
+def test_listing_statement_count(client, catalog, path, expected):
+    assert statements(client.get(path)) == expected
+
+
+def test_detail_statement_count(client, catalog):
+    for venue_id in catalog['venues']:
+        assert statements(client.get(f'/venues/{venue_id}')) == 4
+    for artist_id in catalog['artists']:
+        assert statements(client.get(f'/artists/{artist_id}')) == 4
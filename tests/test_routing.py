@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+
+from routing import STICKY_KEY, RoutingSession, read_replica, router
+
+# Two SQLite files stand in for the primary and a replica. Each holds one
+# row saying which database it is, so a view shows where its read went.
+
+
+@pytest.fixture
+def restore_router():
+    saved = dict(vars(router))
+    yield router
+    vars(router).clear()
+    vars(router).update(saved)
+
+
+def database(path, name):
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE markers (id INTEGER PRIMARY KEY, source VARCHAR NOT NULL)')
+        connection.execute('INSERT INTO markers (source) VALUES (?)', (name,))
+    return f'sqlite:///{path}'
+
+
+def make_app(primary_uri, replica_uri):
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=primary_uri,
+        SQLALCHEMY_REPLICA_URIS=[replica_uri],
+        REPLICA_STICKY_SECONDS=60,
+        REPLICA_RETRY_SECONDS=60,
+        REPLICA_HEALTH_INTERVAL=0,
+    )
+    db = SQLAlchemy(session_options={'class_': RoutingSession})
+    router.init_app(app)
+    db.init_app(app)
+
+    class Marker(db.Model):
+        __tablename__ = 'markers'
+        id = db.Column(db.Integer, primary_key=True)
+        source = db.Column(db.String, nullable=False)
+
+    def sources():
+        return jsonify(sorted({marker.source for marker in db.session.query(Marker)}))
+
+    app.add_url_rule('/replica', 'replica', read_replica(sources))
+    app.add_url_rule('/primary', 'primary', sources)
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        db.session.add(Marker(source='written'))
+        db.session.commit()
+        return 'ok'
+
+    return app
+
+
+@pytest.fixture
+def client(tmp_path, restore_router):
+    app = make_app(database(tmp_path / 'primary.db', 'primary'), database(tmp_path / 'replica.db', 'replica'))
+    return app.test_client()
+
+
+def test_decorated_views_read_the_replica(client):
+    assert client.get('/replica').json == ['replica']
+    assert client.get('/primary').json == ['primary']
+
+
+def test_a_write_pins_the_client_to_the_primary(client):
+    assert client.post('/write').status_code == 200
+    # Read-your-writes: the replica has not seen the row yet
+    assert client.get('/replica').json == ['primary', 'written']
+
+    with client.session_transaction() as session:
+        session[STICKY_KEY] = 0
+    assert client.get('/replica').json == ['replica']
+
+
+def test_stickiness_is_per_client(client):
+    client.post('/write')
+    other = client.application.test_client()
+    assert other.get('/replica').json == ['replica']
+
+
+def test_unreachable_replica_falls_back_to_the_primary(tmp_path, restore_router):
+    app = make_app(database(tmp_path / 'primary.db', 'primary'), f'sqlite:///{tmp_path}/missing/replica.db')
+    client = app.test_client()
+
+    assert client.get('/replica').json == ['primary']
+    assert router.status() == {'replica_0': 'down'}
+    # Skipped without another health check until REPLICA_RETRY_SECONDS pass
+    assert client.get('/replica').json == ['primary']
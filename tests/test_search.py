@@ -0,0 +1,77 @@
+import pytest
+
+from models import Venue, Artist
+from search import MemorySearchBackend, _InvertedIndex, edit_distance
+
+# The in-memory backend stands in for Postgres search: same ranking rules
+# (name over location over genres, every word matched as a prefix) without
+# tsvector or pg_trgm.
+
+
+@pytest.fixture
+def backend():
+    backend = MemorySearchBackend()
+    # An empty index per model instead of one loaded from the database
+    backend._indexes = {Venue: _InvertedIndex(), Artist: _InvertedIndex()}
+    rows = [
+        Venue(id=1, name='The Musical Hop', city='San Francisco', state='CA', genres=['Jazz', 'Reggae']),
+        Venue(id=2, name='Park Square Live Music & Coffee', city='San Francisco', state='CA', genres=['Rock']),
+        Venue(id=3, name='The Dueling Pianos Bar', city='New York', state='NY', genres=['Classical']),
+        Venue(id=4, name='Jazz Corner', city='Austin', state='TX', genres=['Blues']),
+    ]
+    for row in rows:
+        backend.index(row)
+    return backend
+
+
+def names(results):
+    return [result.name for result in results]
+
+
+def test_prefix_matches_last_word(backend):
+    assert names(backend.search(Venue, 'mus', 10)) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+    assert names(backend.search(Venue, 'dueling pia', 10)) == ['The Dueling Pianos Bar']
+
+
+def test_name_outranks_genre_and_location(backend):
+    # "Jazz" is Jazz Corner's name but only a genre of The Musical Hop
+    assert names(backend.search(Venue, 'jazz', 10)) == ['Jazz Corner', 'The Musical Hop']
+    assert names(backend.search(Venue, 'san francisco', 10)) == ['Park Square Live Music & Coffee',
+                                                                  'The Musical Hop']
+
+
+def test_typos_match_within_edit_distance(backend):
+    assert names(backend.search(Venue, 'musicla', 10)) == ['The Musical Hop']      # transposition
+    assert names(backend.search(Venue, 'pinaos bar', 10)) == ['The Dueling Pianos Bar']
+    assert names(backend.search(Venue, 'duelign pianso', 10)) == ['The Dueling Pianos Bar']
+    assert names(backend.search(Venue, 'corenr', 10)) == ['Jazz Corner']
+    # Words under four characters must match exactly (as a prefix)
+    assert backend.search(Venue, 'xop', 10) == []
+    assert names(backend.search(Venue, 'hopp', 10)) == ['The Musical Hop']
+
+
+def test_exact_prefix_beats_typo(backend):
+    backend.index(Venue(id=5, name='Musicla', city='Austin', state='TX', genres=[]))
+    assert names(backend.search(Venue, 'musicla', 10)) == ['Musicla']
+
+
+def test_index_and_remove_keep_up_with_writes(backend):
+    backend.index(Venue(id=1, name='The Renamed Hop', city='San Francisco', state='CA', genres=[]))
+    assert backend.search(Venue, 'musical', 10) == []
+    assert names(backend.search(Venue, 'renamed', 10)) == ['The Renamed Hop']
+    backend.remove(Venue, 1)
+    assert backend.search(Venue, 'renamed', 10) == []
+    assert backend.search(Artist, 'renamed', 10) == []
+
+
+@pytest.mark.parametrize('left, right, distance', [
+    ('musical', 'musical', 0),
+    ('musical', 'musicla', 1),
+    ('musical', 'musica', 1),
+    ('musical', 'mxsical', 1),
+    ('dueling', 'duelign', 1),
+    ('pianos', 'pinaso', 2),
+    ('jazz', 'rock', 4),  # past the limit
+])
+def test_edit_distance(left, right, distance):
+    assert edit_distance(left, right, 3) == distance
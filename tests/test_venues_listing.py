@@ -0,0 +1,54 @@
+import re
+
+from sqlalchemy import text
+
+from locations import reconcile_locations
+from models import db
+
+AREA_RE = re.compile(r'<h3>([^<]+?)(?: <small>(\d+) upcoming shows?</small>)?</h3>')
+
+
+def areas(response):
+    assert response.status_code == 200
+    return {city: shows for city, shows in AREA_RE.findall(response.get_data(as_text=True))}
+
+
+def test_area_headers_show_upcoming_counts(client, catalog):
+    headers = areas(client.get('/venues'))
+    assert set(headers) == {'San Francisco, CA', 'New York, NY', 'Austin, TX'}
+    assert all(shows.isdigit() for shows in headers.values())
+
+
+def upcoming_by_area(app):
+    with app.app_context():
+        return {f'{row.city}, {row.state}': str(row.count) for row in db.session.execute(text(
+            "SELECT l.city, l.state, count(*) FROM shows JOIN venues v ON v.id = shows.venue_id "
+            "JOIN locations l ON l.id = v.location_id WHERE shows.start_time > LOCALTIMESTAMP "
+            "GROUP BY l.city, l.state"))}
+
+
+def test_upcoming_counts_stay_exact_as_shows_pass(app, client, catalog):
+    # As if the last reconcile ran ten days ago: the stored counts include
+    # the shows that have started since
+    with app.app_context():
+        db.session.execute(text("UPDATE locations SET shows_after = LOCALTIMESTAMP - interval '10 days'"))
+        db.session.execute(text(
+            "UPDATE locations SET upcoming_show_count = counts.count FROM ("
+            "  SELECT v.location_id, count(*) FROM shows JOIN venues v ON v.id = shows.venue_id"
+            "  JOIN locations l ON l.id = v.location_id WHERE shows.start_time > l.shows_after"
+            "  GROUP BY v.location_id) AS counts WHERE counts.location_id = locations.id"))
+        db.session.commit()
+    expected = upcoming_by_area(app)
+    assert areas(client.get('/venues')) == expected
+
+    with app.app_context():
+        # Moving the boundary up is not a correction
+        assert reconcile_locations() == 0
+    assert areas(client.get('/venues')) == expected
+
+
+def test_filtered_listing_hides_unfiltered_counts(client, catalog):
+    # Only some venues of each area are seeking talent
+    headers = areas(client.get('/venues?seeking_talent=true'))
+    assert headers
+    assert set(headers.values()) == {''}